@@ -7,8 +7,120 @@ chrome.action.onClicked.addListener(async (tab) => {
     }
 });
 
-// Relay SAVE_HTML messages from the content script to the native host
+// One native host process per browser session. The port stays open between
+// saves, so only the first save pays for starting save_host.exe. Requests
+// carry an id that the host echoes back; several may be in flight at once.
+const NATIVE_HOST_NAME = "com.your.savehost";
+let nativePort = null;
+let hostReady = null; // ping reply of the current host process
+let nextRequestId = 1;
+const pendingRequests = new Map(); // id -> resolve
+
+function getNativePort() {
+    if (nativePort) return nativePort;
+    const port = chrome.runtime.connectNative(NATIVE_HOST_NAME);
+    console.log('[background] connected to native host', NATIVE_HOST_NAME);
+
+    port.onMessage.addListener((response) => {
+        const resolve = pendingRequests.get(response?.id);
+        if (!resolve) {
+            console.warn('[background] native host reply without a pending request', response);
+            return;
+        }
+        pendingRequests.delete(response.id);
+        resolve(response);
+    });
+
+    port.onDisconnect.addListener(() => {
+        const error = chrome.runtime.lastError?.message || 'Native host disconnected';
+        console.log('[background] native host port disconnected', error);
+        if (nativePort === port) { nativePort = null; hostReady = null; }
+        // Fail whatever was still waiting; the next request reconnects
+        for (const resolve of pendingRequests.values()) resolve({ ok: false, error });
+        pendingRequests.clear();
+    });
+
+    nativePort = port;
+    return port;
+}
+
+function sendNativeRequest(message) {
+    return new Promise((resolve) => {
+        const id = nextRequestId++;
+        pendingRequests.set(id, resolve);
+        try {
+            getNativePort().postMessage({ ...message, id });
+        } catch (e) {
+            pendingRequests.delete(id);
+            resolve({ ok: false, error: e?.message || String(e) });
+        }
+    });
+}
+
+// ping/ready handshake; also starts the host ahead of the first save
+function ensureHostReady() {
+    if (!nativePort || !hostReady) {
+        hostReady = sendNativeRequest({ type: "ping" });
+        hostReady.then((res) => console.log('[background] native host ready', res));
+    }
+    return hostReady;
+}
+
+// Large pages are streamed as UTF-8 chunks (save_begin / save_chunk / save_commit)
+// so the host never holds the whole page in memory; it checks size and SHA-256
+// before replacing the file.
+const CHUNK_BYTES = 256 * 1024;
+
+function bytesToBase64(bytes) {
+    let binary = '';
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+    return btoa(binary);
+}
+
+async function saveHtml(fileUrl, html) {
+    const ready = await ensureHostReady();
+    // Hosts older than protocol 3 only understand single-message saves
+    if (!(ready?.protocol >= 3) || html.length < CHUNK_BYTES) {
+        return sendNativeRequest({ type: "save", fileUrl, html });
+    }
+    const bytes = new TextEncoder().encode(html);
+    const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', bytes));
+    const sha256 = Array.from(digest, (b) => b.toString(16).padStart(2, '0')).join('');
+    const transfer = `t${Date.now().toString(36)}_${nextRequestId}`;
+    // Pipelined: every request is posted right away and answered in order
+    const replies = [sendNativeRequest({ type: "save_begin", transfer, fileUrl, size: bytes.length, sha256 })];
+    for (let seq = 0, offset = 0; offset < bytes.length; seq++, offset += CHUNK_BYTES) {
+        replies.push(sendNativeRequest({ type: "save_chunk", transfer, seq, data: bytesToBase64(bytes.subarray(offset, offset + CHUNK_BYTES)) }));
+    }
+    replies.push(sendNativeRequest({ type: "save_commit", transfer }));
+    const results = await Promise.all(replies);
+    return results.find((r) => !r?.ok) || results[results.length - 1];
+}
+
+// Payload-only save: the host splices the payloads into the file on disk if
+// its shell still has the hash the last full save reported
+async function savePayloads(fileUrl, shellHash, payloads) {
+    const ready = await ensureHostReady();
+    if (!(ready?.protocol >= 4)) return { ok: false, code: "unsupported", error: "Native host does not support payload saves" };
+    return sendNativeRequest({ type: "save_payload", fileUrl, shellHash, payloads });
+}
+
+// Relay SAVE_HTML / SAVE_PAYLOAD messages from the content script to the native host
 chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
+    if (msg?.type === "WARM_UP_HOST") {
+        ensureHostReady();
+        sendResponse({ ok: true });
+        return;
+    }
+    if (msg?.type === "SAVE_PAYLOAD") {
+        savePayloads(msg.fileUrl, msg.shellHash, msg.payloads).then((response) => {
+            console.log('[background] native host response (payload save)', response);
+            sendResponse(response);
+        });
+        return true;
+    }
     if (msg?.type !== "SAVE_HTML") return;
 
     console.log('[background] received SAVE_HTML message from content script', {
@@ -16,36 +128,11 @@ chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
         fileUrl: msg.fileUrl,
         htmlLength: msg.html ? msg.html.length : 0
     });
-  
-    const port = chrome.runtime.connectNative("com.your.savehost");
-    console.log('[background] connected to native host com.your.savehost', { port });
 
-    port.onMessage.addListener((response) => {
+    saveHtml(msg.fileUrl, msg.html || "").then((response) => {
         console.log('[background] native host response', response);
         sendResponse(response); // {ok:true,path:...} or {ok:false,error:...}
-        try {
-            port.disconnect();
-            console.log('[background] port disconnected after response');
-        } catch (e) {
-            console.warn('[background] error disconnecting port', e);
-        }
-    });
-
-    port.onDisconnect.addListener(() => {
-        console.log('[background] native host port disconnected');
-        if (chrome.runtime.lastError) {
-            console.error('[background] native host error', chrome.runtime.lastError.message);
-            sendResponse({ ok: false, error: chrome.runtime.lastError.message });
-        }
-    });
-
-    const payload = { type: "save", fileUrl: msg.fileUrl, html: msg.html };
-    console.log('[background] posting message to native host (html trimmed for log)', {
-        type: payload.type,
-        fileUrl: payload.fileUrl,
-        htmlPreview: payload.html ? payload.html.slice(0, 200) : ''
     });
-    port.postMessage(payload);
     return true; // keep sendResponse alive for async reply
 });
 
@@ -14,15 +14,66 @@ function gatherHtml() {
     return document.documentElement.outerHTML;
 }
 
+// Payload saves: after one full save, only the elements holding document data
+// are sent and the native host splices them into the file on disk. A
+// MutationObserver on each of them tracks which ones changed since they were
+// last written.
+const PAYLOAD_IDS = ["__docs__", "__doc__"];
+let shellHash = null; // reported by the host for the last full save
+const dirtyPayloads = new Set();
+const observedPayloads = new Map(); // id -> element being observed
+
+function watchPayloads() {
+    for (const id of PAYLOAD_IDS) {
+        const el = document.getElementById(id);
+        if (!el || observedPayloads.get(id) === el) continue;
+        // New or replaced element: observe it and count it as changed
+        observedPayloads.set(id, el);
+        dirtyPayloads.add(id);
+        new MutationObserver(() => dirtyPayloads.add(id)).observe(el, { childList: true, characterData: true, subtree: true });
+    }
+}
+watchPayloads();
+
+async function savePayloads(fileUrl) {
+    watchPayloads();
+    const payloads = {};
+    for (const id of dirtyPayloads) {
+        const el = document.getElementById(id);
+        if (el) payloads[id] = el.textContent;
+    }
+    const sent = Object.keys(payloads);
+    if (!sent.length) return { ok: true, path: "(no changes)" };
+    // Clear first: edits made while the save is in flight mark the payload dirty again
+    sent.forEach((id) => dirtyPayloads.delete(id));
+    const res = await chrome.runtime.sendMessage({ type: "SAVE_PAYLOAD", fileUrl, shellHash, payloads });
+    if (!res?.ok) sent.forEach((id) => dirtyPayloads.add(id));
+    return res;
+}
+
 // Allow page scripts to explicitly request a save without synthesizing a key event
 document.addEventListener("cm-request-save", () => { requestSave(); });
 
 async function requestSave() {
-    const html = gatherHtml();
     const fileUrl = location.href; // e.g., file:///C:/path/combined.html
     try {
         sendStart();
-        const res = await chrome.runtime.sendMessage({ type: "SAVE_HTML", fileUrl, html });
+        let res = null;
+        if (shellHash) {
+            res = await savePayloads(fileUrl);
+            if (!res?.ok) {
+                console.log("Payload save not possible, saving the full page:", res?.error);
+                res = null;
+            }
+        }
+        if (!res) {
+            watchPayloads();
+            const written = [...dirtyPayloads];
+            dirtyPayloads.clear();
+            res = await chrome.runtime.sendMessage({ type: "SAVE_HTML", fileUrl, html: gatherHtml() });
+            shellHash = res?.ok ? (res.shellHash || null) : null;
+            if (!res?.ok) written.forEach((id) => dirtyPayloads.add(id));
+        }
         if (res?.ok) {
             console.log("Saved:", res.path);
             sendDone(true);
@@ -44,6 +95,11 @@ document.addEventListener("keydown", (e) => {
     }
 });
 
+// Start the native host while the user is still editing, so the first save is warm too
+if (location.protocol === "file:" && (document.getElementById("__doc__") || document.getElementById("editorView"))) {
+    try { chrome.runtime.sendMessage({ type: "WARM_UP_HOST" }); } catch {}
+}
+
 // Allow toolbar click -> background -> here
 chrome.runtime.onMessage.addListener((msg) => {
     if (msg?.type === "REQUEST_SAVE") requestSave();
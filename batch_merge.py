@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Batch certificate generation (mail merge).
+
+Takes a saved template (an HTML file with an embedded <pre id="__doc__">
+payload) and a CSV/TSV of recipients, and writes one self-contained HTML file
+per row with the mapped `field`/`text` elements filled in.
+
+The shell (everything around the payload) is prepared once: either the
+template file itself, or a fresh bundle built once with helper.combine_files
+(--shell index.html [--profile viewer]). Rows are streamed from disk and
+handed to a process pool in small batches, with only a bounded number of
+batches in flight, so memory use stays flat however many recipients there are.
+
+Columns map to elements with --map COLUMN=TARGET, where TARGET is an element
+or table cell id (`el_12` or `#el_12`) or an attribute selector
+(`[name=recipient]`, matched against element attrs). Without --map, each
+column maps to the element whose id or `name` attribute equals the column name.
+
+File names come from --name; a row whose name an earlier row already has
+gets its row number added instead of overwriting that file.
+
+Usage:
+  python batch_merge.py template.html recipients.csv -o out/ --name "{Name}.html"
+  python batch_merge.py template.html people.tsv -o out/ --map "Full name=#el_3" --map "Date=[name=date]"
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from docformat import PLAIN_SCHEMA, hoist_assets, parse_payload, resolve_assets
+from docpayload import create_temp, discard_temp, escape_document_data, shell_schema, split_payload
+from helper import BUILD_PROFILES, combine_files
+
+# Rows per task sent to a worker, and tasks in flight per worker
+BATCH_SIZE = 32
+BATCHES_IN_FLIGHT_PER_WORKER = 4
+
+_ATTR_SELECTOR = re.compile(r"""^\[\s*([^\s=\]]+)\s*=\s*["']?(.*?)["']?\s*\]$""")
+_UNSAFE_NAME_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def load_shell(template_file, shell_html=None, profile='editor'):
+    """
+    Return (prefix, payload, suffix) for a merge run. `payload` is the
+    template's parsed document payload; when the shell's app loads schema 2,
+    its images are moved to the asset table (docformat.hoist_assets), so a
+    logo on every page is stored once per certificate. An older app gets the
+    payload with inline images, as it saved it. prefix/suffix are the markup
+    bytes around it, from the template itself or from one fresh build of
+    `shell_html`.
+    """
+    parts = split_payload(template_file)
+    if not parts or not parts[1]:
+        raise ValueError(f"{template_file} has no embedded document (<pre id=\"__doc__\">)")
+    prefix, document_data, suffix = parts
+
+    if shell_html:
+        fd, tmp_path = tempfile.mkstemp(suffix='.html')
+        os.close(fd)
+        try:
+            base_dir = os.path.dirname(shell_html) or '.'
+            if not combine_files(shell_html, tmp_path, base_dir=base_dir, use_cache=False, profile=profile):
+                raise ValueError(f"Could not build a shell from {shell_html}")
+            prefix, _, suffix = split_payload(tmp_path)
+        finally:
+            os.remove(tmp_path)
+
+    payload = parse_payload(document_data)
+    if shell_schema(prefix + suffix) >= PLAIN_SCHEMA:
+        payload = hoist_assets(payload)
+    elif isinstance(payload, dict) and 'assets' in payload:
+        payload = resolve_assets(payload)
+    return prefix, payload, suffix
+
+
+def _document(payload):
+    """The DocumentModel inside a payload (wrapped {schema, app, document} or a bare document)."""
+    if isinstance(payload, dict) and isinstance(payload.get('document'), dict):
+        return payload['document']
+    return payload
+
+
+def resolve_target(document, target):
+    """
+    Find what a mapping target points at. Returns a list of (dict, key) slots
+    to write the value into: element content, image src, or table cell content.
+    """
+    target = target.strip()
+    slots = []
+    match = _ATTR_SELECTOR.match(target)
+    wanted_id = None if match else target.lstrip('#')
+    for page in document.get('pages') or []:
+        for el in page.get('elements') or []:
+            if match:
+                attrs = el.get('attrs') or {}
+                if str(attrs.get(match.group(1), '')) != match.group(2):
+                    continue
+            elif el.get('id') != wanted_id:
+                # Table cells have ids of their own
+                if el.get('type') == 'table':
+                    cell = (el.get('cells') or {}).get(wanted_id)
+                    if cell is not None:
+                        slots.append((cell, 'content'))
+                continue
+            slots.append((el, 'src' if el.get('type') == 'image' else 'content'))
+    return slots
+
+
+def _auto_mapping(document, columns):
+    mapping = []
+    for column in columns:
+        for target in (column, f"[name={column}]"):
+            if resolve_target(document, target):
+                mapping.append((column, target))
+                break
+    return mapping
+
+
+def output_name(pattern, index, row):
+    """Format the output file name for a row and strip characters that are unsafe in file names."""
+    try:
+        name = pattern.format(index=index, **row)
+    except (KeyError, IndexError, ValueError):
+        name = f"{index:05d}.html"
+    name = _UNSAFE_NAME_CHARS.sub('_', name).strip(' .') or f"{index:05d}.html"
+    if not name.lower().endswith(('.html', '.htm')):
+        name += '.html'
+    return name
+
+
+# Per-process state, set once by _init_worker so the shell and template are
+# not re-sent with every batch
+_WORKER = {}
+
+
+def _init_worker(prefix, payload, suffix, mapping, out_dir):
+    document = _document(payload)
+    _WORKER.update(
+        prefix=prefix,
+        suffix=suffix,
+        payload=payload,
+        slots=[(column, resolve_target(document, target)) for column, target in mapping],
+        out_dir=out_dir,
+    )
+
+
+def _write_rows(batch):
+    """Render and write one batch of (index, row, file name). Returns the number of files written."""
+    state = _WORKER
+    written = 0
+    for index, row, name in batch:
+        # The same template dicts are reused for every row: each mapped slot is
+        # overwritten before serializing, so no per-row deep copy is needed
+        for column, slots in state['slots']:
+            value = row.get(column)
+            value = '' if value is None else value
+            for container, key in slots:
+                container[key] = value
+        data = escape_document_data(json.dumps(state['payload'], ensure_ascii=False, separators=(',', ':')))
+        path = os.path.join(state['out_dir'], name)
+        out, tmp_path = create_temp(path)
+        try:
+            with out:
+                out.write(state['prefix'])
+                out.write(data.encode('utf-8'))
+                out.write(state['suffix'])
+            os.replace(tmp_path, path)
+        except BaseException:
+            discard_temp(tmp_path)
+            raise
+        written += 1
+    return written
+
+
+def _named_rows(rows, name_pattern, renamed):
+    """
+    (index, row, file name) for each row. A name an earlier row already has
+    (compared case-insensitively, as Windows and macOS do) gets "-<index>"
+    added, so no certificate overwrites another; those rows go to `renamed`
+    as (index, pattern name, name used).
+    """
+    taken = set()
+    for index, row in enumerate(rows, 1):
+        name = wanted = output_name(name_pattern, index, row)
+        if name.lower() in taken:
+            stem, ext = os.path.splitext(wanted)
+            name, n = f"{stem}-{index}{ext}", 1
+            while name.lower() in taken:
+                n += 1
+                name = f"{stem}-{index}-{n}{ext}"
+            renamed.append((index, wanted, name))
+        taken.add(name.lower())
+        yield index, row, name
+
+
+def _iter_batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def merge(template_file, rows_file, out_dir, mapping=None, name_pattern='{index:05d}.html',
+          delimiter=None, jobs=None, shell_html=None, profile='editor'):
+    """
+    Write one certificate per row of `rows_file` into `out_dir`.
+    `mapping` is a list of (column, target) pairs (see resolve_target); when
+    empty, columns are matched to element ids / name attributes.
+    Returns the number of files written.
+    """
+    prefix, payload, suffix = load_shell(template_file, shell_html, profile)
+    os.makedirs(out_dir, exist_ok=True)
+    if delimiter is None:
+        delimiter = '\t' if rows_file.lower().endswith(('.tsv', '.tab')) else ','
+    jobs = max(1, jobs or os.cpu_count() or 1)
+
+    started = time.perf_counter()
+    written = 0
+    with open(rows_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        columns = reader.fieldnames or []
+        document = _document(payload)
+        if not mapping:
+            mapping = _auto_mapping(document, columns)
+        for column, target in mapping:
+            if column not in columns:
+                print(f"⚠️  Column {column!r} is not in {rows_file}")
+            if not resolve_target(document, target):
+                print(f"⚠️  {target!r} does not match any element in {template_file}")
+        if not mapping:
+            print("❌ No columns map to elements in the template (use --map COLUMN=TARGET)")
+            return 0
+        print("🔗 " + ', '.join(f"{column} → {target}" for column, target in mapping))
+
+        init_args = (prefix, payload, suffix, mapping, out_dir)
+        # Names are settled here, in order, so workers never write the same file
+        renamed = []
+        batches = _iter_batches(_named_rows(reader, name_pattern, renamed), BATCH_SIZE)
+        if jobs == 1:
+            _init_worker(*init_args)
+            for batch in batches:
+                written += _write_rows(batch)
+        else:
+            limit = jobs * BATCHES_IN_FLIGHT_PER_WORKER
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=init_args) as pool:
+                pending = set()
+                for batch in batches:
+                    if len(pending) >= limit:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        written += sum(fut.result() for fut in done)
+                    pending.add(pool.submit(_write_rows, batch))
+                for fut in pending:
+                    written += fut.result()
+
+    if renamed:
+        print(f"⚠️  {len(renamed):,} row(s) would have overwritten an earlier row's file; saved with the row number added:")
+        for index, wanted, name in renamed[:10]:
+            print(f"   row {index}: {wanted} → {name}")
+        if len(renamed) > 10:
+            print(f"   ... and {len(renamed) - 10:,} more")
+    elapsed = time.perf_counter() - started
+    rate = written / elapsed if elapsed else 0
+    print(f"✅ Wrote {written:,} certificates to {out_dir} in {elapsed:.1f} s ({rate:,.0f}/s)")
+    return written
+
+
+def _parse_map(values):
+    mapping = []
+    for value in values or []:
+        column, sep, target = value.partition('=')
+        if not sep or not column or not target:
+            raise argparse.ArgumentTypeError(f"--map expects COLUMN=TARGET, got {value!r}")
+        mapping.append((column, target))
+    return mapping
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate one certificate per CSV/TSV row from a saved template.")
+    parser.add_argument("template", help="Saved template HTML (with an embedded document)")
+    parser.add_argument("rows", help="CSV or TSV file with a header row")
+    parser.add_argument("-o", "--out-dir", default="merged", help="Output directory (default: merged)")
+    parser.add_argument("--map", action="append", metavar="COLUMN=TARGET", help="Map a column to an element/cell id or [attr=value] selector (repeatable)")
+    parser.add_argument("--name", default="{index:05d}.html", help="Output file name pattern, e.g. \"{Name}.html\" (default: {index:05d}.html)")
+    parser.add_argument("--delimiter", help="Field delimiter (default: tab for .tsv/.tab, comma otherwise)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--shell", metavar="HTML", help="Build the shell once from this page (e.g. index.html) instead of reusing the template's markup")
+    parser.add_argument("--profile", choices=BUILD_PROFILES, default='editor', help="Build profile for --shell")
+    args = parser.parse_args(argv)
+
+    try:
+        mapping = _parse_map(args.map)
+        delimiter = args.delimiter.encode().decode('unicode_escape') if args.delimiter else None
+        count = merge(args.template, args.rows, args.out_dir, mapping, args.name, delimiter, args.jobs, args.shell, args.profile)
+    except (OSError, ValueError, argparse.ArgumentTypeError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0 if count else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the bundler (helper.combine_files) and the native save host.
+
+Generates synthetic projects and documents of increasing size and reports
+timings, so regressions in build time, save latency or memory show up before
+users notice them.
+
+  bundle  Synthetic projects (many JS/CSS files) built with combine_files:
+          a cold build, a cached build with nothing changed, and a rebuild
+          after one file was edited. Peak Python allocations via tracemalloc.
+  save    native-host/save_host.py (or a built exe) driven as a subprocess
+          over the real 4-byte length-prefixed stdio protocol, the way
+          background.js does it: plain "save" for small pages, pipelined
+          save_begin/save_chunk/save_commit for large ones, then save_payload
+          as content.js sends after the first full save. Documents have many
+          pages, tables and embedded images; payloads from 10 KB up to 50 MB.
+          Latency p50/p99, throughput and the host's peak RSS. Save timings
+          include the host's snapshot history (snapshots.py), as in real use.
+
+Results are printed and, with --json, written as machine-readable JSON; pass
+an earlier file to --compare to see what got slower.
+
+Usage:
+  python bench.py                                    # everything, payloads 10k..50m
+  python bench.py --quick                            # small sizes only
+  python bench.py save --sizes 100k,10m -n 20 --json after.json --compare before.json
+  python bench.py save --host native-host\\dist\\save_host\\save_host.exe
+"""
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from docformat import hoist_assets
+from docpayload import escape_document_data, split_payload
+from helper import combine_files
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = '10k,100k,1m,10m,50m'
+QUICK_SIZES = '10k,100k,1m'
+# Same threshold and chunk size as background.js
+CHUNK_BYTES = 256 * 1024
+# (name, JS files, KB per JS file, CSS files, KB per CSS file)
+PROJECTS = (
+    ('small', 8, 16, 2, 8),
+    ('medium', 30, 48, 4, 16),
+    ('large', 80, 128, 8, 32),
+)
+# A slower run is flagged by --compare past this ratio
+REGRESSION_RATIO = 1.10
+
+
+def parse_size(text):
+    """'10k' / '1.5m' / '2048' -> bytes."""
+    text = text.strip().lower()
+    scale = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}.get(text[-1:], 1)
+    return int(float(text.rstrip('kmg')) * scale)
+
+
+def format_size(n):
+    for unit, scale in (('MB', 1024 ** 2), ('KB', 1024)):
+        if n >= scale:
+            return f"{n / scale:g}{unit}" if n % scale == 0 else f"{n / scale:.1f}{unit}"
+    return f"{n}B"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))]
+
+
+def summarize(name, times_ms, size_bytes, **extra):
+    """One result row: latency percentiles (ms) and throughput for `size_bytes` per run."""
+    p50 = percentile(times_ms, 50)
+    row = {'name': name, 'runs': len(times_ms), 'bytes': size_bytes,
+           'ms_p50': round(p50, 3), 'ms_p99': round(percentile(times_ms, 99), 3),
+           'mb_per_s': round(size_bytes / 2 ** 20 / (p50 / 1000), 2) if p50 > 0 else None}
+    row.update(extra)
+    return row
+
+
+# ---- Synthetic inputs ----
+
+def generate_project(root, js_files, js_kb, css_files, css_kb, rng):
+    """Write an index.html with `js_files` scripts and `css_files` stylesheets under `root`."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    tags = []
+    for i in range(css_files):
+        rules = []
+        while sum(map(len, rules)) < css_kb * 1024:
+            n = len(rules)
+            rules.append(f".c{i}-{n} {{ margin: {rng.randint(0, 40)}px; color: #{rng.randrange(0x1000000):06x}; }}\n"
+                         f"/* rule {n} of sheet {i} */\n")
+        (root / f"style{i}.css").write_text(''.join(rules), encoding='utf-8')
+        tags.append(f'  <link rel="stylesheet" href="style{i}.css">')
+    for i in range(js_files):
+        funcs = []
+        while sum(map(len, funcs)) < js_kb * 1024:
+            n = len(funcs)
+            funcs.append(f"// helper {n} of module {i}\n"
+                         f"function m{i}_f{n}(a, b) {{\n  const s = 'text {rng.random():.6f}';\n"
+                         f"  return a * {rng.randint(1, 99)} + b + s.length;\n}}\n")
+        (root / f"module{i}.js").write_text(''.join(funcs), encoding='utf-8')
+        tags.append(f'  <script src="module{i}.js" defer></script>')
+    html = ("<!doctype html>\n<html><head>\n  <meta charset=\"utf-8\">\n" + "\n".join(tags)
+            + "\n</head>\n<body>\n  <div id=\"editorView\"></div>\n</body>\n</html>\n")
+    (root / 'index.html').write_text(html, encoding='utf-8')
+    return root / 'index.html'
+
+
+def _random_image(rng, size):
+    return 'data:image/png;base64,' + base64.b64encode(rng.randbytes(size * 3 // 4)).decode('ascii')
+
+
+def generate_document(target_bytes, rng):
+    """
+    A DocumentModel payload (schema 2, see docformat.py) of about
+    `target_bytes` serialized: pages of text elements, a table and a logo on
+    every page, and a unique photo on every fifth page.
+    """
+    logo = _random_image(rng, 24 * 1024)
+    pages, size, i = [], 0, 0
+    while size < target_bytes or not pages:
+        elements = [{'id': f'el-{i}-{n}', 'type': 'text', 'x': 40, 'y': 60 + 30 * n, 'w': 500, 'h': 24,
+                     'content': f'Line {n} of page {i}: ' + ' '.join(rng.choice(('lorem', 'ipsum', 'dolor', 'sit', 'amet'))
+                                                                   for _ in range(12)),
+                     'styles': {'fontSize': 14, 'color': '#222'}}
+                    for n in range(20)]
+        table_id = f'tbl-{i}'
+        cells, grid = {}, []
+        for r in range(12):
+            grid.append([])
+            for c in range(6):
+                cid = f'{table_id}_{r}x{c}'
+                cells[cid] = {'id': cid, 'row': r, 'col': c, 'rowSpan': 1, 'colSpan': 1, 'hidden': False,
+                              'content': f'R{r}C{c} {rng.randint(0, 10 ** 6)}',
+                              'styles': {'alignH': 'left', 'alignV': 'top', 'padding': 8}}
+                grid[r].append(cid)
+        elements.append({'id': table_id, 'type': 'table', 'x': 40, 'y': 700, 'w': 600, 'h': 480, 'rows': 12, 'cols': 6,
+                         'colWidths': [100] * 6, 'rowHeights': [40] * 12, 'cells': cells, 'grid': grid})
+        elements.append({'id': f'logo-{i}', 'type': 'image', 'x': 600, 'y': 20, 'w': 120, 'h': 60, 'src': logo})
+        if i % 5 == 0:
+            elements.append({'id': f'photo-{i}', 'type': 'image', 'x': 40, 'y': 1200, 'w': 300, 'h': 200,
+                             'src': _random_image(rng, 40 * 1024)})
+        page = {'id': f'page-{i}', 'name': f'Page {i + 1}', 'elements': elements}
+        pages.append(page)
+        # The logo ends up in the asset table once; count it once
+        size += len(json.dumps(page)) - len(logo) + (len(logo) if i == 0 else 0)
+        i += 1
+    document = {'pages': pages, 'currentPageId': pages[0]['id'], 'nextElementId': i * 30, 'editMode': False,
+                'benchSeq': ''}
+    return hoist_assets({'schema': 1, 'app': 'bench', 'document': document})
+
+
+def _serialize(payload, seq):
+    # A fixed-width counter makes every save differ without changing the size
+    payload['document']['benchSeq'] = f'{seq:010d}'
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_shell():
+    """(prefix, suffix) bytes of a real saved page: the built combined.html if present, else a stub."""
+    built = os.path.join(HERE, 'combined.html')
+    parts = split_payload(built) if os.path.exists(built) else None
+    if parts:
+        return parts[0], parts[2]
+    return (b'<!doctype html><html><head></head><body>\n  <pre id="__doc__" style="display:none">',
+            b'</pre>\n<div id="editorView"></div></body></html>')
+
+
+# ---- Bundler ----
+
+def bench_bundle(workdir, repeat, sizes_enabled=None):
+    rng = random.Random(1)
+    rows = []
+    for name, js_files, js_kb, css_files, css_kb in PROJECTS:
+        if sizes_enabled is not None and name not in sizes_enabled:
+            continue
+        root = os.path.join(workdir, f'project-{name}')
+        html = generate_project(root, js_files, js_kb, css_files, css_kb, rng)
+        out = os.path.join(root, 'combined.html')
+
+        def build(use_cache):
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                if not combine_files(str(html), out, base_dir=root, use_cache=use_cache):
+                    raise RuntimeError(f"combine_files failed for {html}")
+                return (time.perf_counter() - started) * 1000
+
+        cold = [build(False) for _ in range(repeat)]
+        out_size = os.path.getsize(out)
+        # Separate run: tracing allocations slows the build down
+        tracemalloc.start()
+        build(False)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append(summarize(f'bundle/{name}/cold', cold, out_size, peak_alloc_kb=peak // 1024))
+
+        build(True)
+        rows.append(summarize(f'bundle/{name}/cached', [build(True) for _ in range(repeat)], out_size))
+
+        edited = os.path.join(root, 'module0.js')
+        times = []
+        for i in range(repeat):
+            with open(edited, 'a', encoding='utf-8') as f:
+                f.write(f"// edit {i}\n")
+            times.append(build(True))
+        rows.append(summarize(f'bundle/{name}/one-file-edited', times, os.path.getsize(out)))
+        for row in rows[-3:]:
+            print_row(row)
+    return rows
+
+
+# ---- Native host ----
+
+def default_host():
+    dist = os.path.join(HERE, 'native-host', 'dist')
+    for candidate in (os.path.join(dist, 'save_host', 'save_host.exe'), os.path.join(dist, 'save_host.exe')):
+        if os.path.exists(candidate):
+            return [candidate]
+    return [sys.executable, os.path.join(HERE, 'native-host', 'save_host.py')]
+
+
+class HostClient:
+    """Stand-in for Chrome: length-prefixed JSON over the host's stdin/stdout, replies matched by id."""
+
+    def __init__(self, command):
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.next_id = 1
+        self.replies = {}
+        self.cond = threading.Condition()
+        self.reader = threading.Thread(target=self._read_replies, daemon=True)
+        self.reader.start()
+
+    def _read_replies(self):
+        out = self.proc.stdout
+        while True:
+            raw_len = out.read(4)
+            if len(raw_len) != 4:
+                break
+            reply = json.loads(out.read(struct.unpack('<I', raw_len)[0]).decode('utf-8'))
+            with self.cond:
+                self.replies[reply.get('id')] = reply
+                self.cond.notify_all()
+        with self.cond:
+            self.replies[None] = {'ok': False, 'error': 'host closed the pipe'}
+            self.cond.notify_all()
+
+    def post(self, message):
+        """Send without waiting; returns the request id."""
+        message = dict(message, id=self.next_id)
+        self.next_id += 1
+        data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+        self.proc.stdin.write(struct.pack('<I', len(data)) + data)
+        self.proc.stdin.flush()
+        return message['id']
+
+    def wait(self, request_id, timeout=600):
+        with self.cond:
+            if not self.cond.wait_for(lambda: request_id in self.replies or None in self.replies, timeout):
+                raise RuntimeError(f"no reply to request {request_id} within {timeout} s")
+            reply = self.replies.pop(request_id, None) or self.replies[None]
+        return reply
+
+    def request(self, message):
+        return self.wait(self.post(message))
+
+    def save_html(self, file_url, html):
+        """Full save, chunked like background.js for pages of CHUNK_BYTES and more."""
+        if len(html) < CHUNK_BYTES:
+            return self.request({'type': 'save', 'fileUrl': file_url, 'html': html})
+        data = html.encode('utf-8')
+        transfer = f't{self.next_id}'
+        ids = [self.post({'type': 'save_begin', 'transfer': transfer, 'fileUrl': file_url,
+                          'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()})]
+        for seq, offset in enumerate(range(0, len(data), CHUNK_BYTES)):
+            ids.append(self.post({'type': 'save_chunk', 'transfer': transfer, 'seq': seq,
+                                  'data': base64.b64encode(data[offset:offset + CHUNK_BYTES]).decode('ascii')}))
+        ids.append(self.post({'type': 'save_commit', 'transfer': transfer}))
+        replies = [self.wait(i) for i in ids]
+        return next((r for r in replies if not r.get('ok')), replies[-1])
+
+    def peak_rss_kb(self):
+        return peak_rss_kb(self.proc)
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait(timeout=600)
+        self.reader.join(timeout=5)
+
+
+def peak_rss_kb(proc):
+    """Peak resident memory of a running child process in KB, or None where it can't be read."""
+    try:
+        with open(f'/proc/{proc.pid}/status', 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if os.name == 'nt':
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        handle = kernel32.OpenProcess(0x1000, False, proc.pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return None
+        try:
+            counters = Counters()
+            counters.cb = ctypes.sizeof(Counters)
+            if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize // 1024
+        finally:
+            kernel32.CloseHandle(handle)
+    return None
+
+
+def _file_url(path):
+    return Path(path).resolve().as_uri()
+
+
+def bench_save(workdir, sizes, runs, command):
+    rng = random.Random(2)
+    prefix, suffix = load_shell()
+    rows = []
+    for size in sizes:
+        label = format_size(size)
+        payload = generate_document(size, rng)
+        # Fewer runs for huge payloads: ~200 MB written per size at most
+        n = max(3, min(runs, (200 * 2 ** 20) // max(size, 1)))
+        path = os.path.join(workdir, f'save-{label}.html')
+        file_url = _file_url(path)
+        client = HostClient(command)
+        try:
+            ready = client.request({'type': 'ping'})
+            if ready.get('type') != 'ready':
+                raise RuntimeError(f"unexpected ping reply: {ready}")
+            full_times, html_bytes, shell_hash = [], 0, None
+            for seq in range(n):
+                html = (prefix.decode('utf-8') + escape_document_data(_serialize(payload, seq))
+                        + suffix.decode('utf-8'))
+                html_bytes = len(html.encode('utf-8'))
+                started = time.perf_counter()
+                reply = client.save_html(file_url, html)
+                full_times.append((time.perf_counter() - started) * 1000)
+                if not reply.get('ok'):
+                    raise RuntimeError(f"save failed: {reply}")
+                shell_hash = reply.get('shellHash')
+            rows.append(summarize(f'save/full/{label}', full_times, html_bytes, peak_rss_kb=client.peak_rss_kb()))
+            print_row(rows[-1])
+
+            if shell_hash and ready.get('protocol', 0) >= 4:
+                payload_times = []
+                for seq in range(n, 2 * n):
+                    text = _serialize(payload, seq)
+                    started = time.perf_counter()
+                    reply = client.request({'type': 'save_payload', 'fileUrl': file_url, 'shellHash': shell_hash,
+                                            'payloads': {'__doc__': text}})
+                    payload_times.append((time.perf_counter() - started) * 1000)
+                    if not reply.get('ok'):
+                        raise RuntimeError(f"save_payload failed: {reply}")
+                rows.append(summarize(f'save/payload/{label}', payload_times, len(text.encode('utf-8')),
+                                      peak_rss_kb=client.peak_rss_kb()))
+                print_row(rows[-1])
+        finally:
+            client.close()
+        # Big files and their history add up across sizes
+        for leftover in (path, os.path.join(workdir, f'.save-{label}.html.snapshots')):
+            if os.path.isdir(leftover):
+                shutil.rmtree(leftover, ignore_errors=True)
+            elif os.path.exists(leftover):
+                os.remove(leftover)
+    return rows
+
+
+# ---- Reporting ----
+
+def print_row(row):
+    extra = ''
+    if row.get('peak_alloc_kb') is not None:
+        extra += f"  alloc peak {row['peak_alloc_kb'] / 1024:,.1f} MB"
+    if row.get('peak_rss_kb') is not None:
+        extra += f"  host RSS peak {row['peak_rss_kb'] / 1024:,.1f} MB"
+    rate = f"{row['mb_per_s']:>9,.1f} MB/s" if row['mb_per_s'] is not None else ' ' * 14
+    print(f"  {row['name']:<32} p50 {row['ms_p50']:>10,.2f} ms  p99 {row['ms_p99']:>10,.2f} ms  {rate}{extra}")
+
+
+def compare(rows, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {row['name']: row for row in json.load(f).get('results', [])}
+    print(f"\n📊 Compared with {baseline_path} (p50):")
+    regressions = 0
+    for row in rows:
+        old = baseline.get(row['name'])
+        if not old or not old.get('ms_p50'):
+            continue
+        ratio = row['ms_p50'] / old['ms_p50']
+        flag = '⚠️ ' if ratio > REGRESSION_RATIO else '  '
+        regressions += ratio > REGRESSION_RATIO
+        print(f"  {flag}{row['name']:<32} {old['ms_p50']:>10,.2f} → {row['ms_p50']:>10,.2f} ms  ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bundler and the native save host.")
+    parser.add_argument("suites", nargs="*", metavar="{bundle,save}", help="Suites to run (default: both)")
+    parser.add_argument("--sizes", help=f"Payload sizes for the save suite (default: {DEFAULT_SIZES})")
+    parser.add_argument("--quick", action="store_true", help=f"Small projects and payloads only ({QUICK_SIZES})")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="Runs per measurement (default: 20; fewer for huge payloads)")
+    parser.add_argument("--host", help="Host executable or script (default: the built exe, else native-host/save_host.py)")
+    parser.add_argument("--json", metavar="PATH", help="Write the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with an earlier --json file; exits 1 on a regression")
+    args = parser.parse_args(argv)
+
+    suites = args.suites or ["bundle", "save"]
+    unknown = [s for s in suites if s not in ("bundle", "save")]
+    if unknown:
+        parser.error(f"unknown suite: {', '.join(unknown)}")
+    sizes = [parse_size(s) for s in (args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)).split(',') if s.strip()]
+    if args.host:
+        command = [sys.executable, args.host] if args.host.endswith('.py') else [args.host]
+    else:
+        command = default_host()
+
+    print(f"⏱️  Python {platform.python_version()} on {platform.platform()}")
+    rows = []
+    workdir = tempfile.mkdtemp(prefix='cm-bench-')
+    try:
+        if "bundle" in suites:
+            print("📦 combine_files:")
+            rows += bench_bundle(workdir, max(3, args.runs // 4), {'small', 'medium'} if args.quick else None)
+        if "save" in suites:
+            print(f"💾 Native host ({' '.join(command)}):")
+            rows += bench_save(workdir, sizes, args.runs, command)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        result = {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                           'platform': platform.platform(), 'cpus': os.cpu_count(), 'host': command},
+                  'results': rows}
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Wrote {args.json}")
+    if args.compare and compare(rows, args.compare):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Search index for a directory of saved certificates.
+
+Walks a directory tree, pulls the <pre id="__doc__"> payload out of every
+saved HTML file (byte search on a memory map, see docpayload.py; the app
+around it is never parsed) and stores documents, pages, elements and their
+text in an SQLite database with an FTS5 full-text index:
+
+  files     one row per saved file: path, mtime/size, payload hash
+  pages     page number, id and name of every page
+  elements  every element: id, type and its `name` attribute (fields)
+  texts     the text of text/field/rect elements and of every table cell,
+            indexed by texts_fts
+
+Re-indexing is incremental: files whose mtime and size match the database
+are skipped without being opened, and files whose payload hash is unchanged
+(e.g. the shell was re-bundled) only get their stat updated. Payloads are
+read and parsed by a process pool; the main process is the only writer.
+Files that disappeared from the tree are dropped.
+
+Usage:
+  python doc_index.py index issued/                       # build or refresh the index
+  python doc_index.py search "ada lovelace"               # files containing both words
+  python doc_index.py search "python course" --field course
+  python doc_index.py search 'lovel* NOT draft' --raw     # FTS5 query syntax
+  python doc_index.py stats
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from docformat import parse_payload
+from docpayload import DOC_SLOT, find_payload
+
+DEFAULT_DB = 'doc_index.sqlite'
+# Bump when the tables change; an older database is rebuilt from scratch
+INDEX_VERSION = 1
+# Files per task sent to a worker, and rows written per transaction
+BATCH_SIZE = 64
+COMMIT_EVERY = 2000
+# Element types whose `content` is plain text
+_TEXT_TYPES = ('text', 'field', 'rect')
+# files.error of HTML files without a <pre id="__doc__"> (plain shells, other pages): not a failure
+NO_DOCUMENT = "no embedded document"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    payload_sha256 TEXT,
+    app TEXT,
+    schema INTEGER,
+    pages INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    page_no INTEGER NOT NULL,
+    page_id TEXT,
+    name TEXT,
+    PRIMARY KEY (file_id, page_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS elements (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    page_no INTEGER NOT NULL,
+    element_id TEXT NOT NULL,
+    type TEXT,
+    name TEXT,
+    PRIMARY KEY (file_id, page_no, element_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS elements_name ON elements(name) WHERE name IS NOT NULL;
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    page_no INTEGER NOT NULL,
+    element_id TEXT NOT NULL,
+    cell_id TEXT,
+    kind TEXT NOT NULL,
+    name TEXT,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS texts_file ON texts(file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts USING fts5(
+    text, content='texts', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS texts_ai AFTER INSERT ON texts BEGIN
+    INSERT INTO texts_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS texts_ad AFTER DELETE ON texts BEGIN
+    INSERT INTO texts_fts(texts_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def connect(db_path):
+    """Open (creating or upgrading) an index database."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, INDEX_VERSION):
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall():
+            if not name.startswith('texts_fts_'):
+                conn.execute(f"DROP TABLE IF EXISTS {name}")
+    try:
+        conn.executescript(_SCHEMA)
+    except sqlite3.OperationalError as e:
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} has no FTS5 support ({e})")
+    conn.execute(f"PRAGMA user_version={INDEX_VERSION}")
+    return conn
+
+
+def _stat_key(st):
+    return st.st_mtime_ns, st.st_size
+
+
+def walk_html(root):
+    """Yield (path, stat) for every .html/.htm file under `root` (hidden folders such as snapshot stores skipped)."""
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(('.html', '.htm')) and entry.is_file():
+                        yield os.path.abspath(entry.path), entry.stat()
+        except OSError:
+            continue
+
+
+def extract_rows(document):
+    """(pages, elements, texts) rows of a DocumentModel, without the file_id column."""
+    pages, elements, texts = [], [], []
+    for page_no, page in enumerate(document.get('pages') or [], 1):
+        if not isinstance(page, dict):
+            continue
+        pages.append((page_no, page.get('id'), page.get('name')))
+        seen = set()
+        for el in page.get('elements') or []:
+            if not isinstance(el, dict) or el.get('id') is None:
+                continue
+            el_id = str(el['id'])
+            if el_id in seen:
+                continue
+            seen.add(el_id)
+            kind = el.get('type')
+            attrs = el.get('attrs') if isinstance(el.get('attrs'), dict) else {}
+            name = attrs.get('name') if isinstance(attrs.get('name'), str) else None
+            elements.append((page_no, el_id, kind, name))
+            if kind in _TEXT_TYPES and isinstance(el.get('content'), str) and el['content'].strip():
+                texts.append((page_no, el_id, None, kind, name, el['content']))
+            elif kind == 'table' and isinstance(el.get('cells'), dict):
+                for cell_id, cell in el['cells'].items():
+                    if isinstance(cell, dict) and not cell.get('hidden') and isinstance(cell.get('content'), str) and cell['content'].strip():
+                        texts.append((page_no, el_id, str(cell_id), 'cell', name, cell['content']))
+    return pages, elements, texts
+
+
+def _read_payload_bytes(path):
+    """Raw (still escaped) payload bytes of a saved file, or None without one."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            span = find_payload(buf, DOC_SLOT)
+            return None if span is None else buf[span.start:span.end]
+
+
+def _extract_job(job):
+    """
+    Worker: (path, known payload hash) -> (path, payload hash, result, error).
+    `result` is None when the payload hash is unchanged, else
+    (app, schema, pages, elements, texts).
+    """
+    path, known_hash = job
+    try:
+        raw = _read_payload_bytes(path)
+        if raw is None:
+            return path, None, None, NO_DOCUMENT
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest == known_hash:
+            return path, digest, None, None
+        data = DOC_SLOT.unescape(raw.decode('utf-8'))
+        payload = parse_payload(data)
+        if isinstance(payload, dict) and isinstance(payload.get('document'), dict):
+            app, schema, document = payload.get('app'), payload.get('schema'), payload['document']
+        else:
+            app, schema, document = None, 1, payload if isinstance(payload, dict) else {}
+        return path, digest, (app, schema) + extract_rows(document), None
+    except Exception as e:
+        return path, None, None, f"{type(e).__name__}: {e}"
+
+
+def _extract_batch(jobs):
+    return [_extract_job(job) for job in jobs]
+
+
+def _store(conn, file_id, path, stat, digest, result, error):
+    """Replace everything indexed for one file. Returns the file id."""
+    mtime_ns, size = stat
+    if file_id is not None:
+        conn.execute("DELETE FROM texts WHERE file_id=?", (file_id,))
+        conn.execute("DELETE FROM elements WHERE file_id=?", (file_id,))
+        conn.execute("DELETE FROM pages WHERE file_id=?", (file_id,))
+    app, schema, pages, elements, texts = result if result is not None else (None, None, [], [], [])
+    values = (mtime_ns, size, digest, app, schema, len(pages), error, time.time())
+    if file_id is None:
+        file_id = conn.execute(
+            "INSERT INTO files (mtime_ns, size, payload_sha256, app, schema, pages, error, indexed_at, path) VALUES (?,?,?,?,?,?,?,?,?)",
+            values + (path,)).lastrowid
+    else:
+        conn.execute(
+            "UPDATE files SET mtime_ns=?, size=?, payload_sha256=?, app=?, schema=?, pages=?, error=?, indexed_at=? WHERE id=?",
+            values + (file_id,))
+    conn.executemany("INSERT INTO pages VALUES (?,?,?,?)", [(file_id,) + row for row in pages])
+    conn.executemany("INSERT INTO elements VALUES (?,?,?,?,?)", [(file_id,) + row for row in elements])
+    conn.executemany("INSERT INTO texts (file_id, page_no, element_id, cell_id, kind, name, text) VALUES (?,?,?,?,?,?,?)",
+                     [(file_id,) + row for row in texts])
+    return file_id
+
+
+def index_tree(root, db_path=DEFAULT_DB, jobs=None, force=False):
+    """
+    Bring the index of every saved file under `root` up to date.
+    Returns counts: {"seen", "skipped", "touched", "indexed", "no_document", "failed", "removed"}.
+    """
+    root = os.path.abspath(root)
+    conn = connect(db_path)
+    counts = dict.fromkeys(('seen', 'skipped', 'touched', 'indexed', 'no_document', 'failed', 'removed'), 0)
+    known = {path: (file_id, (mtime_ns, size), digest) for file_id, path, mtime_ns, size, digest in conn.execute(
+        "SELECT id, path, mtime_ns, size, payload_sha256 FROM files WHERE path >= ? AND path < ?",
+        (root + os.sep, root + chr(ord(os.sep) + 1)))}
+
+    stats, pending, seen = {}, [], set()
+    for path, st in walk_html(root):
+        counts['seen'] += 1
+        seen.add(path)
+        prev = known.get(path)
+        if prev and not force and prev[1] == _stat_key(st):
+            counts['skipped'] += 1
+            continue
+        stats[path] = _stat_key(st)
+        pending.append((path, None if force or not prev else prev[2]))
+
+    batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(batches)))
+    written = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        results = pool.map(_extract_batch, batches) if pool else map(_extract_batch, batches)
+        with conn:
+            for batch in results:
+                for path, digest, result, error in batch:
+                    prev = known.get(path)
+                    file_id = prev[0] if prev else None
+                    if result is None and error is None:
+                        conn.execute("UPDATE files SET mtime_ns=?, size=?, indexed_at=? WHERE id=?",
+                                     stats[path] + (time.time(), file_id))
+                        counts['touched'] += 1
+                    else:
+                        _store(conn, file_id, path, stats[path], digest, result, error)
+                        counts['no_document' if error == NO_DOCUMENT else 'failed' if error else 'indexed'] += 1
+                    written += 1
+                    if written % COMMIT_EVERY == 0:
+                        conn.commit()
+            gone = [(file_id,) for path, (file_id, _, _) in known.items() if path not in seen]
+            conn.executemany("DELETE FROM texts WHERE file_id=?", gone)
+            conn.executemany("DELETE FROM files WHERE id=?", gone)
+            counts['removed'] = len(gone)
+        if counts['indexed'] or counts['removed']:
+            conn.execute("INSERT INTO texts_fts(texts_fts) VALUES ('optimize')")
+            conn.commit()
+    finally:
+        if pool:
+            pool.shutdown()
+        conn.close()
+    return counts
+
+
+def to_fts_query(text):
+    """Plain words -> FTS5 query matching all of them as prefixes ("ada lov" finds "Ada Lovelace")."""
+    terms = [t.replace('"', '""') for t in text.split()]
+    return ' '.join(f'"{t}"*' for t in terms)
+
+
+def search(db_path, query, raw=False, kind=None, field=None, limit=20):
+    """
+    Files whose texts match `query`, best first:
+    [{"path", "matches", "hits": [{"page", "element", "cell", "kind", "name", "snippet"}]}].
+    All words must occur in the same element or cell.
+    """
+    conn = connect(db_path)
+    try:
+        where, params = ["texts_fts MATCH ?"], [query if raw else to_fts_query(query)]
+        if kind:
+            where.append("t.kind = ?")
+            params.append(kind)
+        if field:
+            where.append("t.name = ?")
+            params.append(field)
+        rows = conn.execute(f"""
+            SELECT f.path, t.page_no, t.element_id, t.cell_id, t.kind, t.name,
+                   snippet(texts_fts, 0, '[', ']', '…', 12), bm25(texts_fts)
+            FROM texts_fts JOIN texts t ON t.id = texts_fts.rowid JOIN files f ON f.id = t.file_id
+            WHERE {' AND '.join(where)}
+            ORDER BY bm25(texts_fts)
+        """, params)
+        files = {}
+        for path, page_no, element_id, cell_id, kind_, name, snippet, _ in rows:
+            entry = files.get(path)
+            if entry is None:
+                if len(files) >= limit:
+                    continue
+                entry = files[path] = {'path': path, 'matches': 0, 'hits': []}
+            entry['matches'] += 1
+            if len(entry['hits']) < 5:
+                entry['hits'].append({'page': page_no, 'element': element_id, 'cell': cell_id, 'kind': kind_,
+                                      'name': name, 'snippet': snippet})
+        return list(files.values())
+    finally:
+        conn.close()
+
+
+def index_stats(db_path):
+    conn = connect(db_path)
+    try:
+        files, no_document, failed, pages = conn.execute(
+            "SELECT count(*), count(CASE WHEN error = ? THEN 1 END), count(CASE WHEN error != ? THEN 1 END), coalesce(sum(pages), 0) FROM files",
+            (NO_DOCUMENT, NO_DOCUMENT)).fetchone()
+        elements = conn.execute("SELECT count(*) FROM elements").fetchone()[0]
+        texts = conn.execute("SELECT count(*) FROM texts").fetchone()[0]
+    finally:
+        conn.close()
+    return {'files': files, 'no_document': no_document, 'failed': failed, 'pages': pages, 'elements': elements, 'texts': texts,
+            'bytes': os.path.getsize(db_path)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index a directory of saved certificates and search their text.")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"Index database (default: {DEFAULT_DB})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("index", help="Index (or refresh) every saved file under a directory")
+    p.add_argument("root", help="Directory of saved HTML files")
+    p.add_argument("-j", "--jobs", type=int, help="Worker processes (default: CPU count)")
+    p.add_argument("--force", action="store_true", help="Re-read every file, even unchanged ones")
+    p = sub.add_parser("search", help="Find files whose text matches a query")
+    p.add_argument("query", help="Words to find (all must occur in one element or table cell)")
+    p.add_argument("--raw", action="store_true", help="Pass the query to FTS5 as is (AND/OR/NOT, \"phrases\", prefix*)")
+    p.add_argument("--kind", choices=_TEXT_TYPES + ('cell',), help="Only this kind of element")
+    p.add_argument("--field", metavar="NAME", help="Only elements with this name attribute")
+    p.add_argument("-n", "--limit", type=int, default=20, help="Files to list (default: 20)")
+    p.add_argument("--json", action="store_true", help="Print results as JSON")
+    sub.add_parser("stats", help="Show what the index holds")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "index":
+            if not os.path.isdir(args.root):
+                print(f"❌ {args.root} is not a directory", file=sys.stderr)
+                return 1
+            started = time.perf_counter()
+            counts = index_tree(args.root, args.db, jobs=args.jobs, force=args.force)
+            elapsed = time.perf_counter() - started
+            print(f"✅ {counts['seen']:,} file(s) in {elapsed:.1f} s: {counts['indexed']:,} indexed, "
+                  f"{counts['skipped'] + counts['touched']:,} unchanged, {counts['removed']:,} removed, "
+                  f"{counts['no_document']:,} without a document, {counts['failed']:,} failed")
+            return 0
+        if args.command == "stats":
+            s = index_stats(args.db)
+            print(f"📚 {s['files']:,} file(s) ({s['no_document']:,} without a document, {s['failed']:,} unreadable), {s['pages']:,} pages, "
+                  f"{s['elements']:,} elements, {s['texts']:,} texts; {s['bytes']:,} bytes")
+            return 0
+        started = time.perf_counter()
+        results = search(args.db, args.query, raw=args.raw, kind=args.kind, field=args.field, limit=args.limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    except (OSError, RuntimeError, sqlite3.Error) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+    for r in results:
+        print(f"📄 {r['path']} ({r['matches']} match{'es' if r['matches'] != 1 else ''})")
+        for hit in r['hits']:
+            where = f"page {hit['page']}, {hit['element']}" + (f" cell {hit['cell']}" if hit['cell'] else '')
+            label = f" [{hit['name']}]" if hit['name'] else ''
+            print(f"     {where}{label}: {hit['snippet']}")
+    print(f"🔎 {len(results)} file(s) in {elapsed_ms:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
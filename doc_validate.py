@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Check saved certificates against the document invariants in ARCHITECTURE.md.
+
+Corrupted saves otherwise only show up when someone opens them. For every
+saved file this reads the <pre id="__doc__"> payload (memory-mapped, any
+encoding: see docformat.parse_payload) and checks, in one pass over pages,
+elements and table cells with id indexes built on the way:
+
+  pages            pages is a list of pages with unique ids; currentPageId names one
+  element ids      unique across the document; numbered ids (el-12, tbl-13,
+                   cell-14) stay below nextElementId, so generateId() never
+                   hands out one that exists
+  parentId         names an element on the same page; no parent cycles
+  groupId          shared by at least two elements, all on one page
+  tables           grid is rows x cols (and rowHeights/colWidths match);
+                   grid[r][c] names a cell that is not hidden (an anchor) and
+                   whose span covers (r, c); each anchor's span is covered by
+                   exactly its own id; cells are keyed by their id; a visible
+                   cell the grid never shows is reported as an orphan
+
+Errors break the editor; warnings are stale but harmless. --fix repairs what
+can be repaired without guessing (a missing currentPageId, a low
+nextElementId, parentIds of deleted elements, single-member groups, cell ids
+that differ from their key) and writes the file back in the encoding it had,
+unless it changed while being checked. Everything else is only reported.
+
+Files are checked by a process pool. The report is text by default, one
+JSON line per file with --jsonl, and the whole report as JSON with --report.
+
+Usage:
+  python doc_validate.py archive/
+  python doc_validate.py "archive/2024-*.html" --report validation.json
+  python doc_validate.py archive/ --fix --jsonl > fixes.jsonl
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from docformat import encode_like, parse_payload
+from docpayload import read_payload, write_payload
+from reshell import iter_files
+
+# Files per task sent to a worker, and tasks in flight per worker
+BATCH_SIZE = 16
+BATCHES_IN_FLIGHT_PER_WORKER = 4
+# A badly broken table can produce an issue per cell; the rest are only counted
+MAX_ISSUES = 200
+WARNINGS = frozenset({'group_single', 'group_pages', 'cell_orphan'})
+
+# generateId() ids: "<prefix>-<nextElementId>"
+_NUMBERED_ID = re.compile(r'[A-Za-z]+-(\d+)')
+
+
+def _id_number(element_id):
+    m = _NUMBERED_ID.fullmatch(element_id) if isinstance(element_id, str) else None
+    return int(m.group(1)) if m else 0
+
+
+class _Report:
+    """Issues of one document, capped at MAX_ISSUES."""
+
+    def __init__(self, fix):
+        self.fix = fix
+        self.issues = []
+        self.dropped = 0
+
+    def __call__(self, code, message, page=None, element=None, fixable=False):
+        """Record an issue; True if the caller should repair it."""
+        fixed = bool(self.fix and fixable)
+        if len(self.issues) >= MAX_ISSUES:
+            self.dropped += 1
+            return fixed
+        issue = {'code': code, 'severity': 'warning' if code in WARNINGS else 'error', 'message': message}
+        if page is not None:
+            issue['page'] = page
+        if element is not None:
+            issue['element'] = element
+        if fixed:
+            issue['fixed'] = True
+        self.issues.append(issue)
+        return fixed
+
+
+def _int(value, default):
+    return value if isinstance(value, int) and not isinstance(value, bool) else default
+
+
+def check_table(table, page_id, report):
+    """Check one table element; returns the highest numbered cell id (for nextElementId)."""
+    tid = table.get('id')
+    cells, grid = table.get('cells'), table.get('grid')
+    if not isinstance(cells, dict) or not isinstance(grid, list) or not all(isinstance(row, list) for row in grid):
+        report('table_shape', "cells must be a map and grid a list of rows", page_id, tid)
+        return 0
+    rows, cols = table.get('rows'), table.get('cols')
+    if len(grid) != rows or any(len(row) != cols for row in grid):
+        report('table_shape', f"grid is not {rows} x {cols}", page_id, tid)
+    for key, expected in (('rowHeights', len(grid)), ('colWidths', cols)):
+        if not isinstance(table.get(key), list) or len(table[key]) != expected:
+            report('table_shape', f"{key} does not have {expected} entries", page_id, tid)
+
+    # One pass over the grid: how often each cell appears, and whether each
+    # position lies inside its anchor's span
+    seen = {}
+    for r, row in enumerate(grid):
+        for c, cell_id in enumerate(row):
+            cell = cells.get(cell_id) if isinstance(cell_id, str) else None
+            if not isinstance(cell, dict):
+                report('grid_unknown_cell', f"grid[{r}][{c}] = {cell_id!r} is not a cell of the table", page_id, tid)
+                continue
+            seen[cell_id] = seen.get(cell_id, 0) + 1
+            if cell.get('hidden'):
+                report('grid_not_anchor', f"grid[{r}][{c}] points at hidden cell {cell_id}", page_id, tid)
+                continue
+            row0, col0 = _int(cell.get('row'), -1), _int(cell.get('col'), -1)
+            row_span, col_span = _int(cell.get('rowSpan'), 1), _int(cell.get('colSpan'), 1)
+            if not (row0 <= r < row0 + row_span and col0 <= c < col0 + col_span):
+                report('grid_outside_span', f"grid[{r}][{c}] is outside the span of {cell_id} "
+                       f"({row_span}x{col_span} at {row0},{col0})", page_id, tid)
+
+    highest = 0
+    for key, cell in cells.items():
+        if not isinstance(cell, dict):
+            report('table_shape', f"cell {key} is not an object", page_id, tid)
+            continue
+        highest = max(highest, _id_number(key))
+        if cell.get('id') != key:
+            if report('cell_id', f"cell {key} has id {cell.get('id')!r}", page_id, tid, fixable=True):
+                cell['id'] = key
+        count = seen.get(key, 0)
+        if count:
+            # Every position counted is inside the span, so equal counts mean exact coverage
+            area = _int(cell.get('rowSpan'), 1) * _int(cell.get('colSpan'), 1)
+            if not cell.get('hidden') and count != area:
+                report('span_coverage', f"{key} spans {area} positions but the grid shows it at {count}", page_id, tid)
+        elif not cell.get('hidden'):
+            report('cell_orphan', f"visible cell {key} is not in the grid", page_id, tid)
+    return highest
+
+
+def validate_document(document, fix=False):
+    """
+    Check `document` (a DocumentModel); returns (issues, number of issues
+    not listed). With `fix`, safe repairs are made to `document` in place
+    and their issues are marked "fixed".
+    """
+    report = _Report(fix)
+    pages = document.get('pages') if isinstance(document, dict) else None
+    if not isinstance(pages, list):
+        report('pages', "document has no pages list")
+        return report.issues, report.dropped
+
+    page_ids = set()
+    elements = {}  # id -> (page index, element), first occurrence
+    groups = {}    # groupId -> [member count, page indexes, first member]
+    highest = 0
+    for index, page in enumerate(pages):
+        if not isinstance(page, dict) or not isinstance(page.get('elements'), list):
+            report('pages', f"page {index + 1} has no elements list")
+            continue
+        page_id = page.get('id')
+        if page_id in page_ids:
+            report('duplicate_page_id', f"page id {page_id!r} is used twice", page_id)
+        page_ids.add(page_id)
+        for el in page['elements']:
+            if not isinstance(el, dict) or not isinstance(el.get('id'), str):
+                report('element_shape', "element without a string id", page_id)
+                continue
+            element_id = el['id']
+            if element_id in elements:
+                report('duplicate_element_id', f"element id {element_id} is used more than once", page_id, element_id)
+            else:
+                elements[element_id] = (index, el)
+            highest = max(highest, _id_number(element_id))
+            group = el.get('groupId')
+            if group is not None:
+                entry = groups.setdefault(group, [0, set(), el])
+                entry[0] += 1
+                entry[1].add(index)
+            if el.get('type') == 'table':
+                highest = max(highest, check_table(el, page_id, report))
+
+    if document.get('currentPageId') not in page_ids and pages:
+        first = pages[0].get('id') if isinstance(pages[0], dict) else None
+        if report('current_page', f"currentPageId {document.get('currentPageId')!r} is not a page", fixable=first is not None):
+            document['currentPageId'] = first
+
+    next_id = document.get('nextElementId')
+    if _int(next_id, 0) <= highest:
+        if report('next_element_id', f"nextElementId {next_id!r} is not above the highest id number {highest}", fixable=True):
+            document['nextElementId'] = highest + 1
+
+    for element_id, (index, el) in elements.items():
+        parent = el.get('parentId')
+        if parent is None:
+            continue
+        page_id = pages[index].get('id')
+        target = elements.get(parent)
+        if target is None:
+            if report('parent_missing', f"parentId {parent!r} is not an element", page_id, element_id, fixable=True):
+                el['parentId'] = None
+        elif target[0] != index:
+            report('parent_other_page', f"parent {parent} is on another page", page_id, element_id)
+
+    # Parent cycles: follow each chain once; ids on the current walk are "open"
+    state = {}
+    for start in elements:
+        walk, node = [], start
+        while node in elements and node not in state:
+            state[node] = 'open'
+            walk.append(node)
+            node = elements[node][1].get('parentId')
+        if state.get(node) == 'open':
+            index = elements[node][0]
+            report('parent_cycle', f"{node} is its own ancestor", pages[index].get('id'), node)
+        for node in walk:
+            state[node] = 'done'
+
+    for group, (count, indexes, member) in groups.items():
+        if count == 1:
+            if report('group_single', f"group {group} has a single element", pages[min(indexes)].get('id'),
+                      member['id'], fixable=True):
+                member['groupId'] = None
+        elif len(indexes) > 1:
+            report('group_pages', f"group {group} spans {len(indexes)} pages")
+    return report.issues, report.dropped
+
+
+def validate_file(path, fix=False):
+    """Check one saved file; returns its report entry ({"path", "status", "issues", ...})."""
+    entry = {'path': path, 'status': 'ok', 'issues': []}
+    try:
+        before = os.stat(path)
+        data = read_payload(path)
+        if not data:
+            entry.update(status='skipped', detail="no embedded document")
+            return entry
+        payload = parse_payload(data)
+        if not isinstance(payload, dict):
+            raise ValueError("the payload is not a document")
+        document = payload['document'] if isinstance(payload.get('document'), dict) else payload
+        issues, dropped = validate_document(document, fix)
+        entry['issues'] = issues
+        if dropped:
+            entry['more'] = dropped
+        fixed = sum(1 for issue in issues if issue.get('fixed'))
+        errors = sum(1 for issue in issues if issue['severity'] == 'error' and not issue.get('fixed'))
+        if fixed:
+            st = os.stat(path)
+            if (st.st_mtime_ns, st.st_size) != (before.st_mtime_ns, before.st_size):
+                entry.update(status='changed', detail="modified while being checked; not fixed")
+                for issue in issues:
+                    issue.pop('fixed', None)
+                return entry
+            write_payload(path, encode_like(payload, data))
+        entry['status'] = 'invalid' if errors or dropped else 'fixed' if fixed else 'warnings' if issues else 'ok'
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        entry.update(status='failed', detail=f"{type(e).__name__}: {e}")
+    return entry
+
+
+def _validate_batch(paths, fix):
+    return [validate_file(path, fix) for path in paths]
+
+
+def validate(inputs, jobs=None, fix=False, on_result=None):
+    """Check every file named by `inputs` (files, globs, directories). Returns counts per status."""
+    counts = {}
+
+    def batches():
+        batch = []
+        for path in iter_files(inputs):
+            batch.append(path)
+            if len(batch) >= BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def collect(entries):
+        for entry in entries:
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+            if on_result is not None:
+                on_result(entry)
+
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    if jobs == 1:
+        for batch in batches():
+            collect(_validate_batch(batch, fix))
+        return counts
+    limit = jobs * BATCHES_IN_FLIGHT_PER_WORKER
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = set()
+        for batch in batches():
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    collect(fut.result())
+            pending.add(pool.submit(_validate_batch, batch, fix))
+        for fut in pending:
+            collect(fut.result())
+    return counts
+
+
+def _print_entry(entry, verbose):
+    if entry['status'] == 'ok' or (entry['status'] == 'warnings' and not verbose):
+        return
+    print(f"{'❌' if entry['status'] in ('invalid', 'failed') else '⚠️ '} {entry['path']}: {entry['status']}"
+          + (f" ({entry['detail']})" if entry.get('detail') else ''))
+    for issue in entry['issues']:
+        where = '/'.join(str(part) for part in (issue.get('page'), issue.get('element')) if part is not None)
+        print(f"     {'fixed' if issue.get('fixed') else issue['severity']}: {issue['code']}"
+              + (f" [{where}]" if where else '') + f" {issue['message']}")
+    if entry.get('more'):
+        print(f"     ... and {entry['more']:,} more")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check saved certificates against the document invariants.")
+    parser.add_argument("inputs", nargs='+', help="Saved HTML files, globs or directories")
+    parser.add_argument("--fix", action="store_true", help="Repair what can be repaired safely, in place")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--jsonl", action="store_true", help="One JSON line per file on stdout instead of text")
+    parser.add_argument("--report", metavar="JSON", help="Also write the whole report to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Also list files that only have warnings")
+    args = parser.parse_args(argv)
+
+    entries = []
+
+    def on_result(entry):
+        if args.report:
+            entries.append(entry)
+        if args.jsonl:
+            print(json.dumps(entry, ensure_ascii=False), flush=True)
+        else:
+            _print_entry(entry, args.verbose)
+
+    started = time.perf_counter()
+    try:
+        counts = validate(args.inputs, args.jobs, args.fix, on_result)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'summary': counts, 'seconds': round(elapsed, 3), 'files': entries}, f, ensure_ascii=False, indent=1)
+    summary = ', '.join(f"{n:,} {status}" for status, n in counts.items()) or 'no files'
+    print(f"{'🛠️  Fixed' if args.fix else '🔍 Checked'} in {elapsed:.1f} s: {summary}", file=sys.stderr if args.jsonl else sys.stdout)
+    return 1 if counts.get('invalid') or counts.get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,621 @@
+#!/usr/bin/env python3
+"""
+Build documents without the browser: the editor's pure model ops in Python,
+plus bulk tables streamed from CSV/TSV and split across A4 pages.
+
+Typing a 5,000-row roster into a table (or pasting it through
+parseClipboardGrid / pasteGridIntoTable) makes the editor crawl, and one
+table that long doesn't fit on a page anyway. This builds the DocumentModel
+directly and hands it to combine_files to embed.
+
+The ops mirror their JavaScript namesakes and work on the same plain dicts
+(see the typedefs at the top of editor.core.js):
+
+  core.update.js    apply_patch_to_elements, apply_patch_to_table_cells, deep_merge
+  editor.tables.js  make_table_element, table_add_row / table_add_column,
+                    table_delete_row / table_delete_column, table_merge_range,
+                    table_unmerge, table_normalize_range, table_apply_*,
+                    parse_grid (parseClipboardGrid, with real CSV quoting),
+                    paste_grid_into_table
+  editor.core.js    generate_id, create_page
+
+Like the originals they return changed copies (cloned through JSON, as the
+editor's clone() does) and take the document whose nextElementId they draw
+new ids from.
+
+Bulk tables skip all of that: add_table_rows consumes rows from any iterator
+(read_rows streams a CSV/TSV file) and builds each page's table in one go.
+Every cell refers to the same styles object until the document is written,
+so memory stays at about the text itself. When the next row would cross the
+bottom of the page (A4 minus the document's header/footer heights and a
+margin), the table is closed and continued on a new page, with the header
+rows repeated; row heights come from `row_height` (a number or a function of
+the row). to_payload gives the payload (optionally with compact tables, see
+docformat.py), build writes a page with it embedded.
+
+Usage:
+  python docbuilder.py roster.csv -o roster.html --title "Participants" --header-rows 1
+  python docbuilder.py roster.tsv -o roster.html --widths 80,300,300 --row-height 28 --compact --paged
+  python docbuilder.py roster.csv --json roster.json
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import re
+import string
+import sys
+import time
+
+from docformat import compact_tables, hoist_assets
+
+# A4 (210 x 297 mm) in the editor's logical pixels (96 per inch)
+PAGE_WIDTH = 794
+PAGE_HEIGHT = 1123
+# Space kept clear of the page edges and the header/footer bands
+PAGE_MARGIN = 20
+DEFAULT_ROW_HEIGHT = 40
+DEFAULT_CELL_STYLES = {'alignH': 'left', 'alignV': 'top', 'padding': 8, 'bg': None,
+                       'borders': {'top': True, 'right': True, 'bottom': True, 'left': True}}
+HEADER_CELL_STYLES = {**DEFAULT_CELL_STYLES, 'bg': '#f3f4f6', 'bold': True}
+DEFAULT_BORDER = {'inner': 1, 'outer': 1, 'color': '#000', 'style': 'solid'}
+TEXT_STYLES = {'fill': '#ffffff', 'strokeColor': '#111827', 'strokeWidth': 1, 'radius': 4, 'textColor': '#111827',
+               'fontFamily': 'system-ui', 'fontSize': 14, 'bold': False, 'italic': False, 'underline': False}
+
+
+def _clone(obj):
+    # clone() in editor.tables.js: shared objects come out as separate copies
+    return json.loads(json.dumps(obj))
+
+
+# ----------------------------- document -----------------------------
+
+def new_document(header_height=10, footer_height=10):
+    """An empty DocumentModel, as a new editor document starts."""
+    return {'pages': [], 'currentPageId': '', 'nextElementId': 1, 'editMode': False,
+            'headerHeight': header_height, 'footerHeight': footer_height}
+
+
+def generate_id(document, prefix='el'):
+    """generateId(): "<prefix>-<nextElementId>", skipping ids elements already use."""
+    used = {el.get('id') for page in document['pages'] for el in page.get('elements') or []}
+    while True:
+        element_id = f"{prefix}-{document['nextElementId']}"
+        document['nextElementId'] += 1
+        if element_id not in used:
+            return element_id
+
+
+def generate_cell_id(table_id, r, c):
+    return f"{table_id}_{r}x{c}"
+
+
+def create_page(document, name=None):
+    """createPage(): append a new page (the first one becomes the current page)."""
+    suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
+    page = {'id': f"page-{int(time.time() * 1000)}-{suffix}",
+            'name': name or f"Page {len(document['pages']) + 1}", 'elements': []}
+    document['pages'].append(page)
+    if not document.get('currentPageId'):
+        document['currentPageId'] = page['id']
+    return page
+
+
+def content_top(document):
+    return (document.get('headerHeight') or 0) + PAGE_MARGIN
+
+
+def content_bottom(document):
+    return PAGE_HEIGHT - (document.get('footerHeight') or 0) - PAGE_MARGIN
+
+
+def add_text(document, page, content, x=PAGE_MARGIN, y=None, w=None, h=40, **styles):
+    """A text element on `page` (default styles as the editor adds them)."""
+    el = {'id': generate_id(document), 'type': 'text', 'x': x, 'y': content_top(document) if y is None else y,
+          'w': w or PAGE_WIDTH - 2 * PAGE_MARGIN, 'h': h, 'z': 1, 'styles': {**TEXT_STYLES, **styles},
+          'freeMove': False, 'content': content}
+    page['elements'].append(el)
+    return el
+
+
+# ----------------------------- core.update.js -----------------------------
+
+def deep_merge(target, patch):
+    out = _clone(target)
+    for key, value in (patch or {}).items():
+        if isinstance(value, dict):
+            out[key] = deep_merge(out.get(key) or {}, value)
+        else:
+            out[key] = value
+    return out
+
+
+def _current_page(document):
+    return next((p for p in document.get('pages') or [] if p.get('id') == document.get('currentPageId')), None)
+
+
+def apply_patch_to_elements(document, element_ids, patch):
+    """Copy of `document` with `patch` deep-merged into the given elements of the current page."""
+    doc = _clone(document)
+    page = _current_page(doc)
+    ids = {i for i in element_ids or [] if i}
+    if page is None or not ids:
+        return doc
+    page['elements'] = [deep_merge(el, patch or {}) if el.get('id') in ids else el for el in page['elements']]
+    return doc
+
+
+_PER_CELL_KEYS = ('strokeColor', 'strokeWidth', 'fontFamily', 'fontSize', 'bold', 'italic', 'underline',
+                  'borderColor', 'borderWidth')
+
+
+def apply_patch_to_table_cells(document, table_id, cell_range, style_patch):
+    """Copy of `document` with model style keys (fill, textColor, textAlignH/V, ...) applied to a cell range."""
+    doc = _clone(document)
+    page = _current_page(doc)
+    if page is None:
+        return doc
+    idx = next((i for i, el in enumerate(page['elements']) if el.get('id') == table_id), None)
+    if idx is None:
+        return doc
+    t = page['elements'][idx]
+    styles = style_patch or {}
+    if styles.get('fill') is not None:
+        t = table_apply_cell_bg(t, cell_range, styles['fill'])
+    if styles.get('textColor') is not None:
+        t = table_apply_text_color(t, cell_range, styles['textColor'])
+    if styles.get('textAlignH') or styles.get('textAlignV'):
+        t = table_apply_align(t, cell_range, styles.get('textAlignH'), styles.get('textAlignV'))
+    for key in _PER_CELL_KEYS:
+        if styles.get(key) is not None:
+            t = table_apply_cell_style(t, cell_range, key, styles[key])
+    page['elements'][idx] = t
+    return doc
+
+
+# ----------------------------- editor.tables.js -----------------------------
+
+def normalize_range(r0, c0, r1, c1):
+    return {'r0': min(r0, r1), 'c0': min(c0, c1), 'r1': max(r0, r1), 'c1': max(c0, c1)}
+
+
+def _new_cell(cell_id, r, c, styles=None, attrs=None, content=''):
+    return {'id': cell_id, 'row': r, 'col': c, 'rowSpan': 1, 'colSpan': 1, 'hidden': False, 'content': content,
+            'styles': styles if styles is not None else _clone(DEFAULT_CELL_STYLES), 'attrs': attrs if attrs is not None else {}}
+
+
+def make_table_element(document, rows=3, cols=4):
+    table_id = generate_id(document, 'tbl')
+    col_widths = [round(600 / cols)] * cols
+    row_heights = [DEFAULT_ROW_HEIGHT] * rows
+    cells, grid = {}, []
+    for r in range(rows):
+        grid.append([])
+        for c in range(cols):
+            cell_id = generate_cell_id(table_id, r, c)
+            cells[cell_id] = _new_cell(cell_id, r, c)
+            grid[r].append(cell_id)
+    return {'id': table_id, 'type': 'table', 'x': 100, 'y': 100, 'w': max(200, sum(col_widths)), 'h': sum(row_heights),
+            'rows': rows, 'cols': cols, 'colWidths': col_widths, 'rowHeights': row_heights,
+            'border': dict(DEFAULT_BORDER), 'cells': cells, 'grid': grid}
+
+
+def _span_end(cell, key):
+    return cell['row' if key == 'rowSpan' else 'col'] + (cell.get(key) or 1) - 1
+
+
+def table_add_row(document, t, at):
+    t = _clone(t)
+    at = min(max(at, 0), t['rows'])
+    row_heights = t['rowHeights'][:]
+    src = at - 1 if at > 0 else 0
+    row_heights.insert(at, row_heights[src] if src < len(row_heights) else DEFAULT_ROW_HEIGHT)
+    cells = t['cells']
+    new_grid, created, expanded = [], set(), set()
+    for r in range(t['rows'] + 1):
+        if r != at:
+            new_grid.append(t['grid'][r - 1 if r > at else r][:])
+            continue
+        new_row = []
+        for c in range(t['cols']):
+            # Inside a vertical span: map to the anchor and grow its rowSpan once
+            up = cells.get(t['grid'][at - 1][c]) if at > 0 else None
+            if up and up['row'] < at <= _span_end(up, 'rowSpan'):
+                new_row.append(up['id'])
+                if up['id'] not in expanded:
+                    up['rowSpan'] = (up.get('rowSpan') or 1) + 1
+                    expanded.add(up['id'])
+                continue
+            source = cells.get(t['grid'][src][c]) if t['grid'] else None
+            cell_id = generate_id(document, 'cell')
+            cells[cell_id] = _new_cell(cell_id, at, c, _clone(source['styles']) if source and source.get('styles') else None,
+                                       _clone(source['attrs']) if source and source.get('attrs') else {})
+            new_row.append(cell_id)
+            created.add(cell_id)
+        new_grid.append(new_row)
+    for cell in cells.values():
+        if cell['id'] not in created and cell['row'] >= at:
+            cell['row'] += 1
+    return {**t, 'rows': t['rows'] + 1, 'rowHeights': row_heights, 'grid': new_grid, 'cells': cells, 'h': sum(row_heights)}
+
+
+def table_add_column(document, t, at):
+    t = _clone(t)
+    at = min(max(at, 0), t['cols'])
+    col_widths = t['colWidths'][:]
+    src = at - 1 if at > 0 else 0
+    col_widths.insert(at, col_widths[src] if src < len(col_widths) else 100)
+    cells = t['cells']
+    new_grid, created, expanded = [], set(), set()
+    for r in range(t['rows']):
+        row = []
+        for c in range(t['cols'] + 1):
+            if c != at:
+                row.append(t['grid'][r][c - 1 if c > at else c])
+                continue
+            left = cells.get(t['grid'][r][at - 1]) if at > 0 else None
+            if left and left['col'] < at <= _span_end(left, 'colSpan'):
+                row.append(left['id'])
+                if left['id'] not in expanded:
+                    left['colSpan'] = (left.get('colSpan') or 1) + 1
+                    expanded.add(left['id'])
+                continue
+            source = cells.get(t['grid'][r][src]) if t['cols'] else None
+            cell_id = generate_id(document, 'cell')
+            cells[cell_id] = _new_cell(cell_id, r, at, _clone(source['styles']) if source and source.get('styles') else None,
+                                       _clone(source['attrs']) if source and source.get('attrs') else {})
+            row.append(cell_id)
+            created.add(cell_id)
+        new_grid.append(row)
+    for cell in cells.values():
+        if cell['id'] not in created and cell['col'] >= at:
+            cell['col'] += 1
+    return {**t, 'cols': t['cols'] + 1, 'colWidths': col_widths, 'grid': new_grid, 'cells': cells, 'w': sum(col_widths)}
+
+
+def table_delete_row(t, at):
+    if t['rows'] <= 1:
+        return t
+    t = _clone(t)
+    row_heights = t['rowHeights'][:]
+    del row_heights[at]
+    cells, removed = t['cells'], []
+    for cell in cells.values():
+        if cell['row'] <= at <= _span_end(cell, 'rowSpan'):
+            if (cell.get('rowSpan') or 1) > 1:
+                cell['rowSpan'] -= 1
+            else:
+                removed.append(cell['id'])
+        if cell['row'] > at:
+            cell['row'] -= 1
+    grid = t['grid'][:at] + t['grid'][at + 1:]
+    for cell_id in removed:
+        del cells[cell_id]
+    return {**t, 'rows': t['rows'] - 1, 'grid': grid, 'rowHeights': row_heights, 'cells': cells, 'h': sum(row_heights)}
+
+
+def table_delete_column(t, at):
+    if t['cols'] <= 1:
+        return t
+    t = _clone(t)
+    col_widths = t['colWidths'][:]
+    del col_widths[at]
+    cells, removed = t['cells'], []
+    for cell in cells.values():
+        if cell['col'] <= at <= _span_end(cell, 'colSpan'):
+            if (cell.get('colSpan') or 1) > 1:
+                cell['colSpan'] -= 1
+            else:
+                removed.append(cell['id'])
+        if cell['col'] > at:
+            cell['col'] -= 1
+    grid = [row[:at] + row[at + 1:] for row in t['grid']]
+    for cell_id in removed:
+        del cells[cell_id]
+    return {**t, 'cols': t['cols'] - 1, 'grid': grid, 'colWidths': col_widths, 'cells': cells, 'w': sum(col_widths)}
+
+
+def table_split_anchor(document, t, r, c):
+    """Undo the merge covering (r, c), in place (tableSplitAnchor)."""
+    anchor_id = t['grid'][r][c]
+    cell = t['cells'].get(anchor_id)
+    if not cell or (cell['rowSpan'] == 1 and cell['colSpan'] == 1):
+        return t
+    row, col, row_span, col_span = cell['row'], cell['col'], cell['rowSpan'], cell['colSpan']
+    for rr in range(row, row + row_span):
+        for cc in range(col, col + col_span):
+            cell_id = anchor_id if (rr, cc) == (row, col) else generate_id(document, 'cell')
+            if cell_id not in t['cells']:
+                t['cells'][cell_id] = _new_cell(cell_id, rr, cc, _clone(cell['styles']), _clone(cell.get('attrs') or {}))
+            t['grid'][rr][cc] = cell_id
+            t['cells'][cell_id].update(hidden=False, rowSpan=1, colSpan=1)
+    cell['rowSpan'] = cell['colSpan'] = 1
+    return t
+
+
+def table_normalize_range(document, t, r0, c0, r1, c1):
+    """Copy of `t` with every merge touching the range split up."""
+    t = _clone(t)
+    rng = normalize_range(r0, c0, r1, c1)
+    seen = set()
+    for r in range(rng['r0'], rng['r1'] + 1):
+        for c in range(rng['c0'], rng['c1'] + 1):
+            cell_id = t['grid'][r][c]
+            if cell_id in seen:
+                continue
+            seen.add(cell_id)
+            anchor = t['cells'][cell_id]
+            if anchor['rowSpan'] > 1 or anchor['colSpan'] > 1:
+                t = table_split_anchor(document, t, anchor['row'], anchor['col'])
+    return t
+
+
+def table_merge_range(document, t, r0, c0, r1, c1):
+    t = table_normalize_range(document, t, r0, c0, r1, c1)
+    rng = normalize_range(r0, c0, r1, c1)
+    anchor_id = t['grid'][rng['r0']][rng['c0']]
+    cell = t['cells'][anchor_id]
+    cell.update(row=rng['r0'], col=rng['c0'], rowSpan=rng['r1'] - rng['r0'] + 1, colSpan=rng['c1'] - rng['c0'] + 1)
+    for r in range(rng['r0'], rng['r1'] + 1):
+        for c in range(rng['c0'], rng['c1'] + 1):
+            cell_id = t['grid'][r][c]
+            if cell_id != anchor_id:
+                t['cells'][cell_id]['hidden'] = True
+                t['grid'][r][c] = anchor_id
+    return t
+
+
+def table_unmerge(document, t, r, c):
+    t = _clone(t)
+    cell = t['cells'].get(t['grid'][r][c])
+    if not cell or (cell['rowSpan'] == 1 and cell['colSpan'] == 1):
+        return t
+    return table_split_anchor(document, t, cell['row'], cell['col'])
+
+
+def _range_cells(t, cell_range):
+    """Visible cells of the range, once per grid position (as the JS loops visit them)."""
+    for r in range(cell_range['r0'], cell_range['r1'] + 1):
+        for c in range(cell_range['c0'], cell_range['c1'] + 1):
+            cell = t['cells'].get(t['grid'][r][c])
+            if cell and not cell.get('hidden'):
+                yield cell
+
+
+def table_apply_cell_bg(t, cell_range, color):
+    t = _clone(t)
+    for cell in _range_cells(t, cell_range):
+        cell['styles']['bg'] = color
+    return t
+
+
+def table_apply_text_color(t, cell_range, color):
+    t = _clone(t)
+    for cell in _range_cells(t, cell_range):
+        cell['styles']['textColor'] = color
+    return t
+
+
+def table_apply_align(t, cell_range, align_h=None, align_v=None):
+    t = _clone(t)
+    for cell in _range_cells(t, cell_range):
+        if align_h:
+            cell['styles']['alignH'] = align_h
+        if align_v:
+            cell['styles']['alignV'] = align_v
+    return t
+
+
+def table_apply_cell_style(t, cell_range, key, value):
+    t = _clone(t)
+    for cell in _range_cells(t, cell_range):
+        cell['styles'][key] = value
+        # Stroke changes on a borderless cell turn its borders on, as in the editor
+        if key in ('strokeColor', 'strokeWidth'):
+            sides = cell['styles'].get('borders')
+            if not (sides and any(sides.get(side) for side in ('top', 'right', 'bottom', 'left'))):
+                cell['styles']['borders'] = {'top': True, 'right': True, 'bottom': True, 'left': True}
+    return t
+
+
+def _delimiter(sample):
+    # parseClipboardGrid: tabs win; otherwise whichever of , and ; is more common
+    if '\t' in sample:
+        return '\t'
+    return ';' if sample.count(';') > sample.count(',') else ','
+
+
+def parse_grid(text):
+    """parseClipboardGrid: TSV, CSV or semicolon CSV text as a list of rows (quoted fields allowed)."""
+    text = text.replace('\r\n', '\n').replace('\r', '\n').rstrip('\n')
+    if not text:
+        return [[]]
+    return list(csv.reader(io.StringIO(text), delimiter=_delimiter(text)))
+
+
+def read_rows(path, delimiter=None, encoding='utf-8-sig'):
+    """Stream the rows of a CSV/TSV file (delimiter detected from the first 64 KB unless given)."""
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        if delimiter is None:
+            delimiter = _delimiter(f.read(65536))
+            f.seek(0)
+        for row in csv.reader(f, delimiter=delimiter):
+            if row:
+                yield row
+
+
+def paste_grid_into_table(document, t, start_r, start_c, grid):
+    """pasteGridIntoTable (formulas are kept in attrs.formula for the editor to evaluate)."""
+    rows, cols = len(grid), max([len(row) for row in grid] + [1])
+    t = _clone(t)
+    while t['rows'] < start_r + rows:
+        t = table_add_row(document, t, t['rows'])
+    while t['cols'] < start_c + cols:
+        t = table_add_column(document, t, t['cols'])
+    t = table_normalize_range(document, t, start_r, start_c, start_r + rows - 1, start_c + cols - 1)
+    for rr, values in enumerate(grid):
+        for cc in range(cols):
+            cell = t['cells'].get(t['grid'][start_r + rr][start_c + cc])
+            if not cell or cell.get('hidden'):
+                continue
+            raw = str(values[cc]) if cc < len(values) and values[cc] is not None else ''
+            if raw.strip().startswith('='):
+                cell['attrs'] = {**(cell.get('attrs') or {}), 'formula': raw.strip()}
+            else:
+                cell['content'] = raw
+                if (cell.get('attrs') or {}).get('formula') and not raw.strip():
+                    del cell['attrs']['formula']
+    return t
+
+
+# ----------------------------- bulk tables -----------------------------
+
+def table_from_rows(document, rows, col_widths, row_heights, header_rows=0, x=PAGE_MARGIN, y=PAGE_MARGIN,
+                    styles=None, header_styles=None):
+    """
+    A table element holding `rows` (lists of values) in one pass; the first
+    `header_rows` rows get `header_styles`. All cells share their styles and
+    attrs objects (see the module docstring).
+    """
+    table_id = generate_id(document, 'tbl')
+    styles = styles if styles is not None else DEFAULT_CELL_STYLES
+    header_styles = header_styles if header_styles is not None else HEADER_CELL_STYLES
+    cols = len(col_widths)
+    attrs = {}
+    cells, grid = {}, []
+    for r, values in enumerate(rows):
+        cell_styles = header_styles if r < header_rows else styles
+        ids = [f"{table_id}_{r}x{c}" for c in range(cols)]
+        for c, cell_id in enumerate(ids):
+            value = values[c] if c < len(values) else ''
+            cells[cell_id] = {'id': cell_id, 'row': r, 'col': c, 'rowSpan': 1, 'colSpan': 1, 'hidden': False,
+                              'content': '' if value is None else str(value), 'styles': cell_styles, 'attrs': attrs}
+        grid.append(ids)
+    return {'id': table_id, 'type': 'table', 'x': x, 'y': y, 'w': sum(col_widths), 'h': sum(row_heights),
+            'rows': len(grid), 'cols': cols, 'colWidths': list(col_widths), 'rowHeights': list(row_heights),
+            'border': dict(DEFAULT_BORDER), 'cells': cells, 'grid': grid}
+
+
+def add_table_rows(document, rows, col_widths=None, header=(), row_height=DEFAULT_ROW_HEIGHT, header_height=None,
+                   x=PAGE_MARGIN, y=None, page=None, styles=None, header_styles=None, page_name=None):
+    """
+    Lay out `rows` (any iterable of value lists) as tables from `y` on `page`
+    (default: the last page, or a new one) downwards, continuing on new pages
+    with the `header` rows repeated. `row_height` is a number or a function
+    of the row. Columns default to the page width split evenly. Returns the
+    table elements added.
+    """
+    header = [list(row) for row in header]
+    rows = iter(rows)
+    first = next(rows, None)
+    if col_widths is None:
+        cols = max([len(row) for row in header + ([first] if first is not None else [])] + [1])
+        col_widths = [(PAGE_WIDTH - x - PAGE_MARGIN) // cols] * cols
+    height_of = row_height if callable(row_height) else (lambda row: row_height)
+    header_heights = [header_height or height_of(row) for row in header]
+    if page is None:
+        page = document['pages'][-1] if document['pages'] else create_page(document)
+    top = content_top(document) if y is None else y
+    bottom = content_bottom(document)
+    tables, chunk, heights = [], [], []
+
+    def flush():
+        t = table_from_rows(document, header + chunk, col_widths, header_heights + heights, len(header), x, top,
+                            styles, header_styles)
+        page['elements'].append(t)
+        tables.append(t)
+
+    used = top + sum(header_heights)
+    pending = [first] if first is not None else []
+    for row in _chain(pending, rows):
+        height = height_of(row)
+        # A row taller than a whole page still gets a page of its own
+        if chunk and used + height > bottom:
+            flush()
+            page = create_page(document, page_name and page_name.format(n=len(document['pages']) + 1))
+            top = content_top(document)
+            used = top + sum(header_heights)
+            chunk, heights = [], []
+        chunk.append(row)
+        heights.append(height)
+        used += height
+    if chunk or header:
+        flush()
+    return tables
+
+
+def _chain(first, rest):
+    yield from first
+    yield from rest
+
+
+# ----------------------------- output -----------------------------
+
+def to_payload(document, compact=False, app='docbuilder'):
+    """The payload to embed (schema 2, or 4 with compact tables; see docformat.py)."""
+    payload = {'schema': 1, 'app': app, 'document': document}
+    return compact_tables(payload) if compact else hoist_assets(payload)
+
+
+def dumps_payload(document, compact=False):
+    return json.dumps(to_payload(document, compact), ensure_ascii=False, separators=(',', ':'))
+
+
+def build(document, output_file, html_file='index.html', profile='editor', compact=False, paged=False, **kwargs):
+    """Write `output_file`: `html_file` combined with its assets and `document` embedded (helper.combine_files)."""
+    from helper import combine_files
+    return combine_files(html_file, output_file, document_data=dumps_payload(document, compact),
+                         profile=profile, paged=paged, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a document with a (long) table from a CSV/TSV file, split across A4 pages.")
+    parser.add_argument("rows_file", help="CSV or TSV file (delimiter detected, quoted fields allowed)")
+    parser.add_argument("-o", "--output", help="Combined HTML file to write")
+    parser.add_argument("--json", metavar="FILE", help="Write the payload JSON to this file")
+    parser.add_argument("--html", default="index.html", help="Page to combine (default: index.html)")
+    parser.add_argument("--profile", default="editor", help="Build profile (editor or viewer)")
+    parser.add_argument("--title", help="Text on top of the first page")
+    parser.add_argument("--header-rows", type=int, default=1, help="Leading rows repeated on every page (default: 1)")
+    parser.add_argument("--widths", help="Column widths in px, comma-separated (default: the page width split evenly)")
+    parser.add_argument("--row-height", type=int, default=DEFAULT_ROW_HEIGHT, help=f"Row height in px (default: {DEFAULT_ROW_HEIGHT})")
+    parser.add_argument("--delimiter", help="Field delimiter (default: detected)")
+    parser.add_argument("--compact", action="store_true", help="Compact tables in the payload (schema 4)")
+    parser.add_argument("--paged", action="store_true", help="Embed the payload in the paged encoding (with -o)")
+    args = parser.parse_args(argv)
+    if not args.output and not args.json:
+        parser.error("nothing to write: give -o and/or --json")
+
+    started = time.perf_counter()
+    try:
+        widths = [int(w) for w in re.split(r'[,\s]+', args.widths.strip())] if args.widths else None
+        rows = read_rows(args.rows_file, args.delimiter)
+        header = [row for _, row in zip(range(args.header_rows), rows)]
+        document = new_document()
+        page = create_page(document)
+        y = None
+        if args.title:
+            title = add_text(document, page, args.title, h=40, fontSize=20, bold=True)
+            y = title['y'] + title['h'] + 10
+        tables = add_table_rows(document, rows, widths, header, args.row_height, y=y, page=page)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    body_rows = sum(t['rows'] - len(header) for t in tables)
+    print(f"📄 {body_rows:,} rows on {len(document['pages'])} pages ({time.perf_counter() - started:.2f} s)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(dumps_payload(document, args.compact))
+        print(f"✅ Wrote {args.json}")
+    if args.output:
+        if not build(document, args.output, args.html, args.profile, args.compact, args.paged):
+            return 1
+    print(f"⏱️  Done in {time.perf_counter() - started:.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
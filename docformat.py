@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Document payload transforms: the image asset table (payload schema 2), the
+paged encoding (schema 3) and compact tables (schema 4).
+
+Images added in the editor are data URLs in the `src` of image elements. In a
+schema-2 payload each distinct image is stored once in a top-level `assets`
+table keyed by a content hash, and elements refer to it as "asset:<id>":
+
+  {"schema": 2, "app": "...", "assets": {"<id>": "data:image/png;base64,..."},
+   "document": {"pages": [{"elements": [{"type": "image", "src": "asset:<id>"}]}]}}
+
+A logo repeated on every page is then encoded once per file, which keeps the
+payload (and every JSON.parse and native-host save of it) small. Ids are
+opaque: the editor (serializeDocument) and this module hash differently, and
+loaders only look ids up, never recompute them. Schema-1 payloads and bare
+documents keep their images inline; hoist_assets migrates them.
+
+The editor keeps data URLs in its in-memory model (deserializeDocument
+resolves the table), so tools that want plain documents use document_of.
+
+Schema 3 adds the paged encoding for large documents. The payload text is a
+small JSON index on the first line, then one line per segment: every page
+and every asset is deflated (zlib) and base64-encoded on its own line.
+
+  {"schema": 3, "app": "...", "encoding": "paged-deflate",
+   "document": {<DocumentModel fields except pages>},
+   "pages": [{"id", "name", "segment": 0, "assets": ["<id>", ...]}, ...],
+   "assets": {"<id>": <segment>}, "segments": [<length of each segment line>]}
+  eJy...   (page 1: JSON of the page, with "asset:<id>" sources)
+  eJy...   (the JSON string of an asset's data URL)
+
+The loader (loadDocumentPayload in editor.core.js) parses the index, inflates
+the current page and its assets with DecompressionStream, renders, and fills
+in the other pages afterwards. Plain JSON payloads (schema 1-3) load as
+before; parse_payload reads both.
+
+Schema 4 compacts table elements, whose cells each carry their own styles
+object (usually identical across the table) and whose grid names the anchor
+cell of every position. Distinct cell styles are stored once in a top-level
+`styles` list and cells refer to them by index; cells become a list (their
+map keys are their ids), without fields at their defaults (rowSpan/colSpan 1,
+hidden false, empty content and attrs, row/col where the grid first shows the
+cell; a cell lacking any of those fields lists them in "absent"); grid rows
+hold cell indexes, with runs as [start, count] (start, start+1, ...) or
+[start, count, 0] (start repeated, i.e. a merged cell):
+
+  {"schema": 4, "app": "...", "assets": {...}, "styles": [{"alignH": "left", ...}],
+   "document": {"pages": [{"elements": [{"type": "table", ...,
+     "cells": [{"id": "cell-1", "styles": 0}, {"id": "cell-2", "styles": 0}, ...],
+     "grid": [[[0, 20]], [[20, 20]], ...]}]}]}}
+
+A table is only compacted if it decodes back to exactly what it was, so
+compact_tables is lossless; expand_tables (and parse_payload, for every
+reader) restores the plain form. migrateDocument in editor.core.js expands
+compact tables on load; the editor itself saves plain schema 2. Compact
+payloads can also be paged (the styles list goes in the index).
+
+A file can only be read by the app inlined in it, so the CLI checks that
+app's SCHEMA_VERSION first and skips files it can't load the new payload
+(move those onto a current build with reshell.py, then convert).
+
+Usage:
+  python docformat.py certificate.html            # hoist images into the asset table, in place
+  python docformat.py certificate.html --inline   # back to inline data URLs (schema 1)
+  python docformat.py certificate.html --paged    # paged encoding (schema 3)
+  python docformat.py out/*.html --compact        # compact tables (schema 4), any number of files
+  python docformat.py out/*.html --compact --paged
+"""
+
+import argparse
+import base64
+import copy
+import glob
+import hashlib
+import json
+import sys
+import zlib
+
+from docpayload import file_shell_schema, read_payload, write_payload
+
+# Newest payload schema the tools read; plain payloads are written as schema 2
+SCHEMA_VERSION = 4
+PLAIN_SCHEMA = 2
+PAGED_SCHEMA = 3
+COMPACT_SCHEMA = 4
+ASSET_PREFIX = 'asset:'
+PAGED_ENCODING = 'paged-deflate'
+# Payloads smaller than this gain little from paging (save_host.py, helper.py)
+PAGED_MIN_BYTES = 256 * 1024
+# Only embedded images are hoisted; remote URLs are short already
+_HOISTED_PREFIX = 'data:'
+
+
+def asset_id(data_url):
+    """Content hash used as the asset id (64 bits of SHA-256)."""
+    return hashlib.sha256(data_url.encode('utf-8')).hexdigest()[:16]
+
+
+def _unwrap(payload):
+    """(wrapper fields, document) for a {schema, app, document} payload or a bare document."""
+    if isinstance(payload, dict) and isinstance(payload.get('document'), dict):
+        return payload, payload['document']
+    return {'schema': 1}, payload if isinstance(payload, dict) else {}
+
+
+def _with_sources(document, replace):
+    """Copy of `document` with each image src passed through `replace`; untouched parts are shared."""
+    pages = []
+    for page in document.get('pages') or []:
+        if isinstance(page, dict) and isinstance(page.get('elements'), list):
+            elements = []
+            for el in page['elements']:
+                if isinstance(el, dict) and isinstance(el.get('src'), str):
+                    src = replace(el['src'])
+                    if src is not el['src']:
+                        el = {**el, 'src': src}
+                elements.append(el)
+            page = {**page, 'elements': elements}
+        pages.append(page)
+    return {**document, 'pages': pages}
+
+
+def hoist_assets(payload):
+    """
+    Return a schema-2 payload with every embedded image stored once in
+    `assets`. Accepts schema-1/2 payloads and bare documents; ids already in a
+    schema-2 table are kept. Assets no element uses any more are dropped.
+    """
+    wrapper, document = _unwrap(payload)
+    existing = wrapper.get('assets') if isinstance(wrapper.get('assets'), dict) else {}
+    ids = {data_url: key for key, data_url in existing.items()}
+    assets = {}
+
+    def hoist(src):
+        if src.startswith(ASSET_PREFIX):
+            key = src[len(ASSET_PREFIX):]
+            if key in existing:
+                assets[key] = existing[key]
+            return src
+        if not src.startswith(_HOISTED_PREFIX):
+            return src
+        key = ids.get(src)
+        if key is None:
+            key = ids[src] = asset_id(src)
+        assets[key] = src
+        return ASSET_PREFIX + key
+
+    document = _with_sources(document, hoist)
+    # Compact tables have no images, so they stay compact
+    schema = COMPACT_SCHEMA if 'styles' in wrapper else PLAIN_SCHEMA
+    return {**wrapper, 'schema': schema, 'assets': assets, 'document': document}
+
+
+def resolve_assets(payload):
+    """
+    Return a schema-1 payload with the images inline again (what schema-1
+    readers expect), and compact tables expanded. Unknown asset ids are left
+    as they are.
+    """
+    wrapper, document = _unwrap(expand_tables(payload))
+    assets = wrapper.get('assets') if isinstance(wrapper.get('assets'), dict) else {}
+    if assets:
+        def resolve(src):
+            if src.startswith(ASSET_PREFIX):
+                return assets.get(src[len(ASSET_PREFIX):], src)
+            return src
+        document = _with_sources(document, resolve)
+    out = {key: value for key, value in wrapper.items() if key != 'assets'}
+    out.update(schema=1, document=document)
+    return out
+
+
+def document_of(payload):
+    """The DocumentModel of any payload, with images as data URLs."""
+    return resolve_assets(payload)['document']
+
+
+_CELL_DEFAULTS = {'rowSpan': 1, 'colSpan': 1, 'hidden': False, 'content': '', 'attrs': {}}
+_FILLED_KEYS = ('row', 'col') + tuple(_CELL_DEFAULTS)
+
+
+def _grid_runs(row):
+    """A grid row of cell indexes (or None) as single indexes and [start, count(, 0)] runs."""
+    out, i = [], 0
+    while i < len(row):
+        value, n = row[i], 1
+        if isinstance(value, int):
+            step = 1 if i + 1 < len(row) and row[i + 1] == value + 1 else 0
+            while i + n < len(row) and row[i + n] == value + step * n:
+                n += 1
+        if n == 1:
+            out.append(value)
+        else:
+            out.append([value, n] if step else [value, n, 0])
+        i += n
+    return out
+
+
+def _grid_row(runs):
+    row = []
+    for item in runs:
+        if isinstance(item, list):
+            start, count, step = item[0], item[1], item[2] if len(item) > 2 else 1
+            row.extend(start + step * k for k in range(count))
+        else:
+            row.append(item)
+    return row
+
+
+def _first_positions(grid):
+    first = {}
+    for r, row in enumerate(grid):
+        for c, cell_id in enumerate(row):
+            if cell_id is not None and cell_id not in first:
+                first[cell_id] = (r, c)
+    return first
+
+
+def _compact_table(table, intern):
+    """The compact form of a table element, or None if it wouldn't decode back to `table` exactly."""
+    cells, grid = table.get('cells'), table.get('grid')
+    if not isinstance(cells, dict) or not isinstance(grid, list) or not all(isinstance(row, list) for row in grid):
+        return None
+    index = {cell_id: i for i, cell_id in enumerate(cells)}
+    if any(value is not None and not (isinstance(value, str) and value in index) for row in grid for value in row):
+        return None
+    first = _first_positions(grid)
+    compact_cells = []
+    for key, cell in cells.items():
+        if not isinstance(cell, dict) or cell.get('id') != key:
+            return None
+        out = {}
+        for name, value in cell.items():
+            if name in _CELL_DEFAULTS and value == _CELL_DEFAULTS[name] and type(value) is type(_CELL_DEFAULTS[name]):
+                continue
+            if name == 'styles' and isinstance(value, dict):
+                value = intern(value)
+            out[name] = value
+        if key in first and (cell.get('row'), cell.get('col')) == first[key]:
+            out.pop('row', None)
+            out.pop('col', None)
+        # Keys expansion fills in that this cell never had (e.g. no attrs in an older document)
+        absent = [name for name in _FILLED_KEYS if name not in cell]
+        if absent:
+            out['absent'] = absent
+        compact_cells.append(out)
+    return {**table, 'cells': compact_cells,
+            'grid': [_grid_runs([None if v is None else index[v] for v in row]) for row in grid]}
+
+
+def _expand_table(table, styles):
+    ids = [cell.get('id') for cell in table['cells']]
+    grid = [[None if v is None else ids[v] for v in _grid_row(row)] for row in table.get('grid') or []]
+    first = _first_positions(grid)
+    cells = {}
+    for compact in table['cells']:
+        cell_id = compact.get('id')
+        row, col = first.get(cell_id, (None, None))
+        cell = {'id': cell_id, 'row': row, 'col': col, **copy.deepcopy(_CELL_DEFAULTS)}
+        cell.update(compact)
+        for name in cell.pop('absent', None) or ():
+            cell.pop(name, None)
+        if isinstance(cell.get('styles'), int):
+            # Every cell gets its own copy: the editor edits them one by one
+            cell['styles'] = copy.deepcopy(styles[cell['styles']])
+        cells[cell_id] = cell
+    return {**table, 'cells': cells, 'grid': grid}
+
+
+def _map_tables(document, convert):
+    """Copy of `document` with every table element passed through `convert` (None keeps it)."""
+    def walk(elements):
+        out = []
+        for el in elements:
+            if isinstance(el, dict) and el.get('type') == 'table':
+                el = convert(el) or el
+            out.append(el)
+        return out
+    return {**document, 'pages': [{**page, 'elements': walk(page['elements'])}
+                                  if isinstance(page, dict) and isinstance(page.get('elements'), list) else page
+                                  for page in document.get('pages') or []]}
+
+
+def compact_tables(payload):
+    """
+    Return a schema-4 payload with its tables compacted (see the module
+    docstring); images are hoisted as in hoist_assets. A payload without
+    tables worth compacting comes back as plain schema 2.
+    """
+    payload = hoist_assets(expand_tables(payload))
+    styles, ids = [], {}
+
+    def compact(table):
+        added = []
+
+        def intern(style):
+            key = _dumps(style)
+            if key not in ids:
+                ids[key] = len(styles)
+                styles.append(style)
+                added.append(key)
+            return ids[key]
+
+        packed = _compact_table(table, intern)
+        # Lossless or not at all
+        if packed is None or _expand_table(packed, styles) != table:
+            # Drop the styles only this table added (always the last ones)
+            for key in added:
+                del ids[key]
+            del styles[len(styles) - len(added):]
+            return None
+        return packed
+
+    document = _map_tables(payload['document'], compact)
+    if not any(isinstance(el, dict) and el.get('type') == 'table' and isinstance(el.get('cells'), list)
+               for page in document.get('pages') or [] if isinstance(page, dict)
+               for el in page.get('elements') or []):
+        return payload
+    return {**payload, 'schema': COMPACT_SCHEMA, 'styles': styles, 'document': document}
+
+
+def expand_tables(payload):
+    """`payload` with compact tables expanded and no styles table (schema 2); other payloads as they are."""
+    wrapper, document = _unwrap(payload)
+    if 'styles' not in wrapper:
+        return payload
+    styles = wrapper['styles'] if isinstance(wrapper['styles'], list) else []
+    document = _map_tables(document, lambda t: _expand_table(t, styles) if isinstance(t.get('cells'), list) else None)
+    out = {key: value for key, value in wrapper.items() if key != 'styles'}
+    out.update(schema=PLAIN_SCHEMA, document=document)
+    return out
+
+
+def _dumps(payload):
+    # Same compact form as JSON.stringify in serializeDocument
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+def _pack(value):
+    return base64.b64encode(zlib.compress(_dumps(value).encode('utf-8'), 6)).decode('ascii')
+
+
+def _unpack(segment):
+    return json.loads(zlib.decompress(base64.b64decode(segment)).decode('utf-8'))
+
+
+def encode_paged(payload):
+    """Payload text in the paged encoding (schema 3); images are hoisted into assets first."""
+    payload = hoist_assets(payload)
+    document = payload['document']
+    segments, pages, asset_segments = [], [], {}
+    for page in document.get('pages') or []:
+        used = []
+        if isinstance(page, dict):
+            for el in page.get('elements') or []:
+                src = el.get('src') if isinstance(el, dict) else None
+                if isinstance(src, str) and src.startswith(ASSET_PREFIX) and src[len(ASSET_PREFIX):] not in used:
+                    used.append(src[len(ASSET_PREFIX):])
+        entry = {'id': page.get('id') if isinstance(page, dict) else None,
+                 'name': page.get('name') if isinstance(page, dict) else None,
+                 'segment': len(segments), 'assets': used}
+        pages.append(entry)
+        segments.append(_pack(page))
+    for key, data_url in payload['assets'].items():
+        asset_segments[key] = len(segments)
+        segments.append(_pack(data_url))
+    header = {key: value for key, value in payload.items() if key not in ('assets', 'document')}
+    header.update(
+        schema=COMPACT_SCHEMA if 'styles' in payload else PAGED_SCHEMA,
+        encoding=PAGED_ENCODING,
+        document={key: value for key, value in document.items() if key != 'pages'},
+        pages=pages,
+        assets=asset_segments,
+        segments=[len(seg) for seg in segments],
+    )
+    return '\n'.join([_dumps(header)] + segments)
+
+
+def paged_header(text):
+    """The index of a paged payload, or None if `text` is a plain JSON payload."""
+    newline = text.find('\n')
+    if newline == -1 or not text.startswith('{"'):
+        return None
+    try:
+        header = json.loads(text[:newline])
+    except ValueError:
+        return None
+    return header if isinstance(header, dict) and header.get('encoding') == PAGED_ENCODING else None
+
+
+def parse_payload(text):
+    """
+    Parse payload text of any encoding into a payload object (plain JSON
+    payloads as they are, paged ones expanded to the schema-2 form with an
+    assets table, compact tables expanded). Raises ValueError for text that
+    is neither.
+    """
+    header = paged_header(text)
+    if header is None:
+        return expand_tables(json.loads(text)) if text.strip() else {}
+    segments = text.split('\n')[1:]
+    if [len(seg) for seg in segments] != header.get('segments'):
+        raise ValueError("Paged payload is damaged: segment lengths do not match its index")
+    try:
+        pages = [_unpack(segments[entry['segment']]) for entry in header.get('pages') or []]
+        assets = {key: _unpack(segments[index]) for key, index in (header.get('assets') or {}).items()}
+    except (KeyError, IndexError, TypeError, zlib.error, base64.binascii.Error) as e:
+        raise ValueError(f"Paged payload is damaged: {e}")
+    out = {key: value for key, value in header.items() if key not in ('encoding', 'pages', 'segments', 'document', 'assets')}
+    out.update(schema=PLAIN_SCHEMA, assets=assets, document={**(header.get('document') or {}), 'pages': pages})
+    return expand_tables(out)
+
+
+def maybe_paged(text, min_bytes=PAGED_MIN_BYTES):
+    """Plain payload text re-encoded as paged when it is at least `min_bytes`; anything else unchanged."""
+    if len(text) < min_bytes or paged_header(text) is not None:
+        return text
+    return encode_paged(json.loads(text))
+
+
+def encode_like(payload, text):
+    """`payload` as text in the encoding of `text` (bare, schema 1, 2, compact and/or paged), for writing a file back as it was."""
+    header = paged_header(text)
+    if header is not None:
+        return encode_paged(compact_tables(payload) if header.get('schema') == COMPACT_SCHEMA else payload)
+    original = json.loads(text) if text.strip() else {}
+    if not isinstance(original, dict) or not isinstance(original.get('document'), dict):
+        return _dumps(document_of(payload))
+    schema = original.get('schema') or 1
+    if schema == 1:
+        return _dumps(resolve_assets(payload))
+    return _dumps(compact_tables(payload) if schema == COMPACT_SCHEMA else hoist_assets(payload))
+
+
+def _html_files(patterns):
+    # Windows shells don't expand wildcards
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        yield from matches
+
+
+class ShellTooOld(ValueError):
+    """The file's app can't load the payload schema a conversion would write."""
+
+
+def _needed_schema(args):
+    """Payload schema an app must load to read what `args` asks to write."""
+    if args.inline:
+        return 1
+    if args.compact:
+        return COMPACT_SCHEMA
+    return PAGED_SCHEMA if args.paged else PLAIN_SCHEMA
+
+
+def convert_file(html_file, args):
+    """
+    Re-encode one file's payload as `args` asks; returns (payload chars
+    before, after, file size). Raises ShellTooOld, leaving the file alone,
+    when its app predates the schema that would be written.
+    """
+    data = read_payload(html_file)
+    if not data:
+        raise ValueError("no embedded document")
+    needed, loads = _needed_schema(args), file_shell_schema(html_file)
+    if loads < needed:
+        raise ShellTooOld(f"its app loads payload schema {loads} at most, this needs {needed}; "
+                          f"move it onto a current build first (reshell.py)")
+    payload = parse_payload(data)
+    if args.inline:
+        out = _dumps(resolve_assets(payload))
+    else:
+        payload = compact_tables(payload) if args.compact else hoist_assets(payload)
+        out = encode_paged(payload) if args.paged else _dumps(payload)
+    return len(data), len(out), write_payload(html_file, out, args.output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move a saved file's images into the payload asset table (or back inline).")
+    parser.add_argument("html_files", nargs="+", help="Saved HTML files (wildcards allowed)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--inline", action="store_true", help="Write images back inline (schema 1)")
+    mode.add_argument("--compact", action="store_true", help="Compact tables: shared cell styles, run-length grid (schema 4)")
+    parser.add_argument("--paged", action="store_true", help="Compressed per-page segments (schema 3), for large documents")
+    parser.add_argument("-o", "--output", help="Write to this file instead of in place (one input file only)")
+    args = parser.parse_args(argv)
+    if args.inline and args.paged:
+        parser.error("--paged can't be combined with --inline")
+    files = list(_html_files(args.html_files))
+    if args.output and len(files) != 1:
+        parser.error("-o needs exactly one input file")
+
+    failed = skipped = before_total = after_total = 0
+    for html_file in files:
+        try:
+            before, after, size = convert_file(html_file, args)
+        except ShellTooOld as e:
+            print(f"⚠️  {html_file}: skipped, {e}", file=sys.stderr)
+            skipped += 1
+            continue
+        except (OSError, ValueError) as e:
+            print(f"❌ {html_file}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        before_total += before
+        after_total += after
+        print(f"✅ Wrote {args.output or html_file} ({size:,} bytes, payload {before:,} -> {after:,} chars)")
+    if len(files) > 1:
+        print(f"📦 {len(files) - failed - skipped} of {len(files)} files ({skipped} skipped), "
+              f"payloads {before_total:,} -> {after_total:,} chars")
+    return 1 if failed or not files else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
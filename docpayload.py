@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Read and replace the document payload of saved HTML files without decoding them.
+
+Every saved certificate embeds its DocumentModel as HTML-escaped JSON in
+<pre id="__doc__" style="display:none"> right after <body> (buildSaveHtml).
+The rest of the file is the inlined app, which is the same for every
+document. This module memory-maps a file, finds the payload span with
+byte searches, and only decodes the payload itself; replacing it writes the
+untouched prefix and suffix bytes straight from the map around the new
+payload. Standard library only, so save_host.py, helper.py and the batch
+tools can all share it.
+
+Besides the <pre id="__doc__"> payload (DOC_SLOT), the editor keeps its
+document store in <script id="__docs__" type="application/json">
+(INLINE_DOCS_SLOT). Functions take a `slot` to work on either one;
+splice_payloads replaces several at once and can first check that everything
+around them (the "shell") is what the caller expects.
+
+Usage:
+  python docpayload.py certificate.html                 # print the JSON payload
+  python docpayload.py certificate.html --set doc.json  # replace it in place
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import re
+import secrets
+import sys
+from typing import Callable, NamedTuple
+
+# Opening tag written by buildSaveHtml and helper.py (outerHTML keeps it byte-for-byte)
+PAYLOAD_OPEN = b'<pre id="__doc__" style="display:none">'
+# Any other spelling of the opening tag (attribute order/quotes/case)
+_PAYLOAD_OPEN_ANY = re.compile(rb"""<pre\b[^>]*?\sid\s*=\s*["']?__doc__(?![\w-])[^>]*>""", re.IGNORECASE)
+_BODY_OPEN = re.compile(rb"<body\b[^>]*>", re.IGNORECASE)
+# `const SCHEMA_VERSION = N;` of the app inlined in a shell (editor.core.js)
+SCHEMA_CONST = re.compile(rb"\bSCHEMA_VERSION\s*=\s*(\d+)")
+
+
+class PayloadSpan(NamedTuple):
+    """Byte offsets in a saved file: the payload text is data[start:end]."""
+    start: int
+    end: int
+
+
+class PayloadSlot(NamedTuple):
+    """An element whose text holds data: how to find it and how its text is escaped."""
+    name: str
+    open_tag: bytes
+    open_any: re.Pattern
+    close_tag: bytes
+    escape: Callable[[str], str]
+    unescape: Callable[[str], str]
+
+
+class ShellMismatch(ValueError):
+    """The markup around the payloads is not the one the caller expected."""
+
+
+def escape_document_data(document_data: str) -> str:
+    """HTML-escape a serialized document for <pre id="__doc__"> (same as buildSaveHtml)."""
+    return document_data.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def unescape_document_data(text: str) -> str:
+    """
+    Undo escape_document_data. Browsers serialize a <pre>'s text with only
+    &amp; &lt; &gt; and &nbsp;, so a few replaces beat html.unescape; &amp;
+    goes last so escaped entities inside the JSON survive.
+    """
+    if '&' not in text:
+        return text
+    return text.replace('&lt;', '<').replace('&gt;', '>').replace('&nbsp;', '\u00a0').replace('&amp;', '&')
+
+
+def escape_script_json(text: str) -> str:
+    """Make JSON safe as <script> text: '<' only occurs inside JSON strings, where \\u003c means the same."""
+    return text.replace('<', '\\u003c')
+
+
+def _unescape_script_json(text: str) -> str:
+    return text
+
+
+DOC_SLOT = PayloadSlot('__doc__', PAYLOAD_OPEN, _PAYLOAD_OPEN_ANY, b'</pre', escape_document_data, unescape_document_data)
+INLINE_DOCS_SLOT = PayloadSlot(
+    '__docs__', b'<script id="__docs__" type="application/json">',
+    re.compile(rb"""<script\b[^>]*?\sid\s*=\s*["']?__docs__(?![\w-])[^>]*>""", re.IGNORECASE),
+    b'</script', escape_script_json, _unescape_script_json)
+SLOTS = {slot.name: slot for slot in (DOC_SLOT, INLINE_DOCS_SLOT)}
+
+
+def _inside_raw_text(buf, pos):
+    """True if `pos` lies inside a <script> or <style> element (e.g. a string literal in the app code)."""
+    for name in (b'script', b'style'):
+        opened = buf.rfind(b'<' + name, 0, pos)
+        if opened != -1 and buf.find(b'</' + name, opened, pos) == -1:
+            return True
+    return False
+
+
+def find_payload(buf, slot=DOC_SLOT):
+    """
+    Locate a payload in a bytes-like object (bytes, mmap, memoryview).
+    Returns a PayloadSpan, or None if the file has no such payload.
+    """
+    pos = buf.find(slot.open_tag)
+    while pos != -1 and _inside_raw_text(buf, pos):
+        pos = buf.find(slot.open_tag, pos + 1)
+    if pos != -1:
+        start = pos + len(slot.open_tag)
+    else:
+        # Hand-edited files may spell the tag differently; fall back to a regex scan
+        for m in slot.open_any.finditer(buf):
+            if not _inside_raw_text(buf, m.start()):
+                start = m.end()
+                break
+        else:
+            return None
+    # The payload is escaped, so the first closing tag after it is its own
+    end = buf.find(slot.close_tag, start)
+    if end == -1:
+        return None
+    return PayloadSpan(start, end)
+
+
+def find_payloads(buf):
+    """(span, slot) for every known payload present in the file, in file order."""
+    found = [(find_payload(buf, slot), slot) for slot in SLOTS.values()]
+    return sorted(((span, slot) for span, slot in found if span is not None), key=lambda item: item[0])
+
+
+def shell_hash(buf, spans=None):
+    """
+    SHA-256 of the file with every payload's text left out. Two files with the
+    same shell hash differ only in their payloads.
+    """
+    digest = hashlib.sha256()
+    pos = 0
+    for span, _ in (find_payloads(buf) if spans is None else spans):
+        digest.update(buf[pos:span.start])
+        pos = span.end
+    digest.update(buf[pos:])
+    return digest.hexdigest()
+
+
+def file_shell_hash(path):
+    """shell_hash of a file on disk (memory-mapped)."""
+    with open(path, 'rb') as f:
+        buf = _open_map(f)
+        if buf is None:
+            return shell_hash(b'')
+        with buf:
+            return shell_hash(buf)
+
+
+def shell_schema(buf, spans=None):
+    """
+    The newest payload schema the file's own app can load: the SCHEMA_VERSION
+    in its shell (payload text is not searched). 1 when the app declares
+    none, as its loader then assumes.
+    """
+    pos = 0
+    for span, _ in (find_payloads(buf) if spans is None else spans) + [(PayloadSpan(len(buf), len(buf)), None)]:
+        m = SCHEMA_CONST.search(buf, pos, span.start)
+        if m:
+            return int(m.group(1))
+        pos = span.end
+    return 1
+
+
+def file_shell_schema(path):
+    """shell_schema of a file on disk (memory-mapped)."""
+    with open(path, 'rb') as f:
+        buf = _open_map(f)
+        if buf is None:
+            return 1
+        with buf:
+            return shell_schema(buf)
+
+
+def _open_map(f):
+    """Read-only map of an open file; None for an empty file (which mmap refuses)."""
+    if os.fstat(f.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_payload(path, slot=DOC_SLOT):
+    """
+    Return the unescaped JSON payload of a saved file ('' if the payload is
+    empty), or None if the file has no payload. Only the payload is decoded.
+    """
+    with open(path, 'rb') as f:
+        buf = _open_map(f)
+        if buf is None:
+            return None
+        with buf:
+            span = find_payload(buf, slot)
+            if span is None:
+                return None
+            return slot.unescape(buf[span.start:span.end].decode('utf-8'))
+
+
+def split_payload(path):
+    """
+    Return (prefix, document_data, suffix) for a saved file, with prefix and
+    suffix as raw bytes (ready to write around a new escaped payload) and
+    document_data unescaped. A file without a payload gets an empty one after
+    <body ...>, like buildSaveHtml. Returns None if there is no <body> either.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    span = find_payload(data)
+    if span is not None:
+        return data[:span.start], unescape_document_data(data[span.start:span.end].decode('utf-8')), data[span.end:]
+    body = _BODY_OPEN.search(data)
+    if not body:
+        return None
+    return data[:body.end()] + b'\n  ' + PAYLOAD_OPEN, '', b'</pre>' + data[body.end():]
+
+
+def create_temp(output_path):
+    """
+    Open a new temp file next to `output_path` for writing, to os.replace it
+    with later. The name is unique, so processes saving the same file at once
+    never share one, and the file gets the permissions `output_path` should
+    keep: its current ones, or what open() gives a new file. Returns
+    (binary file object, temp path).
+    """
+    directory, name = os.path.split(os.path.abspath(output_path))
+    try:
+        mode = os.stat(output_path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = None
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    while True:
+        tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{secrets.token_hex(4)}.tmp")
+        try:
+            fd = os.open(tmp_path, flags, 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        return os.fdopen(fd, 'wb'), tmp_path
+    except BaseException:
+        os.close(fd)
+        discard_temp(tmp_path)
+        raise
+
+
+def discard_temp(tmp_path):
+    """Remove a temp file left by a write that failed (best effort)."""
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+
+def _finish_temp(out, fsync):
+    if fsync:
+        out.flush()
+        os.fsync(out.fileno())
+
+
+def write_payload(path, document_data, output_path=None, fsync=False):
+    """
+    Replace the payload of a saved file with `document_data` (a JSON string),
+    in place or into `output_path`. The prefix and suffix are copied as bytes
+    from the map; the result is written to a temp file and swapped in with
+    os.replace (after an fsync of the temp file with `fsync`). Returns the
+    number of bytes written.
+    Raises ValueError if the file has neither a payload nor a <body> tag.
+    """
+    output_path = output_path or path
+    payload = escape_document_data(document_data).encode('utf-8')
+    tmp_path = None
+    try:
+        with open(path, 'rb') as f:
+            buf = _open_map(f)
+            if buf is None:
+                raise ValueError(f"{path} is empty")
+            with buf:
+                span = find_payload(buf)
+                if span is None:
+                    body = _BODY_OPEN.search(buf)
+                    if not body:
+                        raise ValueError(f"{path} has no <pre id=\"__doc__\"> payload and no <body> tag")
+                    parts = (buf[:body.end()], b'\n  ' + PAYLOAD_OPEN, payload, b'</pre>', buf[body.end():])
+                else:
+                    parts = (buf[:span.start], payload, buf[span.end:])
+                out, tmp_path = create_temp(output_path)
+                with out:
+                    for part in parts:
+                        out.write(part)
+                    _finish_temp(out, fsync)
+        # The map is closed before the swap; Windows refuses to replace a mapped file
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if tmp_path:
+            discard_temp(tmp_path)
+        raise
+    return sum(len(part) for part in parts)
+
+
+def splice_payloads(path, payloads, expected_shell=None, output_path=None, fsync=False):
+    """
+    Replace several payloads at once. `payloads` maps slot names (see SLOTS)
+    to new text; slots not listed keep their current text. With
+    `expected_shell`, the file's shell_hash must match it first. Raises
+    ShellMismatch if it doesn't or if a listed payload is missing from the
+    file. With `fsync`, the temp file is flushed to disk before the swap.
+    Returns the number of bytes written.
+    """
+    output_path = output_path or path
+    tmp_path = None
+    written = 0
+    try:
+        with open(path, 'rb') as f:
+            buf = _open_map(f)
+            if buf is None:
+                raise ShellMismatch(f"{path} is empty")
+            with buf:
+                spans = find_payloads(buf)
+                present = {slot.name for _, slot in spans}
+                missing = [name for name in payloads if name not in present]
+                if missing:
+                    raise ShellMismatch(f"{path} has no {', '.join(missing)} payload")
+                if expected_shell is not None and shell_hash(buf, spans) != expected_shell:
+                    raise ShellMismatch(f"{path} was changed since it was last saved in full")
+                out, tmp_path = create_temp(output_path)
+                with out:
+                    pos = 0
+                    for span, slot in spans:
+                        if slot.name not in payloads:
+                            continue
+                        written += out.write(buf[pos:span.start])
+                        written += out.write(slot.escape(payloads[slot.name]).encode('utf-8'))
+                        pos = span.end
+                    written += out.write(buf[pos:])
+                    _finish_temp(out, fsync)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if tmp_path:
+            discard_temp(tmp_path)
+        raise
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print or replace the document payload of a saved HTML file.")
+    parser.add_argument("html_file", help="Saved HTML file")
+    parser.add_argument("--set", metavar="JSON_FILE", help="Replace the payload with the contents of this JSON file")
+    parser.add_argument("-o", "--output", help="With --set, write to this file instead of in place")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.set:
+            with open(args.set, 'r', encoding='utf-8') as f:
+                size = write_payload(args.html_file, f.read(), args.output)
+            print(f"✅ Wrote {args.output or args.html_file} ({size:,} bytes)")
+            return 0
+        data = read_payload(args.html_file)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if data is None:
+        print(f"❌ {args.html_file} has no embedded document", file=sys.stderr)
+        return 1
+    sys.stdout.write(data + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
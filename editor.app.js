@@ -738,6 +738,7 @@ function autosaveInline(){
     if (__inlineSaveTimer) clearTimeout(__inlineSaveTimer);
     __inlineSaveTimer = setTimeout(async () => {
       __inlineSaveTimer = null;
+      await whenDocumentLoaded();
       // Mirror the standard save path: update inline snapshot then ask extension to save
       try { InlineDocs.set(AppState.activeDocId, Model.document); } catch {}
       try { indicateSaving(); } catch {}
@@ -3491,46 +3492,7 @@ async function loadExternalScript(src){
 
 // Export implementation moved to export.service.js
 
-function serializeDocument(){
-  const payload = {
-    schema: (typeof SCHEMA_VERSION === 'number' ? SCHEMA_VERSION : 1),
-    app: (typeof APP_VERSION === 'string' ? APP_VERSION : ''),
-    document: Model.document
-  };
-  return JSON.stringify(payload);
-}
-function normalizeDocument(doc){
-  const out = (doc && typeof doc === 'object') ? doc : { pages: [], currentPageId:'', nextElementId:1, editMode:false };
-  if (!Array.isArray(out.pages)) out.pages = [];
-  if (typeof out.currentPageId !== 'string') out.currentPageId = out.pages[0]?.id || '';
-  if (typeof out.nextElementId !== 'number') out.nextElementId = 1;
-  if (typeof out.editMode !== 'boolean') out.editMode = false;
-  return out;
-}
-function migrateDocument(doc, fromVersion){
-  let d = normalizeDocument(doc);
-  const to = (typeof SCHEMA_VERSION === 'number' ? SCHEMA_VERSION : 1);
-  // For now schemas are identical. Place future migrations here.
-  if (fromVersion === to) return d;
-  // Example: if (fromVersion === 0) { /* mutate d to new shape */ }
-  return d;
-}
-function deserializeDocument(json){
-  const parsed = JSON.parse(json);
-  // Back-compat: older saves stored raw document object
-  if (parsed && Array.isArray(parsed.pages)) {
-    Model.document = normalizeDocument(parsed);
-    return;
-  }
-  // New format wrapper
-  if (parsed && parsed.document) {
-    const fromSchema = Number(parsed.schema || 1);
-    const doc = migrateDocument(parsed.document, fromSchema);
-    Model.document = normalizeDocument(doc);
-    return;
-  }
-  // Fallback: keep existing in-memory document
-}
+/* serializeDocument, normalizeDocument, migrateDocument, deserializeDocument moved to editor.core.js */
 function download(filename, content, type='text/html'){
   const blob = new Blob([content], { type });
   const url = URL.createObjectURL(blob);
@@ -3683,7 +3645,7 @@ async function __tryLoadAutosaveSnapshot(){
           const file = await fh.getFile(); const html = await file.text();
           const m = html.match(/<pre\s+id=["']__doc__["'][^>]*>([\s\S]*?)<\/pre>/i);
             if (m && m[1]) {
-              try { deserializeDocument(m[1].replaceAll('&lt;','<')); window.__docLoaded = true; loaded = true; console.info('[App] Loaded OPFS autosave snapshot'); } catch(e){ console.warn('[App] Failed to deserialize OPFS snapshot', e); }
+              try { await loadDocumentPayload(m[1].replaceAll('&lt;','<'), () => renderAll()); window.__docLoaded = true; loaded = true; console.info('[App] Loaded OPFS autosave snapshot'); } catch(e){ console.warn('[App] Failed to deserialize OPFS snapshot', e); }
             }
         } catch {}
       }
@@ -3704,7 +3666,7 @@ async function __tryLoadAutosaveSnapshot(){
             if (m2 && m2[1]) jsonPayload = m2[1].replaceAll('&lt;','<');
         }
         if (jsonPayload){
-          try { deserializeDocument(jsonPayload); window.__docLoaded = true; loaded = true; console.info('[App] Loaded localStorage autosave snapshot'); } catch(e){ console.warn('[App] Failed to deserialize localStorage snapshot', e); }
+          try { await loadDocumentPayload(jsonPayload, () => renderAll()); window.__docLoaded = true; loaded = true; console.info('[App] Loaded localStorage autosave snapshot'); } catch(e){ console.warn('[App] Failed to deserialize localStorage snapshot', e); }
         }
       }
     } catch(e){ try { console.warn('[App] localStorage autosave load error', e); } catch {} }
@@ -3728,6 +3690,7 @@ async function writeFile(handle, content){
 
 
 async function saveDocument(){
+  await whenDocumentLoaded();
   // Update inline snapshot first
   try { if (AppState?.activeDocId) InlineDocs.set(AppState.activeDocId, Model.document); } catch {}
   // Show immediate feedback (extension will also emit start)
@@ -87,7 +87,14 @@ const HISTORY_LIMIT = 10;
 const History = { past: [], future: [] };
 const APP_VERSION = 'v1.0.0';
 // Schema for serialized document payloads
-const SCHEMA_VERSION = 1;
+// 2: image data URLs are stored once in payload.assets, elements use "asset:<id>"
+// 3: large payloads may use the paged encoding (see loadDocumentPayload)
+// 4: tables may be compact, with cell styles in payload.styles (docformat.py --compact)
+const SCHEMA_VERSION = 4;
+// serializeDocument writes plain JSON, which is schema 2
+const PLAIN_SCHEMA_VERSION = 2;
+const ASSET_PREFIX = 'asset:';
+const PAGED_ENCODING = 'paged-deflate';
 
 function isElementIdInUse(id){
   try {
@@ -103,6 +110,236 @@ function generateId(prefix = 'el') {
   return id;
 }
 
+/* ----------------------- Serialization ----------------------- */
+// Asset ids are content hashes (cyrb53). Loaders only look them up, so they
+// need not match the SHA-256 based ids docformat.py writes.
+const __assetIds = new Map();
+function assetId(dataUrl){
+  let id = __assetIds.get(dataUrl);
+  if (id) return id;
+  let h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+  for (let i = 0; i < dataUrl.length; i++){
+    const ch = dataUrl.charCodeAt(i);
+    h1 = Math.imul(h1 ^ ch, 2654435761);
+    h2 = Math.imul(h2 ^ ch, 1597334677);
+  }
+  h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+  h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+  id = (h2 >>> 0).toString(16).padStart(8, '0') + (h1 >>> 0).toString(16).padStart(8, '0');
+  // Hashing a large image on every save adds up; images replaced long ago are dropped
+  if (__assetIds.size >= 64) __assetIds.clear();
+  __assetIds.set(dataUrl, id);
+  return id;
+}
+// Copy of the document with each embedded image moved into `assets`; untouched
+// pages and elements are shared with the model, not cloned
+function hoistAssets(doc, assets){
+  const pages = (doc.pages || []).map(p => {
+    if (!p || !Array.isArray(p.elements) || !p.elements.some(el => typeof el?.src === 'string' && el.src.startsWith('data:'))) return p;
+    const elements = p.elements.map(el => {
+      if (typeof el?.src !== 'string' || !el.src.startsWith('data:')) return el;
+      const id = assetId(el.src);
+      assets[id] = el.src;
+      return { ...el, src: ASSET_PREFIX + id };
+    });
+    return { ...p, elements };
+  });
+  return { ...doc, pages };
+}
+// Put the data URLs back in place (the in-memory model always holds them)
+function resolveAssets(doc, assets){
+  if (!assets || typeof assets !== 'object') return doc;
+  (doc.pages || []).forEach(p => (p?.elements || []).forEach(el => {
+    if (typeof el?.src === 'string' && el.src.startsWith(ASSET_PREFIX)) {
+      const src = assets[el.src.slice(ASSET_PREFIX.length)];
+      if (typeof src === 'string') el.src = src;
+    }
+  }));
+  return doc;
+}
+function serializeDocument(){
+  if (!fillPendingPages(Model.document)) throw new Error('The document is still loading');
+  const assets = {};
+  const doc = hoistAssets(Model.document, assets);
+  const payload = {
+    schema: PLAIN_SCHEMA_VERSION,
+    app: (typeof APP_VERSION === 'string' ? APP_VERSION : ''),
+    assets,
+    document: doc
+  };
+  return JSON.stringify(payload);
+}
+function normalizeDocument(doc){
+  const out = (doc && typeof doc === 'object') ? doc : { pages: [], currentPageId:'', nextElementId:1, editMode:false };
+  if (!Array.isArray(out.pages)) out.pages = [];
+  if (typeof out.currentPageId !== 'string') out.currentPageId = out.pages[0]?.id || '';
+  if (typeof out.nextElementId !== 'number') out.nextElementId = 1;
+  if (typeof out.editMode !== 'boolean') out.editMode = false;
+  return out;
+}
+/* Compact tables (schema 4, written by docformat.py): `cells` is a list with
+   default fields left out (rowSpan/colSpan 1, hidden false, empty content and
+   attrs, row/col where the grid first shows the cell) and `styles` an index
+   into payload.styles; grid rows hold cell indexes, with runs as
+   [start, count] (start, start+1, ...) or [start, count, 0] (start repeated). */
+function expandGridRow(runs){
+  const row = [];
+  (runs || []).forEach(item => {
+    if (!Array.isArray(item)) { row.push(item); return; }
+    const [start, count] = item, step = item.length > 2 ? item[2] : 1;
+    for (let k = 0; k < count; k++) row.push(start + step * k);
+  });
+  return row;
+}
+function expandCompactTable(t, styles){
+  const ids = t.cells.map(c => c?.id);
+  const grid = (t.grid || []).map(runs => expandGridRow(runs).map(i => (i === null ? null : ids[i])));
+  const first = new Map();
+  grid.forEach((row, r) => row.forEach((id, c) => { if (id != null && !first.has(id)) first.set(id, [r, c]); }));
+  const cells = {};
+  t.cells.forEach(compact => {
+    const [row, col] = first.get(compact.id) || [null, null];
+    const cell = { id: compact.id, row, col, rowSpan: 1, colSpan: 1, hidden: false, content: '', attrs: {}, ...compact };
+    // Fields the cell never had are listed so they aren't filled in
+    (cell.absent || []).forEach(k => { delete cell[k]; });
+    delete cell.absent;
+    // Each cell gets its own copy: cells are edited one by one
+    if (typeof cell.styles === 'number') cell.styles = deepClone(styles?.[cell.styles] ?? {});
+    cells[compact.id] = cell;
+  });
+  return { ...t, cells, grid };
+}
+function expandCompactTables(doc, styles){
+  (doc.pages || []).forEach(p => {
+    if (!p || !Array.isArray(p.elements)) return;
+    p.elements = p.elements.map(el => (el?.type === 'table' && Array.isArray(el.cells)) ? expandCompactTable(el, styles) : el);
+  });
+  return doc;
+}
+function migrateDocument(doc, fromVersion, assets, styles){
+  let d = normalizeDocument(doc);
+  const to = (typeof SCHEMA_VERSION === 'number' ? SCHEMA_VERSION : 1);
+  // 1 -> 2: images moved to payload.assets. Schema-1 documents already hold
+  // their data URLs inline, as the model does; serializeDocument hoists them
+  // on the next save.
+  if (fromVersion >= 2) d = resolveAssets(d, assets);
+  // 3 -> 4: compact tables; serializeDocument writes them out plain again
+  if (fromVersion >= 4) d = expandCompactTables(d, styles);
+  if (fromVersion === to) return d;
+  // Example: if (fromVersion === 0) { /* mutate d to new shape */ }
+  return d;
+}
+function deserializeDocument(json){
+  const parsed = JSON.parse(json);
+  // Back-compat: older saves stored raw document object
+  if (parsed && Array.isArray(parsed.pages)) {
+    Model.document = normalizeDocument(parsed);
+    return;
+  }
+  // New format wrapper
+  if (parsed && parsed.document) {
+    const fromSchema = Number(parsed.schema || 1);
+    const doc = migrateDocument(parsed.document, fromSchema, parsed.assets, parsed.styles);
+    Model.document = normalizeDocument(doc);
+    return;
+  }
+  // Fallback: keep existing in-memory document
+}
+
+/* Paged payloads (schema 3, written by docformat.py, helper.py --paged and the
+   native host for large documents): the first line is a JSON index, every
+   other line one page or one asset, deflated and base64-encoded. Only the
+   index and the current page are decoded before the first render; the other
+   pages start as stubs ({ id, name, elements: [], __pending: true }) and are
+   filled in from the background. */
+const __decodedPages = new Map(); // page id -> decoded page of the payload being loaded
+let __pagesLoading = null;        // Promise while pages are still being decoded
+let __pagedLoads = 0;             // bumped per load, so a superseded load stops
+function pagedPayloadHeader(text){
+  const nl = text.indexOf('\n');
+  if (nl === -1 || !text.startsWith('{"')) return null;
+  try {
+    const header = JSON.parse(text.slice(0, nl));
+    return (header && header.encoding === PAGED_ENCODING) ? header : null;
+  } catch { return null; }
+}
+function base64Bytes(b64){
+  if (typeof Uint8Array.fromBase64 === 'function') return Uint8Array.fromBase64(b64);
+  const bin = atob(b64);
+  const bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  return bytes;
+}
+async function inflateSegment(b64){
+  const stream = new Blob([base64Bytes(b64)]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return JSON.parse(await new Response(stream).text());
+}
+// Replace stubs in `doc` with pages decoded since; false if some are still pending
+function fillPendingPages(doc){
+  let complete = true;
+  (doc?.pages || []).forEach((p, i) => {
+    if (!p || !p.__pending) return;
+    const page = __decodedPages.get(p.id);
+    if (!page) { complete = false; return; }
+    // Elements added to the stub while it was loading go on top
+    doc.pages[i] = p.elements?.length ? { ...page, elements: page.elements.concat(p.elements) } : page;
+  });
+  return complete;
+}
+function whenDocumentLoaded(){ return __pagesLoading || Promise.resolve(); }
+// Load payload text of either encoding into Model.document. Plain JSON is
+// parsed in one go (deserializeDocument). A paged payload resolves once its
+// current page is in; `onPagesLoaded` runs when all pages are.
+async function loadDocumentPayload(text, onPagesLoaded){
+  const header = pagedPayloadHeader(text);
+  if (!header) { deserializeDocument(text); return; }
+  if (typeof DecompressionStream !== 'function') throw new Error('This browser cannot open compressed documents (no DecompressionStream)');
+  // Segment offsets come from the index, so the text is never split up
+  const starts = [];
+  let pos = text.indexOf('\n') + 1;
+  (header.segments || []).forEach(len => { starts.push(pos); pos += len + 1; });
+  const segment = i => text.slice(starts[i], starts[i] + header.segments[i]);
+  const assets = {};
+  async function loadPage(entry){
+    for (const id of entry.assets || []){
+      const at = header.assets?.[id];
+      if (!(id in assets) && at !== undefined) assets[id] = await inflateSegment(segment(at));
+    }
+    const doc = resolveAssets({ pages: [await inflateSegment(segment(entry.segment))] }, assets);
+    // Pages arrive after migrateDocument has run, so they are expanded here
+    return expandCompactTables(doc, header.styles).pages[0];
+  }
+  const entries = header.pages || [];
+  const load = ++__pagedLoads;
+  __decodedPages.clear();
+  const doc = { ...(header.document || {}) };
+  const first = Math.max(0, entries.findIndex(e => e.id === doc.currentPageId));
+  doc.pages = entries.map(e => ({ id: e.id, name: e.name, elements: [], __pending: true }));
+  if (entries.length) {
+    __decodedPages.set(entries[first].id, await loadPage(entries[first]));
+    fillPendingPages(doc);
+  }
+  Model.document = migrateDocument(doc, Number(header.schema || 1));
+  if (entries.length < 2) return;
+  const loading = __pagesLoading = (async () => {
+    try {
+      for (let i = 0; i < entries.length; i++){
+        if (i === first) continue;
+        const page = await loadPage(entries[i]);
+        if (load !== __pagedLoads) return;
+        __decodedPages.set(entries[i].id, page);
+      }
+      fillPendingPages(Model.document);
+    } catch (e) {
+      // Stubs stay pending, so nothing can save over the pages that failed
+      try { console.warn('[Load] Some pages could not be decoded', e); } catch {}
+    } finally {
+      if (__pagesLoading === loading) __pagesLoading = null;
+    }
+    if (load === __pagedLoads && typeof onPagesLoaded === 'function') onPagesLoaded();
+  })();
+}
+
 /* ----------------------- DOM refs ----------------------- */
 const pagesList = () => document.getElementById('pagesList');
 const elementsPanel = () => document.getElementById('elementsPanel');
@@ -181,6 +418,7 @@ function undo() {
   if (!History.past.length) return;
   History.future.push(nowSnapshot());
   Model.document = History.past.pop();
+  fillPendingPages(Model.document);
   renderAll();
   updateUndoRedoButtons();
 }
@@ -188,6 +426,7 @@ function redo() {
   if (!History.future.length) return;
   History.past.push(nowSnapshot());
   Model.document = History.future.pop();
+  fillPendingPages(Model.document);
   renderAll();
   updateUndoRedoButtons();
 }
@@ -2,7 +2,22 @@
 // Facade for PDF export with preflight.
 
 const ExportService = (function(){
+	// Builds made with a vendor cache embed the library as inert text (see helper.py).
+	// Evaluate that copy instead of fetching; the temporary <script> is removed right
+	// away so saved files keep only the inert copy.
+	const evaluatedVendored = new Set();
+	function evalVendoredScript(src){
+		if (evaluatedVendored.has(src)) return false;
+		const inert = document.querySelector(`script[type="text/plain"][data-vendor-src="${src}"]`);
+		if (!inert) return false;
+		const s = document.createElement('script');
+		s.textContent = inert.textContent.replace(/<\\\/(script)/gi, '</$1').replace(/<\\!--/g, '<!--');
+		document.head.appendChild(s); s.remove();
+		evaluatedVendored.add(src);
+		return true;
+	}
 	async function loadExternalScript(src){
+		if (evalVendoredScript(src)) return;
 		return new Promise((resolve, reject) => {
 			let existing = document.querySelector(`script[data-dynamic-src="${src}"]`);
 			if (existing){ if (existing.dataset.loaded === 'true') return resolve(); existing.addEventListener('load', () => resolve()); existing.addEventListener('error', () => reject(new Error('Failed to load: '+src))); return; }
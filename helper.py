@@ -4,11 +4,79 @@ HTML Combiner Helper Script
 Combines `index.html` with all local CSS and JS files referenced via
 <link rel="stylesheet" href="..."> and <script src="..."></script>
 into a single self-contained HTML file.
+
+Builds are incremental. A small JSON build cache next to the output records
+the content hash of the page and of every asset, plus where each piece landed
+in the previous output. Unchanged pieces are copied straight from the previous
+output instead of being re-read, and an unchanged tree skips the write
+entirely. Run with --watch to rebuild whenever a source file changes.
+
+The page is tokenized once and each asset is streamed from disk into the
+output in fixed-size chunks, so memory use stays flat however large the
+assets get.
+
+Third-party export libraries (html2canvas, jsPDF) are taken from a local
+vendor cache (`vendor/` next to the page, filled with --fetch-vendor) and
+embedded as inert <script type="text/plain"> blocks in place of their CDN
+<script> tags. The export service evaluates them on first use, so they cost
+nothing at startup and need no network.
+
+Several pages that share CSS/JS can be built in one run with --entries
+(globs, or a JSON manifest): they build in parallel and each shared asset is
+read, hashed and rendered once through an in-memory AssetCache.
 """
 
+import argparse
+import glob
+import hashlib
+import io
+import json
 import os
 import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import NamedTuple, Optional
+
+from docformat import encode_paged, parse_payload
+from docpayload import PAYLOAD_OPEN, create_temp, escape_document_data
+from minify import minify_css, minify_js
+
+# Bump when the layout of the build cache changes; older caches are ignored.
+BUILD_CACHE_VERSION = 5
+
+# Build profiles. Elements in the page can carry data-build="editor" (or any
+# space-separated list of profiles); they are dropped, along with their
+# contents, from builds for other profiles. Unmarked elements are always kept.
+BUILD_PROFILES = ('editor', 'viewer')
+
+# CDN scripts that are embedded from the local vendor cache when present.
+# The URLs must match the ones export.service.js asks for.
+VENDOR_DIR = 'vendor'
+VENDOR_LIBS = {
+    'https://cdnjs.cloudflare.com/ajax/libs/html2canvas/1.4.1/html2canvas.min.js': 'html2canvas.min.js',
+    'https://cdnjs.cloudflare.com/ajax/libs/jspdf/2.5.1/jspdf.umd.min.js': 'jspdf.umd.min.js',
+}
+
+# Assets are copied to the output in chunks of this size, so memory use does
+# not grow with asset size.
+STREAM_CHUNK_SIZE = 1 << 16
+
+_TAG_OPEN = re.compile(r"<(/?)([A-Za-z][A-Za-z0-9:-]*)")
+_ATTR = re.compile(r"""\s*([^\s"'>/=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"'=<>`]+))?""")
+_TAG_END = re.compile(r"\s*/?>")
+_RAW_TEXT_CLOSE = {name: re.compile(f"</{name}\\s*>", re.IGNORECASE) for name in ('script', 'style', 'textarea', 'title')}
+# Sequences that would end or confuse a <script> element; export.service.js undoes this
+_SCRIPT_DATA_ESCAPES = ((re.compile(r"</(script)", re.IGNORECASE), r"<\\/\1"), (re.compile(r"<!--"), r"<\\!--"))
+# Opening tag of the embedded document payload (matches buildSaveHtml)
+DOC_PAYLOAD_OPEN = PAYLOAD_OPEN.decode('ascii')
+
+# Segment kinds backed by a file on disk
+_ASSET_KINDS = ('css', 'js', 'vendor')
+_VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
 
 def read_file(filepath):
     """Read file content safely"""
@@ -36,145 +104,815 @@ def _is_local_asset(src: str) -> bool:
     return True
 
 
-def _inline_css_links(html_content: str, base_dir: str) -> str:
-    """Replace local <link ... rel="stylesheet" href="..."> with inline <style>."""
-    link_pattern = re.compile(r"<link([^>]*)href=['\"]([^'\"]+)['\"]([^>]*)>", flags=re.IGNORECASE)
-
-    def replace_link(match: re.Match) -> str:
-        pre_attrs = match.group(1) or ''
-        href = match.group(2) or ''
-        post_attrs = match.group(3) or ''
-        attrs_combined = f"{pre_attrs} {post_attrs}".lower()
-        if 'rel="stylesheet"' not in attrs_combined and 'rel=stylesheet' not in attrs_combined:
-            return match.group(0)
-        if not _is_local_asset(href):
-            return match.group(0)
-        css_path = os.path.normpath(os.path.join(base_dir, href))
-        css_content = read_file(css_path)
-        if not css_content:
-            return match.group(0)
-        return f"\n  <style>\n{css_content}\n  </style>\n"
-
-    return link_pattern.sub(replace_link, html_content)
-
-
-def _extract_local_scripts(html_content: str, base_dir: str):
-    """
-    Remove local <script src="..."></script> tags from HTML and collect their
-    contents in original document order. Returns (html_without_local_src, script_tags).
-    script_tags is a list of strings like '<script>...</script>' or
-    '<script type="module">...</script>' preserving 'type="module"' if present.
-    """
-    script_pattern = re.compile(r"<script([^>]*)src=['\"]([^'\"]+)['\"]([^>]*)>\s*</script>", flags=re.IGNORECASE)
-
-    collected_tags = []
-
-    def replace_script(match: re.Match) -> str:
-        pre_attrs = match.group(1) or ''
-        src = match.group(2) or ''
-        post_attrs = match.group(3) or ''
-        attrs_combined = f"{pre_attrs} {post_attrs}".lower()
-        if not _is_local_asset(src):
-            return match.group(0)
-        js_path = os.path.normpath(os.path.join(base_dir, src))
-        js_content = read_file(js_path)
-        if not js_content:
-            return ''
-        is_module = 'type="module"' in attrs_combined or 'type=module' in attrs_combined
-        if is_module:
-            collected_tags.append(f"\n  <script type=\"module\">\n{js_content}\n  </script>\n")
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_signature(path):
+    """Cheap change detector: (mtime_ns, size), or None if the file is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _hash_file(path):
+    try:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                h.update(chunk)
+        return h.hexdigest()
+    except OSError:
+        return None
+
+
+def _iter_tokens(html_content: str):
+    """
+    Minimal HTML tokenizer. Yields (kind, start, end, name, attrs) where kind is
+    'tag', 'endtag', 'comment' or 'text'. Attribute names are lower-cased and
+    the contents of raw-text elements (script, style, ...) come back as a single
+    'text' token, so markup inside them is never mistaken for tags.
+    """
+    pos = 0
+    n = len(html_content)
+    while pos < n:
+        lt = html_content.find('<', pos)
+        if lt < 0:
+            yield ('text', pos, n, None, None)
+            return
+        if html_content.startswith('<!--', lt):
+            close = html_content.find('-->', lt + 4)
+            end = n if close < 0 else close + 3
+            if lt > pos:
+                yield ('text', pos, lt, None, None)
+            yield ('comment', lt, end, None, None)
+            pos = end
+            continue
+        match = _TAG_OPEN.match(html_content, lt)
+        if not match:
+            # Doctype, processing instruction or a stray '<': pass through as text
+            gt = html_content.find('>', lt)
+            end = n if gt < 0 else gt + 1
+            if not html_content.startswith(('<!', '<?'), lt):
+                end = lt + 1
+            yield ('text', pos, end, None, None)
+            pos = end
+            continue
+        is_end, name = match.group(1) == '/', match.group(2).lower()
+        attrs = {}
+        cursor = match.end()
+        while True:
+            tail = _TAG_END.match(html_content, cursor)
+            if tail:
+                cursor = tail.end()
+                break
+            attr = _ATTR.match(html_content, cursor)
+            if not attr or attr.end() == cursor:
+                gt = html_content.find('>', cursor)
+                cursor = n if gt < 0 else gt + 1
+                break
+            value = attr.group(2)
+            if value and value[0] in '"\'':
+                value = value[1:-1]
+            attrs.setdefault(attr.group(1).lower(), value if value is not None else '')
+            cursor = attr.end()
+        if lt > pos:
+            yield ('text', pos, lt, None, None)
+        yield ('endtag' if is_end else 'tag', lt, cursor, name, attrs)
+        pos = cursor
+        if not is_end and name in _RAW_TEXT_CLOSE:
+            close = _RAW_TEXT_CLOSE[name].search(html_content, pos)
+            raw_end = n if not close else close.start()
+            if raw_end > pos:
+                yield ('text', pos, raw_end, None, None)
+            pos = raw_end
+
+
+def _in_profile(attrs, profile):
+    """True if an element's data-build attribute (if any) includes `profile`."""
+    marker = (attrs or {}).get('data-build')
+    return marker is None or profile in marker.lower().split()
+
+
+def _skip_element(html_content, tokens, start, end, name):
+    """
+    Consume the rest of an element whose start tag was just read; returns the
+    end offset of its closing tag. Void and self-closing tags end immediately.
+    """
+    if name in _VOID_ELEMENTS or html_content[start:end].rstrip().endswith('/>'):
+        return end
+    depth = 1
+    for kind, _, inner_end, inner_name, _ in tokens:
+        end = inner_end
+        if inner_name != name:
+            continue
+        if kind == 'tag':
+            depth += 1
+        elif kind == 'endtag':
+            depth -= 1
+            if depth == 0:
+                break
+    return end
+
+
+def _plan_template(html_content: str, base_dir: str, profile: str = 'editor'):
+    """
+    Split the page into an ordered list of output segments in a single
+    tokenizer pass. Elements marked with a data-build attribute that does not
+    list `profile` are left out entirely.
+
+    Each segment is a dict with a 'kind':
+      - 'text':   literal page markup ('text')
+      - 'css':    local stylesheet inlined in place ('path'; 'fallback' is the
+                  original <link> tag, kept when the file is missing or empty)
+      - 'js':     local script, moved to just before </body> ('path', 'module')
+      - 'vendor': CDN script from VENDOR_LIBS, embedded inert in place from
+                  the vendor cache ('path', 'src'; 'fallback' is the original
+                  <script> element, kept when the library isn't cached)
+      - 'doc':    the embedded document payload, right after <body ...>
+    """
+    plan = []
+    scripts = []
+    scripts_at = None
+    pos = 0
+    tokens = _iter_tokens(html_content)
+
+    def add_text(text):
+        if text:
+            plan.append({'kind': 'text', 'text': text})
+
+    for kind, start, end, name, attrs in tokens:
+        if kind == 'tag' and not _in_profile(attrs, profile):
+            add_text(html_content[pos:start])
+            pos = _skip_element(html_content, tokens, start, end, name)
+            # Don't leave a blank line where the element used to be
+            if plan and plan[-1]['kind'] == 'text':
+                stripped = plan[-1]['text'].rstrip(' \t')
+                if stripped.endswith('\n') and html_content.startswith('\n', pos):
+                    plan[-1]['text'] = stripped
+                    pos += 1
+            continue
+        if kind == 'tag' and name == 'link':
+            rels = (attrs.get('rel') or '').lower().split()
+            href = attrs.get('href') or ''
+            if 'stylesheet' not in rels or not _is_local_asset(href):
+                continue
+            add_text(html_content[pos:start])
+            plan.append({'kind': 'css', 'path': os.path.normpath(os.path.join(base_dir, href)), 'fallback': html_content[start:end]})
+            pos = end
+        elif kind == 'tag' and name == 'script':
+            src = (attrs.get('src') or '').strip()
+            vendored = VENDOR_LIBS.get(src)
+            if not vendored and not _is_local_asset(src):
+                continue
+            # Swallow the (empty) body and the closing tag along with the opening tag
+            close_end = end
+            for inner_kind, _, inner_end, inner_name, _ in tokens:
+                close_end = inner_end
+                if inner_kind == 'endtag' and inner_name == 'script':
+                    break
+            add_text(html_content[pos:start])
+            if vendored:
+                path = os.path.normpath(os.path.join(base_dir, VENDOR_DIR, vendored))
+                plan.append({'kind': 'vendor', 'path': path, 'src': src, 'fallback': html_content[start:close_end]})
+                pos = close_end
+                continue
+            is_module = (attrs.get('type') or '').strip().lower() == 'module'
+            scripts.append({'kind': 'js', 'path': os.path.normpath(os.path.join(base_dir, src)), 'module': is_module})
+            pos = close_end
+        elif kind == 'tag' and name == 'body':
+            add_text(html_content[pos:end])
+            plan.append({'kind': 'doc'})
+            pos = end
+        elif kind == 'endtag' and name == 'body' and scripts_at is None:
+            # Scripts go in front of the first </body> so the DOM is ready when they run
+            add_text(html_content[pos:start])
+            scripts_at = len(plan)
+            add_text("\n" + html_content[start:end])
+            pos = end
+    add_text(html_content[pos:])
+
+    if scripts_at is None:
+        if scripts:
+            add_text("\n")
+        scripts_at = len(plan)
+    return plan[:scripts_at] + scripts + plan[scripts_at:]
+
+
+def _copy_stream(src, dst, length, digest):
+    """Copy up to `length` bytes (None = to EOF) in bounded chunks; returns bytes copied."""
+    copied = 0
+    while length is None or copied < length:
+        want = STREAM_CHUNK_SIZE if length is None else min(STREAM_CHUNK_SIZE, length - copied)
+        chunk = src.read(want)
+        if not chunk:
+            break
+        dst.write(chunk)
+        digest.update(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def _write_bytes(dst, data, digest):
+    dst.write(data)
+    digest.update(data)
+    return len(data)
+
+
+def _write_segment(dst, seg, document_data, digest, minify=False):
+    """
+    Write one segment from its source. Asset files are streamed from disk,
+    except when minifying or embedding a vendored library, which need the
+    whole asset in memory.
+    Returns (bytes written, bytes of asset content written).
+    """
+    kind = seg['kind']
+    if kind == 'text':
+        return _write_bytes(dst, seg['text'].encode('utf-8'), digest), 0
+    if kind == 'doc':
+        if not document_data:
+            return 0, 0
+        return _write_bytes(dst, f"\n  {DOC_PAYLOAD_OPEN}{escape_document_data(document_data)}</pre>".encode('utf-8'), digest), 0
+    path = seg['path']
+    if kind == 'vendor' and not os.path.exists(path):
+        print(f"ℹ️  {os.path.relpath(path)} is not cached, keeping the CDN <script> (run with --fetch-vendor)")
+        return _write_bytes(dst, seg['fallback'].encode('utf-8'), digest), 0
+    try:
+        src = open(path, 'rb')
+    except FileNotFoundError:
+        print(f"Warning: {path} not found")
+        src = None
+    except OSError as e:
+        print(f"Error reading {path}: {e}")
+        src = None
+    if src is None or os.fstat(src.fileno()).st_size == 0:
+        if src is not None:
+            src.close()
+        return (_write_bytes(dst, seg['fallback'].encode('utf-8'), digest) if kind in ('css', 'vendor') else 0), 0
+    if kind == 'vendor':
+        # Inert until export.service.js evaluates it; the src ties it to the CDN URL it replaces
+        opening, closing = f"<script type=\"text/plain\" data-vendor-src=\"{seg['src']}\">", "</script>"
+    elif kind == 'css':
+        opening, closing = "\n  <style>\n", "\n  </style>\n"
+    elif seg.get('module'):
+        opening, closing = "\n  <script type=\"module\">\n", "\n  </script>\n"
+    else:
+        opening, closing = "\n  <script>\n", "\n  </script>\n"
+    with src:
+        written = _write_bytes(dst, opening.encode('utf-8'), digest)
+        if kind == 'vendor':
+            text = src.read().decode('utf-8')
+            for pattern, replacement in _SCRIPT_DATA_ESCAPES:
+                text = pattern.sub(replacement, text)
+            content = _write_bytes(dst, text.encode('utf-8'), digest)
+        elif minify:
+            text = src.read().decode('utf-8')
+            text = minify_css(text) if kind == 'css' else minify_js(text)
+            content = _write_bytes(dst, text.encode('utf-8'), digest)
         else:
-            collected_tags.append(f"\n  <script>\n{js_content}\n  </script>\n")
-        return ''
+            content = _copy_stream(src, dst, None, digest)
+    return written + content + _write_bytes(dst, closing.encode('utf-8'), digest), content
+
 
-    html_without_local_src = script_pattern.sub(replace_script, html_content)
-    return html_without_local_src, collected_tags
+def _segment_key(seg):
+    if seg['kind'] in _ASSET_KINDS:
+        return (seg['kind'], seg['path'], bool(seg.get('module')))
+    return (seg['kind'], seg.get('text_hash'))
 
 
-def combine_files(html_file='index.html', output_file='combined.html', document_data=None, base_dir='.'):
+def _default_cache_file(output_file):
+    return f"{output_file}.buildcache.json"
+
+
+def _load_build_cache(cache_file):
+    if not cache_file:
+        return None
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != BUILD_CACHE_VERSION:
+        return None
+    return cache
+
+
+def _save_build_cache(cache_file, cache):
+    if not cache_file:
+        return
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print(f"Warning: could not write build cache {cache_file}: {e}")
+
+
+def _input_hash(path, prev_inputs):
+    """Return (signature, hash) for a source file, re-hashing only if it was touched."""
+    sig = _file_signature(path)
+    prev = (prev_inputs or {}).get(path)
+    if prev and sig is not None and prev.get('sig') == sig:
+        return sig, prev.get('hash')
+    return sig, (_hash_file(path) if sig is not None else None)
+
+
+def _build(html_file, output_file, document_data, base_dir, cache, minify=False, profile='editor', assets=None, quiet=False):
+    """
+    Incremental build. Returns (ok, new_cache).
+
+    `cache` is the state from the previous build (or None). Segments whose
+    source hash is unchanged are spliced in from the previous output.
+    `assets` is an AssetCache shared by several builds (see build_entries);
+    `quiet` leaves out the success messages.
+    """
+    input_hash = assets.input_hash if assets is not None else _input_hash
+    started = time.perf_counter()
+    prev_inputs = (cache or {}).get('inputs') or {}
+    options = {'html_file': os.path.abspath(html_file), 'base_dir': os.path.abspath(base_dir), 'minify': bool(minify), 'profile': profile}
+    if cache and cache.get('options') != options:
+        cache = None
+        prev_inputs = {}
+
+    html_sig, html_hash = input_hash(html_file, prev_inputs)
+    if html_hash is None:
+        print("Error: HTML file is required and must exist")
+        return False, cache
+
+    # Reuse the previous plan when the page itself is unchanged
+    plan = None
+    if cache and cache.get('plan') and prev_inputs.get(html_file, {}).get('hash') == html_hash:
+        plan = cache['plan']
+    if plan is None:
+        html_content = read_file(html_file)
+        if not html_content:
+            print("Error: HTML file is required and must exist")
+            return False, cache
+        plan = _plan_template(html_content, base_dir, profile)
+        for seg in plan:
+            if seg['kind'] == 'text':
+                seg['text_hash'] = _sha256(seg['text'].encode('utf-8'))
+
+    inputs = {html_file: {'sig': html_sig, 'hash': html_hash}}
+    for seg in plan:
+        if seg['kind'] in _ASSET_KINDS and seg['path'] not in inputs:
+            sig, digest = input_hash(seg['path'], prev_inputs)
+            inputs[seg['path']] = {'sig': sig, 'hash': digest}
+    doc_hash = _sha256(document_data.encode('utf-8')) if document_data else None
+
+    # Where each unchanged segment can be found in the previous output
+    prev_output = (cache or {}).get('output') or {}
+    output_sig = _file_signature(output_file)
+    output_intact = bool(cache) and output_sig is not None and (
+        prev_output.get('sig') == output_sig or prev_output.get('hash') == _hash_file(output_file)
+    )
+    reusable = {}
+    if output_intact:
+        for seg in cache.get('segments') or []:
+            reusable[_segment_key(seg)] = seg
+
+    def source_hash(seg):
+        if seg['kind'] in _ASSET_KINDS:
+            return inputs[seg['path']]['hash']
+        if seg['kind'] == 'doc':
+            return doc_hash
+        return seg['text_hash']
+
+    unchanged = output_intact and [(_segment_key(seg), seg['hash']) for seg in cache.get('segments') or []] == [
+        (_segment_key(seg), source_hash(seg)) for seg in plan
+    ]
+    if unchanged:
+        if not quiet:
+            print(f"✅ {output_file} is up to date")
+        return True, dict(cache, inputs=inputs, output=dict(prev_output, sig=output_sig))
+
+    segments = []
+    rebuilt = []
+    digest = hashlib.sha256()
+    tmp_path = None
+    try:
+        old = open(output_file, 'rb') if reusable else None
+        try:
+            # Same permissions as the previous output (or a plain new file), not a private temp file's
+            tmp, tmp_path = create_temp(output_file)
+            with tmp:
+                offset = 0
+                for seg in plan:
+                    seg_hash = source_hash(seg)
+                    prev = reusable.get(_segment_key(seg))
+                    if prev is not None and prev.get('hash') == seg_hash:
+                        old.seek(prev['offset'])
+                        length = _copy_stream(old, tmp, prev['length'], digest)
+                        content_length = prev.get('content_length', 0)
+                    else:
+                        shared = assets.segment(seg, minify, inputs[seg['path']]['sig']) if (
+                            assets is not None and seg['kind'] in _ASSET_KINDS) else None
+                        if shared is not None:
+                            length, content_length = _write_bytes(tmp, shared[0], digest), shared[1]
+                        else:
+                            length, content_length = _write_segment(tmp, seg, document_data, digest, minify=minify)
+                        if seg['kind'] in _ASSET_KINDS:
+                            rebuilt.append(seg['path'])
+                    entry = {k: v for k, v in seg.items() if k != 'text'}
+                    entry.update({'hash': seg_hash, 'offset': offset, 'length': length, 'content_length': content_length})
+                    segments.append(entry)
+                    offset += length
+        finally:
+            if old is not None:
+                old.close()
+        os.replace(tmp_path, output_file)
+    except Exception as e:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"❌ Error writing {output_file}: {e}")
+        return False, cache
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if not quiet:
+        print(f"✅ Successfully created {output_file}")
+        size = os.path.getsize(output_file)
+        print(f"📁 File size: {size:,} bytes ({size/1024:.1f} KB)")
+        if reusable:
+            names = ', '.join(os.path.basename(p) for p in rebuilt) or 'page markup only'
+            print(f"♻️  Rebuilt {names} in {elapsed_ms:.1f} ms")
+        if minify:
+            _print_minify_report(segments, inputs)
+
+    new_cache = {
+        'version': BUILD_CACHE_VERSION,
+        'options': options,
+        'inputs': inputs,
+        'plan': [dict(seg) for seg in plan],
+        'segments': segments,
+        'output': {'sig': _file_signature(output_file), 'hash': digest.hexdigest()},
+    }
+    return True, new_cache
+
+
+def _print_minify_report(segments, inputs):
+    """Per-asset before/after sizes for a minified build."""
+    rows = []
+    for seg in segments:
+        if seg['kind'] not in ('css', 'js') or not seg.get('content_length'):
+            continue
+        before = (inputs.get(seg['path']) or {}).get('sig') or [0, 0]
+        rows.append((os.path.basename(seg['path']), before[1], seg['content_length']))
+    if not rows:
+        return
+    print("📉 Minified assets:")
+    width = max(len(name) for name, _, _ in rows)
+    total_before = total_after = 0
+    for name, before, after in rows:
+        saved = (1 - after / before) * 100 if before else 0
+        print(f"   {name:<{width}}  {before:>9,} → {after:>9,} bytes  (-{saved:.1f}%)")
+        total_before += before
+        total_after += after
+    saved = (1 - total_after / total_before) * 100 if total_before else 0
+    print(f"   {'total':<{width}}  {total_before:>9,} → {total_after:>9,} bytes  (-{saved:.1f}%)")
+
+
+def fetch_vendor(base_dir='.', force=False, timeout=30):
+    """
+    Download the VENDOR_LIBS into `<base_dir>/vendor/` so later builds can embed
+    them offline. Libraries already in the cache are kept unless `force`.
+    Returns True if every library is cached afterwards.
+    """
+    vendor_dir = os.path.join(base_dir, VENDOR_DIR)
+    os.makedirs(vendor_dir, exist_ok=True)
+    ok = True
+    for url, name in VENDOR_LIBS.items():
+        path = os.path.join(vendor_dir, name)
+        if not force and os.path.exists(path):
+            print(f"✅ {name} already cached")
+            continue
+        tmp_path = None
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
+                tmp, tmp_path = create_temp(path)
+                with tmp:
+                    _copy_stream(resp, tmp, None, hashlib.sha256())
+            os.replace(tmp_path, path)
+            print(f"⬇️  Fetched {name} ({os.path.getsize(path):,} bytes)")
+        except Exception as e:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"❌ Could not fetch {url}: {e}")
+            ok = False
+    return ok
+
+
+def _paged(document_data):
+    """document_data in the paged payload encoding (docformat.py), for large multi-page documents."""
+    return encode_paged(parse_payload(document_data)) if document_data else document_data
+
+
+def combine_files(html_file='index.html', output_file='combined.html', document_data=None, base_dir='.', cache_file=None, use_cache=True, minify=False, profile='editor', paged=False):
     """
     Combine HTML with all local CSS/JS assets into a single HTML file.
 
     Args:
         html_file: Path to the source HTML file
         output_file: Output file name
-        document_data: Optional document data to embed (for exports)
+        document_data: Optional serialized document (JSON text) to embed as
+                       <pre id="__doc__">; it is HTML-escaped on the way in
         base_dir: Base directory to resolve relative asset paths
+        cache_file: Build cache location (defaults to '<output_file>.buildcache.json')
+        use_cache: Set to False to force a full rebuild without reading or writing the cache
+        minify: Strip comments and redundant whitespace from inlined CSS/JS
+        profile: 'editor' for the full app, 'viewer' to leave out everything
+                 marked data-build="editor" (read-only certificates)
+        paged: Embed document_data in the compressed, per-page encoding
+               (docformat.py), which the page opens one page at a time
     """
+    if profile not in BUILD_PROFILES:
+        raise ValueError(f"Unknown build profile {profile!r} (expected one of {', '.join(BUILD_PROFILES)})")
+    if paged:
+        document_data = _paged(document_data)
+    if use_cache:
+        cache_file = cache_file or _default_cache_file(output_file)
+    else:
+        cache_file = None
+    ok, cache = _build(html_file, output_file, document_data, base_dir, _load_build_cache(cache_file), minify=minify, profile=profile)
+    if ok:
+        _save_build_cache(cache_file, cache)
+    return ok
 
-    html_content = read_file(html_file)
 
-    if not html_content:
-        print("Error: HTML file is required and must exist")
-        return False
+class BuildEntry(NamedTuple):
+    """One page of a multi-entry build (see build_entries)."""
+    html_file: str
+    output_file: str
+    document_data: Optional[str] = None
+    profile: Optional[str] = None  # None: the profile passed to build_entries
+    paged: bool = False  # embed document_data in the paged encoding
 
-    # Inline CSS link tags in place
-    html_content = _inline_css_links(html_content, base_dir=base_dir)
 
-    # Extract local JS scripts and remove them from the document
-    html_content, collected_script_tags = _extract_local_scripts(html_content, base_dir=base_dir)
+class _NoDigest:
+    def update(self, data):
+        pass
 
-    # Add document data if provided (for exports)
-    if document_data:
-        data_tag = f"\n  <pre id=\"__doc__\" style=\"display:none\">{document_data}</pre>"
-        html_content = html_content.replace('<body>', f'<body>{data_tag}')
 
-    # Re-insert collected JS scripts just before closing body to ensure DOM is ready
-    if collected_script_tags:
-        scripts_combined = ''.join(collected_script_tags)
-        if '</body>' in html_content:
-            html_content = html_content.replace('</body>', f"{scripts_combined}\n</body>")
-        else:
-            html_content = f"{html_content}\n{scripts_combined}"
+class AssetCache:
+    """
+    Assets shared by several builds, each read, hashed and rendered once.
 
-    # Write combined file
-    try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        print(f"✅ Successfully created {output_file}")
+    Holds the rendered segment bytes (opening tag, content, closing tag) of
+    each asset keyed by path, render options and file signature, so an asset
+    edited mid-build is read again. Thread-safe; when two builds need the same
+    asset at once, one reads it and the other waits for the result. Least
+    recently used entries are dropped past `max_bytes`, and assets larger than
+    a quarter of it are not kept at all (builds stream those from disk as usual).
+    """
 
-        size = os.path.getsize(output_file)
-        print(f"📁 File size: {size:,} bytes ({size/1024:.1f} KB)")
-        return True
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_item = max_bytes // 4
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._pending = {}
+        self._hashes = {}
+        self.size = 0
+        self.reads = 0
+        self.hits = 0
 
-    except Exception as e:
-        print(f"❌ Error writing {output_file}: {e}")
-        return False
+    def _once(self, key, compute):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = Future()
+        if not owner:
+            with self._lock:
+                self.hits += 1
+            return pending.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            del self._pending[key]
+            self.reads += 1
+            size = len(value[0]) if isinstance(value, tuple) and isinstance(value[0], bytes) else 0
+            if size <= self.max_item:
+                self._items[key] = value
+                self.size += size
+                while self.size > self.max_bytes and self._items:
+                    _, old = self._items.popitem(last=False)
+                    self.size -= len(old[0]) if isinstance(old, tuple) and isinstance(old[0], bytes) else 0
+        pending.set_result(value)
+        return value
+
+    def input_hash(self, path, prev_inputs):
+        """Like _input_hash, but each (path, signature) is hashed once across all builds."""
+        sig = _file_signature(path)
+        prev = (prev_inputs or {}).get(path)
+        if prev and sig is not None and prev.get('sig') == sig:
+            return sig, prev.get('hash')
+        if sig is None:
+            return sig, None
+        return sig, self._once(('hash', os.path.abspath(path), tuple(sig)), lambda: _hash_file(path))
+
+    def segment(self, seg, minify, sig):
+        """(bytes, content length) of an asset segment, or None if it should be streamed instead."""
+        if sig is not None and sig[1] > self.max_item:
+            return None
+        key = ('segment', seg['kind'], os.path.abspath(seg['path']), bool(seg.get('module')), seg.get('src'),
+               seg.get('fallback'), bool(minify), tuple(sig) if sig else None)
+
+        def render():
+            buf = io.BytesIO()
+            _, content_length = _write_segment(buf, seg, None, _NoDigest(), minify=minify)
+            return buf.getvalue(), content_length
+        return self._once(key, render)
+
+
+def build_entries(entries, jobs=None, cache_bytes=64 * 1024 * 1024, use_cache=True, minify=False, profile='editor'):
+    """
+    Build several pages that share CSS/JS in parallel. `entries` are
+    BuildEntry tuples (or (html_file, output_file) pairs); each keeps its own
+    incremental build cache next to its output, and assets are read once into
+    a shared AssetCache of at most `cache_bytes`. Prints a summary and returns
+    a list of dicts (html_file, output_file, ok, bytes, ms).
+    """
+    entries = [entry if isinstance(entry, BuildEntry) else BuildEntry(*entry) for entry in entries]
+    for entry in entries:
+        if (entry.profile or profile) not in BUILD_PROFILES:
+            raise ValueError(f"Unknown build profile {entry.profile or profile!r} (expected one of {', '.join(BUILD_PROFILES)})")
+    assets = AssetCache(cache_bytes)
+
+    def build_one(entry):
+        started = time.perf_counter()
+        os.makedirs(os.path.dirname(entry.output_file) or '.', exist_ok=True)
+        cache_file = _default_cache_file(entry.output_file) if use_cache else None
+        base_dir = os.path.dirname(entry.html_file) or '.'
+        document_data = _paged(entry.document_data) if entry.paged else entry.document_data
+        ok, cache = _build(entry.html_file, entry.output_file, document_data, base_dir, _load_build_cache(cache_file),
+                           minify=minify, profile=entry.profile or profile, assets=assets, quiet=True)
+        if ok:
+            _save_build_cache(cache_file, cache)
+        return {'html_file': entry.html_file, 'output_file': entry.output_file, 'ok': ok,
+                'bytes': os.path.getsize(entry.output_file) if ok else 0, 'ms': (time.perf_counter() - started) * 1000}
+
+    started = time.perf_counter()
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(entries) or 1))
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(build_one, entries))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    built = sum(r['ok'] for r in results)
+    print(f"📦 Built {built} of {len(results)} entries in {elapsed_ms:.1f} ms ({jobs} workers)")
+    if results:
+        width = max(len(r['output_file']) for r in results)
+        for r in results:
+            status = '✅' if r['ok'] else '❌'
+            print(f"   {status} {r['output_file']:<{width}}  {r['bytes']:>11,} bytes  {r['ms']:>8.1f} ms  ← {r['html_file']}")
+    print(f"♻️  Shared inputs: {assets.reads} read, {assets.hits} reused, {assets.size:,} bytes cached")
+    return results
+
+
+def expand_entries(patterns, out_dir, profile=None, paged=False):
+    """
+    BuildEntry list from glob patterns (output: out_dir/<page name>) and JSON
+    manifests (*.json: [{"html", "output", "document", "profile", "paged"}],
+    where "document" is a JSON file to embed and paths are relative to the
+    manifest). `paged` is the default for entries that don't say.
+    """
+    entries = []
+    for pattern in patterns:
+        if pattern.lower().endswith('.json'):
+            root = os.path.dirname(pattern)
+            with open(pattern, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            for item in manifest:
+                html_file = os.path.join(root, item['html'])
+                output_file = os.path.join(root, item['output']) if item.get('output') else os.path.join(out_dir, os.path.basename(html_file))
+                document_data = None
+                if item.get('document'):
+                    document_data = read_file(os.path.join(root, item['document'])) or None
+                entries.append(BuildEntry(html_file, output_file, document_data, item.get('profile') or profile,
+                                          bool(item.get('paged', paged))))
+            continue
+        matches = sorted(glob.glob(pattern)) or ([pattern] if os.path.exists(pattern) else [])
+        if not matches:
+            print(f"Warning: no pages match {pattern}")
+        for html_file in matches:
+            entries.append(BuildEntry(html_file, os.path.join(out_dir, os.path.basename(html_file)), None, profile))
+    return entries
+
+
+def watch(html_file='index.html', output_file='combined.html', document_data=None, base_dir='.', cache_file=None, interval=0.5, minify=False, profile='editor'):
+    """
+    Rebuild `output_file` whenever the page or one of its local assets changes.
+    Polls file signatures (mtime/size) every `interval` seconds; stop with Ctrl+C.
+    """
+    if profile not in BUILD_PROFILES:
+        raise ValueError(f"Unknown build profile {profile!r} (expected one of {', '.join(BUILD_PROFILES)})")
+    cache_file = cache_file or _default_cache_file(output_file)
+    ok, cache = _build(html_file, output_file, document_data, base_dir, _load_build_cache(cache_file), minify=minify, profile=profile)
+    if ok:
+        _save_build_cache(cache_file, cache)
+    print(f"👀 Watching {html_file} and its assets (Ctrl+C to stop)")
+
+    def snapshot(state):
+        paths = list(((state or {}).get('inputs') or {}).keys()) or [html_file]
+        return {p: _file_signature(p) for p in paths}
+
+    seen = snapshot(cache)
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(cache)
+            if current == seen:
+                continue
+            ok, next_cache = _build(html_file, output_file, document_data, base_dir, cache, minify=minify, profile=profile)
+            if ok:
+                cache = next_cache
+                _save_build_cache(cache_file, cache)
+            seen = snapshot(cache)
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+    return True
 
 def create_export(document_data, output_file='export.html'):
     """
     Create an export file with embedded document data
-    
+
     Args:
         document_data: The document data to embed
         output_file: Output file name
     """
     return combine_files(output_file=output_file, document_data=document_data)
 
-def main():
+def main(argv=None):
     """Main function - can be called from command line or imported"""
+    parser = argparse.ArgumentParser(description="Combine index.html and its local CSS/JS into one self-contained HTML file.")
+    parser.add_argument("html_file", nargs="?", default="index.html", help="Source HTML file (default: index.html)")
+    parser.add_argument("-o", "--output", default="combined.html", help="Output file (default: combined.html)")
+    parser.add_argument("--watch", action="store_true", help="Keep running and rebuild when a source file changes")
+    parser.add_argument("--interval", type=float, default=0.5, help="Polling interval in seconds for --watch")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the build cache and rebuild everything")
+    parser.add_argument("--minify", action="store_true", help="Minify inlined CSS and JS and print a size report")
+    parser.add_argument("--fetch-vendor", action="store_true", help="Download html2canvas/jsPDF into the vendor/ cache before building")
+    parser.add_argument("--profile", choices=BUILD_PROFILES, default="editor", help="'viewer' drops editor-only code (data-build=\"editor\") from the bundle")
+    parser.add_argument("--document", metavar="JSON", help="Embed this saved document payload (JSON file) as <pre id=\"__doc__\">")
+    parser.add_argument("--paged", action="store_true", help="Embed documents in the compressed per-page encoding (large documents open faster)")
+    parser.add_argument("--entries", nargs="+", metavar="PAGE", help="Build several pages (globs, or a JSON manifest of {html, output, document, profile}) in parallel")
+    parser.add_argument("--out-dir", default="dist", help="Output folder for --entries pages (default: dist)")
+    parser.add_argument("-j", "--jobs", type=int, help="Parallel builds for --entries (default: CPU count)")
+    parser.add_argument("--cache-mb", type=float, default=64, help="Shared asset cache size for --entries (default: 64)")
+    args = parser.parse_args(argv)
+
     print("🔧 HTML Combiner Helper")
     print("=" * 30)
-    
+
+    if args.entries:
+        entries = expand_entries(args.entries, args.out_dir, args.profile, args.paged)
+        missing_files = [e.html_file for e in entries if not Path(e.html_file).exists()]
+        if missing_files or not entries:
+            print(f"❌ Missing pages: {', '.join(missing_files)}" if missing_files else "❌ No pages to build")
+            return False
+        if args.fetch_vendor:
+            for base_dir in sorted({os.path.dirname(e.html_file) or '.' for e in entries}):
+                fetch_vendor(base_dir)
+        results = build_entries(entries, jobs=args.jobs, cache_bytes=int(args.cache_mb * 1024 * 1024),
+                                use_cache=not args.no_cache, minify=args.minify, profile=args.profile)
+        return all(r['ok'] for r in results)
+
     # Check if required files exist
-    required_files = ['index.html']
+    required_files = [args.html_file] + ([args.document] if args.document else [])
     missing_files = [f for f in required_files if not Path(f).exists()]
-    
+
     if missing_files:
         print(f"⚠️  Missing files: {', '.join(missing_files)}")
-        if 'index.html' in missing_files:
-            print("❌ Cannot proceed without index.html")
-            return False
-    
+        print(f"❌ Cannot proceed without {args.html_file}")
+        return False
+
+    base_dir = os.path.dirname(args.html_file) or '.'
+    document_data = read_file(args.document) or None if args.document else None
+    if document_data and args.paged:
+        document_data = _paged(document_data)
+    if args.fetch_vendor:
+        fetch_vendor(base_dir)
+    if args.watch:
+        return watch(args.html_file, args.output, document_data, base_dir=base_dir, interval=args.interval, minify=args.minify, profile=args.profile)
+
     # Combine files
-    success = combine_files()
-    
+    success = combine_files(args.html_file, args.output, document_data, base_dir=base_dir, use_cache=not args.no_cache, minify=args.minify, profile=args.profile)
+
     if success:
         print("\n✨ All files combined successfully!")
-        print("📝 You can now use the combined.html file")
+        print(f"📝 You can now use the {args.output} file")
     else:
         print("\n❌ Failed to combine files")
-    
+
     return success
 
 if __name__ == '__main__':
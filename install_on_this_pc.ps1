@@ -13,6 +13,7 @@ $manifestPath = Join-Path $repo 'native-host\com.your.savehost.json'
 
 function Get-HostExePath {
   $candidates = @(
+    (Join-Path $repo 'native-host\dist\save_host\save_host.exe'),
     (Join-Path $repo 'native-host\save_host.exe'),
     (Join-Path $repo 'native-host\dist\save_host.exe')
   )
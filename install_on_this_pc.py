@@ -31,13 +31,14 @@ def find_native_host_manifest(root: Path) -> Path:
 
 def find_host_executable(root: Path) -> Path:
     candidates = [
+        root / "native-host" / "dist" / "save_host" / "save_host.exe",  # one-folder build (faster startup)
         root / "native-host" / "save_host.exe",
         root / "native-host" / "dist" / "save_host.exe",
     ]
     for c in candidates:
         if c.exists():
             return c.resolve()
-    raise FileNotFoundError("Could not find save_host.exe next to manifest or in native-host\\dist.")
+    raise FileNotFoundError("Could not find save_host.exe in native-host\\dist\\save_host, next to manifest or in native-host\\dist.")
 
 
 def update_manifest_path(manifest_path: Path, exe_path: Path) -> None:
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Token-level JS/CSS minifier used by helper.py (no third-party dependencies).
+
+Both minifiers only ever drop comments and whitespace: every other token is
+copied through byte for byte, so the worst a tokenizer mistake can do is keep
+some whitespace, never change what the code means.
+
+JS: a line break is kept wherever automatic semicolon insertion or a
+restricted production (return, ++, --, ...) could depend on it. Comments
+starting with /*! or containing @license / @preserve are kept.
+"""
+
+import re
+
+_JS_NUMBER = re.compile(r"0[xXoObB][0-9a-fA-F_]+n?|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?n?")
+_JS_WORD = re.compile(r"(?:[A-Za-z_$\\]|[^\x00-\x7f])(?:[A-Za-z0-9_$\\]|[^\x00-\x7f])*")
+_JS_PUNCTUATORS = sorted([
+    '>>>=', '...', '===', '!==', '**=', '<<=', '>>=', '>>>', '&&=', '||=', '??=',
+    '=>', '==', '!=', '<=', '>=', '&&', '||', '??', '?.', '++', '--', '+=', '-=', '*=',
+    '/=', '%=', '&=', '|=', '^=', '**', '<<', '>>',
+], key=len, reverse=True)
+
+# A regex literal (rather than division) may follow these keywords
+_JS_KEYWORDS_BEFORE_EXPR = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw',
+    'case', 'do', 'else', 'yield', 'await',
+}
+# A statement cannot end right after these, so a following line break never matters
+_JS_NO_ASI_AFTER = {
+    '{', '(', '[', ',', ';', ':', '?', '.', '...', '?.', '=', '==', '===', '!=', '!==',
+    '<', '>', '<=', '>=', '+', '-', '*', '/', '%', '**', '&', '|', '^', '!', '~', '&&', '||', '??',
+    '<<', '>>', '>>>', '=>', '+=', '-=', '*=', '/=', '%=', '**=', '&=', '|=', '^=', '<<=', '>>=',
+    '>>>=', '&&=', '||=', '??=',
+}
+# These cannot start a statement, so a line break in front of them never matters
+_JS_NO_ASI_BEFORE = {
+    ')', ']', '}', ',', ';', ':', '?', '.', '?.', '=', '==', '===', '!=', '!==', '<', '>', '<=', '>=',
+    '*', '%', '**', '&', '|', '^', '&&', '||', '??', '<<', '>>', '>>>', '=>', '+=', '-=', '*=',
+    '/=', '%=', '**=', '&=', '|=', '^=', '<<=', '>>=', '>>>=', '&&=', '||=', '??=',
+}
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch in '_$\\' or ord(ch) > 0x7f
+
+
+def _keep_comment(text):
+    return text.startswith('/*!') or '@license' in text or '@preserve' in text
+
+
+def _scan_string(src, i):
+    quote = src[i]
+    j = i + 1
+    n = len(src)
+    while j < n:
+        ch = src[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == quote or ch == '\n':
+            return j + 1
+        j += 1
+    return n
+
+
+def _scan_template(src, i):
+    """Scan template text starting at `i` (just after ` or }). Returns (end, opened_substitution)."""
+    j = i
+    n = len(src)
+    while j < n:
+        ch = src[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == '`':
+            return j + 1, False
+        if ch == '$' and src.startswith('${', j):
+            return j + 2, True
+        j += 1
+    return n, False
+
+
+def _scan_regex(src, i):
+    j = i + 1
+    n = len(src)
+    in_class = False
+    while j < n:
+        ch = src[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == '\n':
+            return None
+        if in_class:
+            if ch == ']':
+                in_class = False
+        elif ch == '[':
+            in_class = True
+        elif ch == '/':
+            j += 1
+            while j < n and _is_word_char(src[j]):
+                j += 1
+            return j
+        j += 1
+    return None
+
+
+def _js_tokens(src):
+    """
+    Yield (kind, text, newline_before) for each significant JS token.
+    kind is 'word', 'number', 'string', 'template', 'regex', 'punct' or
+    'comment' (kept comments only).
+    """
+    i = 0
+    n = len(src)
+    newline = False
+    prev_kind, prev_text = None, None
+    # Brace depth per open template substitution, so `}` knows when to resume the template
+    template_stack = []
+    while i < n:
+        ch = src[i]
+        if ch in ' \t\r\n\f\v\u00a0\ufeff\u2028\u2029':
+            if ch in '\n\r\u2028\u2029':
+                newline = True
+            i += 1
+            continue
+        if src.startswith('//', i):
+            end = src.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        if src.startswith('/*', i):
+            end = src.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            text = src[i:end]
+            if _keep_comment(text):
+                yield ('comment', text, newline)
+                newline = False
+            elif '\n' in text:
+                newline = True
+            i = end
+            continue
+
+        if ch in '"\'':
+            end = _scan_string(src, i)
+            kind = 'string'
+        elif ch == '`':
+            end, opened = _scan_template(src, i + 1)
+            if opened:
+                template_stack.append(0)
+            kind = 'template'
+        elif ch == '}' and template_stack and template_stack[-1] == 0:
+            template_stack.pop()
+            end, opened = _scan_template(src, i + 1)
+            if opened:
+                template_stack.append(0)
+            kind = 'template'
+        elif ch.isdigit() or (ch == '.' and i + 1 < n and src[i + 1].isdigit()):
+            end = _JS_NUMBER.match(src, i).end()
+            kind = 'number'
+        elif _is_word_char(ch):
+            match = _JS_WORD.match(src, i)
+            end = match.end() if match else i + 1
+            kind = 'word'
+        else:
+            end = None
+            if ch == '/':
+                regex_ok = (
+                    prev_kind is None
+                    or (prev_kind == 'punct' and prev_text not in (')', ']'))
+                    or (prev_kind == 'word' and prev_text in _JS_KEYWORDS_BEFORE_EXPR)
+                )
+                if regex_ok:
+                    end = _scan_regex(src, i)
+                    kind = 'regex'
+            if end is None:
+                for punct in _JS_PUNCTUATORS:
+                    if src.startswith(punct, i):
+                        end = i + len(punct)
+                        break
+                else:
+                    end = i + 1
+                kind = 'punct'
+                text = src[i:end]
+                if template_stack:
+                    if text == '{':
+                        template_stack[-1] += 1
+                    elif text == '}':
+                        template_stack[-1] -= 1
+        text = src[i:end]
+        yield (kind, text, newline)
+        prev_kind, prev_text = kind, text
+        newline = False
+        i = end
+
+
+def _js_needs_space(prev_kind, prev, kind, text):
+    if _is_word_char(prev[-1]) and _is_word_char(text[0]):
+        return True
+    if prev[-1] in '+-' and text[0] == prev[-1]:
+        return True
+    if prev[-1] == '/' and text[0] == '/':
+        return True
+    if prev_kind == 'number' and text[0] == '.':
+        return True
+    return False
+
+
+def minify_js(src: str) -> str:
+    """Strip comments and redundant whitespace from JavaScript source."""
+    out = []
+    prev_kind, prev = None, None
+    for kind, text, newline in _js_tokens(src):
+        if prev is not None:
+            if kind == 'comment' or prev_kind == 'comment':
+                out.append('\n')
+            elif newline and not (
+                (prev_kind == 'punct' and prev in _JS_NO_ASI_AFTER)
+                or (kind == 'punct' and text in _JS_NO_ASI_BEFORE)
+            ):
+                out.append('\n')
+            elif _js_needs_space(prev_kind, prev, kind, text):
+                out.append(' ')
+        out.append(text)
+        prev_kind, prev = kind, text
+    return ''.join(out)
+
+
+_CSS_TOKEN = re.compile(r"""/\*.*?(?:\*/|\Z)|"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?|\s+|[{};,:]|[^\s"'/{};,:]+|/""", re.DOTALL)
+_CSS_TIGHT_BEFORE = set('{};,')
+_CSS_TIGHT_AFTER = set('{};,:')
+
+
+def minify_css(src: str) -> str:
+    """Strip comments and redundant whitespace from a stylesheet."""
+    out = []
+    pending_space = False
+    for match in _CSS_TOKEN.finditer(src):
+        token = match.group(0)
+        if token.startswith('/*'):
+            if _keep_comment(token):
+                out.append(token)
+                pending_space = False
+            continue
+        if token.isspace():
+            pending_space = bool(out)
+            continue
+        if pending_space:
+            last = out[-1][-1] if out else ''
+            if last not in _CSS_TIGHT_AFTER and token[0] not in _CSS_TIGHT_BEFORE:
+                out.append(' ')
+            pending_space = False
+        if token == '}' and out and out[-1] == ';':
+            out.pop()
+        out.append(token)
+    return ''.join(out)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Measure how long the native host takes to answer its first message.
+
+Starts the host the way the browser does (a fresh process with stdin/stdout
+pipes), sends a ping and times the reply. That is the latency added to the
+first save of a browser session. Then it sends a few more pings over the same
+process to show the warm round trip every later save pays.
+
+Usage:
+  python measure_startup.py                          # dist\\save_host\\save_host.exe if built, else save_host.py
+  python measure_startup.py --host dist\\save_host.exe -n 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_host():
+    for candidate in (os.path.join(HERE, 'dist', 'save_host', 'save_host.exe'),
+                      os.path.join(HERE, 'dist', 'save_host.exe'),
+                      os.path.join(HERE, 'save_host.exe')):
+        if os.path.exists(candidate):
+            return [candidate]
+    return [sys.executable, os.path.join(HERE, 'save_host.py')]
+
+
+def _send(proc, obj):
+    data = json.dumps(obj).encode('utf-8')
+    proc.stdin.write(struct.pack('<I', len(data)) + data)
+    proc.stdin.flush()
+
+
+def _receive(proc):
+    raw_len = proc.stdout.read(4)
+    if len(raw_len) != 4:
+        raise RuntimeError("host closed the pipe without replying")
+    return json.loads(proc.stdout.read(struct.unpack('<I', raw_len)[0]).decode('utf-8'))
+
+
+def measure(command, runs=10, warm_pings=20):
+    """Return (cold start times, warm round-trip times) in milliseconds."""
+    cold, warm = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        try:
+            _send(proc, {'type': 'ping', 'id': 0})
+            reply = _receive(proc)
+            cold.append((time.perf_counter() - started) * 1000)
+            if reply.get('type') != 'ready' or reply.get('id') != 0:
+                raise RuntimeError(f"unexpected reply: {reply}")
+            for i in range(1, warm_pings + 1):
+                t = time.perf_counter()
+                _send(proc, {'type': 'ping', 'id': i})
+                _receive(proc)
+                warm.append((time.perf_counter() - t) * 1000)
+        finally:
+            proc.stdin.close()
+            proc.wait(timeout=10)
+    return cold, warm
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the native host's cold start and warm round trip.")
+    parser.add_argument("--host", help="Host executable or script (default: the built exe, else save_host.py)")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Cold starts to measure (default: 10)")
+    args = parser.parse_args(argv)
+
+    if args.host:
+        command = [sys.executable, args.host] if args.host.endswith('.py') else [args.host]
+    else:
+        command = default_host()
+    print(f"⏱️  Host: {' '.join(command)}")
+    cold, warm = measure(command, args.runs)
+    print(f"🥶 Cold start to first reply: median {statistics.median(cold):.1f} ms (min {min(cold):.1f}, max {max(cold):.1f}, {len(cold)} runs)")
+    print(f"🔥 Warm round trip:           median {statistics.median(warm):.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
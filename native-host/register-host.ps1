@@ -3,6 +3,7 @@ $dir = $PSScriptRoot
 $manifestPath = Join-Path $dir 'com.your.savehost.json'
 # Find exe next to manifest, else in 'dist'
 $candidatePaths = @(
+  (Join-Path $dir 'dist\save_host\save_host.exe'),
   (Join-Path $dir 'save_host.exe'),
   (Join-Path $dir 'dist\save_host.exe')
 )
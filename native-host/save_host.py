@@ -1,7 +1,97 @@
 #!/usr/bin/env python3
-import sys, struct, json, os, tempfile, traceback, uuid
-from urllib.parse import urlparse, unquote
-from urllib.request import url2pathname
+# Native messaging host for the SaveHelper extension.
+#
+# One host process serves a whole browser session: background.js keeps the
+# port open instead of reconnecting per save. Each request may carry an "id",
+# which is echoed in its reply; clients may send several requests without
+# waiting. Saves are answered when they have been written (see "Save queue"
+# below), so match replies by id rather than by order.
+#
+#   {"type": "ping", "id": 1}                       -> {"ok": true, "type": "ready", "protocol": 7, "pid": ..., "id": 1}
+#   {"type": "save", "id": 2, "fileUrl": ..., "html": ...} -> {"ok": true, "path": ..., "id": 2}
+#
+# Large pages use a chunked save so the host never holds the whole page:
+#   {"type": "save_begin", "transfer": "t1", "fileUrl": ..., "size": <bytes>, "sha256": <hex>}
+#   {"type": "save_chunk", "transfer": "t1", "seq": 0, "data": <base64 of UTF-8 bytes>}   (seq 0, 1, 2, ...)
+#   {"type": "save_commit", "transfer": "t1"}   or   {"type": "save_abort", "transfer": "t1"}
+# Chunk bytes go straight into a temp file next to the target; commit checks
+# the byte count and SHA-256 before os.replace. Any error discards the transfer.
+#
+# Full saves reply with the file's "shellHash" (SHA-256 of everything but the
+# payloads, see docpayload.py). Later saves can send only the payloads:
+#   {"type": "save_payload", "fileUrl": ..., "shellHash": <hex>, "payloads": {"__docs__": ..., "__doc__": ...}}
+# The host splices them into the file on disk if its shell still matches, and
+# otherwise answers {"ok": false, "code": "shell_mismatch"} so the client
+# falls back to a full save.
+#
+# Save queue: save, save_commit and save_payload are queued per path and
+# written by a background thread while the message loop keeps reading (the
+# shared daemon below runs several, never two on the same path).
+#   - A queued save that a newer full save of the same path makes pointless is
+#     never written; it is answered {"ok": true, "superseded": true,
+#     "supersededBy": <newer id>}. Queued payload saves for the same shell merge.
+#   - A save whose content matches what this host last wrote to a file that
+#     hasn't changed since is answered {"ok": true, "unchanged": true} without
+#     touching the disk.
+#
+# Durability ("durability" in a save message, default from the
+# save_host.config.json next to the host, else "none"):
+#   "none"  temp file + os.replace. Survives a crash of the host or browser; a
+#           power cut can lose saves still in the OS write cache. No extra I/O.
+#   "file"  also fsync the temp file before os.replace: each save waits for a
+#           disk flush (on a network share, a round trip to the server and its
+#           disk flush), often slower than the write itself.
+#   "full"  "file" plus fsync of the directory after os.replace, so the rename
+#           is on disk too. Costs a second flush on POSIX; NTFS journals the
+#           rename and directories can't be fsynced there, so on Windows this
+#           is the same as "file".
+#
+# History: the host snapshots each file before (if it was changed elsewhere)
+# and after every save into a deduplicated, compressed store next to it (see
+# snapshots.py; retention from the "snapshots" section of save_host.config.json:
+# {"keep", "maxAgeDays", "maxMB", "enabled"}).
+#   {"type": "list_snapshots", "fileUrl": ...} -> {"ok": true, "snapshots": [{"id", "time", "size"}], "storedBytes": ...}
+#   {"type": "restore_snapshot", "fileUrl": ..., "snapshot": <id>} -> queued like a full save
+#
+# Paged payloads: with "pagedPayloads": {"minKB": 256} in save_host.config.json,
+# a __doc__ payload of at least that size (from save_payload or a one-message
+# save) is written in the compressed, per-page encoding of docformat.py, which
+# the loader opens one page at a time. Chunked saves are written as sent, and so
+# is any file whose inlined app (its SCHEMA_VERSION) predates the paged encoding.
+#
+# Tracing: every request is timed by phase (read, decode, handle, queued,
+# encode, write, fsync, replace, history, send, ...) with its sizes and outcome.
+# Counters are always kept; with tracing on (the "trace" section of
+# save_host.config.json: {"enabled", "ring", "file", "maxKB", "backups"}, or a
+# {"type": "trace", "enabled": true} message) the last records are kept in a
+# ring buffer, with full tracebacks for errors, and optionally appended to a
+# rotating JSONL file next to the host.
+#   {"type": "stats", "recent": 20} -> counts, bytes, latency/phase percentiles and the last 20 records
+#
+# The first save of a session pays for process startup, so only modules the
+# message loop needs are imported up front; the rest are imported on first use.
+# measure_startup.py (next to this file) times cold start and warm round trips.
+import sys, struct, json, math, os, re, time
+
+PROTOCOL_VERSION = 7
+DURABILITY_LEVELS = ("none", "file", "full")
+_TRANSFER_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# Who a request came from: its open chunked saves (transfer id -> state, see
+# begin_transfer) and where its replies go. The daemon has one per connection.
+STDIO = { "tag": "", "transfers": {}, "write": None, "daemon": False }
+# What this host last wrote to each path: {"stat": (mtime_ns, size), "shell":
+# shell hash, "content": SHA-256 of the whole file or None, "payloads": {name: SHA-256}}
+_written = {}
+# Background writer state, created with the first save (see _start_writer)
+_writer = None
+_writer_threads = 1
+_send_lock = None
+_config = None
+# Request counters (always on) and the trace ring/file (see configure_tracing)
+_counters = { "requests": {}, "outcomes": {}, "bytesIn": 0, "bytesWritten": 0 }
+_trace = None
+TRACE_FILE = "save_host.trace.jsonl"
+_STARTED = time.perf_counter()
 
 def base_dir():
     # When frozen by PyInstaller, put the log next to the EXE.
@@ -14,73 +104,1085 @@ def log(msg):
     return
 
 def read_message():
+    """The next message's bytes and a trace record timing how long they took to arrive."""
     raw_len = sys.stdin.buffer.read(4)
     if not raw_len:
         log("stdin closed (no length)")
         sys.exit(0)
+    # Waiting for the length prefix is idle time; the read phase starts here
+    rec = new_record()
     msg_len = struct.unpack("<I", raw_len)[0]
     data = sys.stdin.buffer.read(msg_len)
     if len(data) != msg_len:
         log(f"short read: expected {msg_len}, got {len(data)}")
         sys.exit(0)
-    return json.loads(data.decode("utf-8", "ignore"))
+    rec["bytesIn"] = msg_len
+    mark(rec, "read")
+    return data, rec
 
-def send_message(obj):
+def send_message(obj, rec=None, session=STDIO):
     out = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    write = session["write"] or _write_frame
+    # Once the writer thread runs, replies come from two threads (or more, in the daemon)
+    if _send_lock is not None:
+        with _send_lock:
+            write(out)
+            finish_record(rec, obj)
+    else:
+        write(out)
+        finish_record(rec, obj)
+
+def _write_frame(out):
     sys.stdout.buffer.write(struct.pack("<I", len(out)))
     sys.stdout.buffer.write(out)
     sys.stdout.buffer.flush()
 
+def host_config():
+    global _config
+    if _config is None:
+        _config = {}
+        try:
+            with open(os.path.join(base_dir(), "save_host.config.json"), "r", encoding="utf-8") as f:
+                _config = json.load(f)
+        except (OSError, ValueError):
+            pass
+    return _config
+
+def durability_for(msg):
+    level = msg.get("durability") or host_config().get("durability") or "none"
+    if level not in DURABILITY_LEVELS:
+        raise Exception(f"durability must be one of {', '.join(DURABILITY_LEVELS)}")
+    return level
+
+def fsync_dir(d):
+    # Windows can't open a directory for fsync; NTFS journals the rename anyway
+    if os.name == "nt":
+        return
+    fd = os.open(d, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ---- Tracing ----
+
+def new_record():
+    now = time.perf_counter()
+    return { "t": time.time(), "phases": {}, "_start": now, "_last": now }
+
+def mark(rec, phase):
+    """Close `phase`: the time since the previous mark (or since the record started)."""
+    if rec is not None:
+        now = time.perf_counter()
+        rec["phases"][phase] = round((now - rec["_last"]) * 1000, 3)
+        rec["_last"] = now
+
+def configure_tracing(config):
+    """Turn the ring buffer (and the JSONL file) on or off; `config` is the "trace" config section."""
+    global _trace
+    if _trace and _trace["fh"]:
+        _trace["fh"].close()
+    _trace = None
+    if not config or not config.get("enabled"):
+        return
+    from collections import deque
+    name = config.get("file", True)
+    path = None
+    if name:
+        path = os.path.join(base_dir(), name if isinstance(name, str) else TRACE_FILE)
+    _trace = { "ring": deque(maxlen=max(1, int(config.get("ring", 1000)))), "path": path, "fh": None,
+               "max_bytes": int(config.get("maxKB", 1024)) * 1024, "backups": int(config.get("backups", 2)) }
+
+def _trace_line(line):
+    t = _trace
+    if t["fh"] is None:
+        t["fh"] = open(t["path"], "a", encoding="utf-8")
+    if t["fh"].tell() + len(line) > t["max_bytes"]:
+        # save_host.trace.jsonl -> .1 -> .2 ...; the oldest falls off
+        t["fh"].close()
+        for i in range(t["backups"], 0, -1):
+            older = t["path"] if i == 1 else f"{t['path']}.{i - 1}"
+            if os.path.exists(older):
+                os.replace(older, f"{t['path']}.{i}")
+        t["fh"] = open(t["path"], "w", encoding="utf-8")
+    t["fh"].write(line)
+    t["fh"].flush()
+
+def _outcome(reply):
+    if not reply.get("ok"):
+        return reply.get("code") or "error"
+    if reply.get("superseded"):
+        return "superseded"
+    if reply.get("unchanged"):
+        return "unchanged"
+    return "ok"
+
+def finish_record(rec, reply):
+    """Count a request once its reply is sent and, with tracing on, keep its record."""
+    if rec is None:
+        return
+    mark(rec, "send")
+    kind = rec.get("type") or "?"
+    outcome = _outcome(reply)
+    _counters["requests"][kind] = _counters["requests"].get(kind, 0) + 1
+    _counters["outcomes"][outcome] = _counters["outcomes"].get(outcome, 0) + 1
+    _counters["bytesIn"] += rec.get("bytesIn", 0)
+    _counters["bytesWritten"] += rec.get("bytesOut", 0)
+    if _trace is None:
+        return
+    record = { k: v for k, v in rec.items() if not k.startswith("_") }
+    record["ms"] = round((rec["_last"] - rec["_start"]) * 1000, 3)
+    record["outcome"] = outcome
+    if reply.get("path"):
+        record["path"] = reply["path"]
+    _trace["ring"].append(record)
+    if _trace["path"]:
+        try:
+            _trace_line(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            _trace["path"] = None
+
+def _percentiles(values):
+    ordered = sorted(values)
+    # Nearest rank: the smallest value with at least pct% of the values at or below it
+    pick = lambda pct: ordered[min(len(ordered) - 1, max(0, math.ceil(pct * len(ordered) / 100) - 1))]
+    return { "n": len(ordered), "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": ordered[-1] }
+
+def stats(msg):
+    reply = { "ok": True, "type": "stats", "protocol": PROTOCOL_VERSION, "pid": os.getpid(),
+              "uptimeMs": round((time.perf_counter() - _STARTED) * 1000, 1), "tracing": _trace is not None,
+              "traceFile": _trace and _trace["path"], **{ k: (dict(v) if isinstance(v, dict) else v) for k, v in _counters.items() } }
+    if _daemon is not None:
+        reply["daemon"] = { "connections": _daemon["connections"], "accepted": _daemon["accepted"], "writers": _writer_threads }
+    if _trace is None:
+        return reply
+    # The writer thread appends while we read
+    if _send_lock is not None:
+        with _send_lock:
+            records = list(_trace["ring"])
+    else:
+        records = list(_trace["ring"])
+    by_type, by_phase = {}, {}
+    for r in records:
+        by_type.setdefault(r.get("type") or "?", []).append(r["ms"])
+        for phase, ms in r["phases"].items():
+            by_phase.setdefault(phase, []).append(ms)
+    reply["latencyMs"] = { k: _percentiles(v) for k, v in by_type.items() }
+    reply["phasesMs"] = { k: _percentiles(v) for k, v in by_phase.items() }
+    recent = msg.get("recent") or 0
+    if isinstance(recent, int) and recent > 0:
+        reply["recent"] = records[-recent:]
+    return reply
+
 def file_url_to_path(file_url):
+    from urllib.parse import urlparse, unquote
     p = urlparse(file_url)
     if p.scheme != "file":
         raise Exception("fileUrl must use file://")
-    # Decode %20 etc and convert to a Windows path
+    # Decode %20 etc and convert to a Windows path. nturl2path is what
+    # urllib.request uses on Windows, without importing http/email/ssl.
+    if os.name == "nt":
+        from nturl2path import url2pathname
+    else:
+        from urllib.request import url2pathname
     path = url2pathname(unquote(p.path))
     if os.name == "nt" and path.startswith(("\\", "/")) and len(path) > 3 and path[2] == ":":
         path = path[1:]
     return path
 
-def atomic_write(path, text):
+def check_save_path(path):
+    if not path.lower().endswith(".html"):
+        raise Exception("Only .html files allowed")
     d = os.path.dirname(path) or "."
     if not os.path.isdir(d):
         raise Exception(f"Directory does not exist: {d}")
-    with tempfile.NamedTemporaryFile("w", delete=False, dir=d, encoding="utf-8") as tmp:
-        tmp.write(text)
-        tmp_path = tmp.name
-    os.replace(tmp_path, path)
+    return path
 
-def main():
-    # logging removed per user request (no-op)
+def temp_path_for(path, tag=""):
+    # A pid-tagged name next to the target is unique per host (and avoids
+    # importing tempfile on the startup path); os.replace needs the same volume
+    d = os.path.dirname(path) or "."
+    return os.path.join(d, f".{os.path.basename(path)}.{os.getpid()}{tag}.tmp")
+
+def atomic_write(path, data, durability="none", rec=None):
+    check_save_path(path)
+    tmp_path = temp_path_for(path)
+    try:
+        with open(tmp_path, "wb") as tmp:
+            tmp.write(data)
+            if durability != "none":
+                tmp.flush()
+                mark(rec, "write")
+                os.fsync(tmp.fileno())
+                mark(rec, "fsync")
+        if durability == "none":
+            mark(rec, "write")
+        os.replace(tmp_path, path)
+        mark(rec, "replace")
+        if durability == "full":
+            fsync_dir(os.path.dirname(path) or ".")
+            mark(rec, "fsyncDir")
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _repo_root_on_path():
+    # docpayload.py and snapshots.py live in the repo root, shared with the
+    # Python tools; the frozen host bundles them (save_host.spec pathex)
+    if not getattr(sys, 'frozen', False):
+        root = os.path.dirname(base_dir())
+        if root not in sys.path:
+            sys.path.append(root)
+
+def _docpayload():
+    _repo_root_on_path()
+    import docpayload
+    return docpayload
+
+def _snapshots():
+    _repo_root_on_path()
+    import snapshots
+    return snapshots
+
+def _docformat():
+    _repo_root_on_path()
+    import docformat
+    return docformat
+
+def _paged_min_bytes():
+    config = host_config().get("pagedPayloads")
+    if not config or config.get("enabled", True) is False:
+        return None
+    return int(config.get("minKB", 256)) * 1024
+
+_shell_schemas = {}
+
+def _shell_schema(path, shell_hash):
+    """SCHEMA_VERSION of the app in the shell of `path` (docpayload.shell_schema), cached per shell hash."""
+    if shell_hash not in _shell_schemas:
+        _shell_schemas[shell_hash] = _docpayload().file_shell_schema(path)
+    return _shell_schemas[shell_hash]
+
+def page_payloads(payloads, loader_schema):
+    """
+    `payloads` with a large __doc__ re-encoded as paged (see "Paged payloads"); unchanged if paging is off
+    or the app in the file (`loader_schema()` gives its SCHEMA_VERSION) can't load the paged encoding.
+    """
+    min_bytes = _paged_min_bytes()
+    text = payloads.get("__doc__")
+    if min_bytes is None or text is None or len(text) < min_bytes:
+        return payloads
+    df = _docformat()
+    loads = loader_schema()
+    if loads < df.PAGED_SCHEMA:
+        return payloads
+    try:
+        paged = df.maybe_paged(text, min_bytes)
+    except ValueError:
+        # Not JSON the tools understand: keep it exactly as the page sent it
+        return payloads
+    # Compact tables page as schema 4
+    if paged is text or df.paged_header(paged).get("schema", df.PAGED_SCHEMA) > loads:
+        return payloads
+    return { **payloads, "__doc__": paged }
+
+def page_html(data):
+    """Page bytes with a large __doc__ payload re-encoded as paged; `data` itself if paging is off or not needed."""
+    min_bytes = _paged_min_bytes()
+    if min_bytes is None or len(data) < min_bytes:
+        return data
+    dp = _docpayload()
+    span = dp.find_payload(data)
+    if span is None or span.end - span.start < min_bytes:
+        return data
+    text = dp.DOC_SLOT.unescape(data[span.start:span.end].decode("utf-8"))
+    paged = page_payloads({ "__doc__": text }, lambda: dp.shell_schema(data))["__doc__"]
+    if paged is text:
+        return data
+    return data[:span.start] + dp.DOC_SLOT.escape(paged).encode("utf-8") + data[span.end:]
+
+def keep_history(path):
+    """Snapshot `path` into its history store (see snapshots.py); never fails the save."""
+    config = host_config().get("snapshots") or {}
+    if config.get("enabled", True) is False or _file_stat(path) is None:
+        return
+    try:
+        snapshots = _snapshots()
+        snapshots.take_snapshot(path, snapshots.RetentionPolicy.from_config(config))
+    except Exception:
+        import traceback
+        log("snapshot failed:\n" + traceback.format_exc())
+
+def _file_stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _fresh_record(path):
+    """What this host last wrote to `path`, if the file hasn't changed since."""
+    record = _written.get(path)
+    return record if record and record["stat"] == _file_stat(path) else None
+
+def _sha256(data):
+    import hashlib
+    return hashlib.sha256(data).hexdigest()
+
+def write_full(job):
+    """
+    Write a whole page: job["html"] (text), job["snapshot"] (an id from the
+    file's history) or job["tmp_path"] (a verified chunked upload).
+    """
+    path, rec = job["path"], job.get("trace")
+    if "html" in job or "snapshot" in job:
+        data = job["html"].encode("utf-8") if "html" in job else _snapshots().read_snapshot(path, job["snapshot"])
+        content = _sha256(data)
+        mark(rec, "encode")
+    else:
+        data, content = None, job["sha256"]
+    record = _fresh_record(path)
+    if record and record["content"] == content:
+        if data is None:
+            _remove_quietly(job["tmp_path"])
+        return { "ok": True, "path": path, "unchanged": True, "shellHash": record["shell"] }
+    # Edited outside the host since the last snapshot: keep that version too
+    keep_history(path)
+    mark(rec, "historyBefore")
+    if data is not None:
+        if "html" in job:
+            data = page_html(data)
+            mark(rec, "page")
+        atomic_write(path, data, job["durability"], rec)
+        if rec is not None:
+            rec["bytesOut"] = len(data)
+    else:
+        os.replace(job["tmp_path"], path)
+        mark(rec, "replace")
+        if job["durability"] == "full":
+            fsync_dir(os.path.dirname(path) or ".")
+            mark(rec, "fsyncDir")
+    shell = _docpayload().file_shell_hash(path)
+    _written[path] = { "stat": _file_stat(path), "shell": shell, "content": content, "payloads": {} }
+    mark(rec, "shellHash")
+    keep_history(path)
+    mark(rec, "history")
+    reply = { "ok": True, "path": path, "shellHash": shell }
+    if "bytes" in job:
+        reply["bytes"] = job["bytes"]
+    return reply
+
+def write_payloads(job):
+    dp = _docpayload()
+    path, expected, payloads, rec = job["path"], job["shellHash"], job["payloads"], job.get("trace")
+    mismatch = { "ok": False, "code": "shell_mismatch", "error": f"{path} was changed since it was last saved in full" }
+    if _file_stat(path) is None:
+        return mismatch
+    hashes = { name: _sha256(text.encode("utf-8")) for name, text in payloads.items() }
+    mark(rec, "encode")
+    verify = expected
+    record = _fresh_record(path)
+    if record:
+        if record["shell"] != expected:
+            return mismatch
+        if all(record["payloads"].get(name) == h for name, h in hashes.items()):
+            return { "ok": True, "path": path, "unchanged": True, "shellHash": expected }
+        # Still the file this host wrote last: no need to re-hash its shell
+        verify = None
+    keep_history(path)
+    mark(rec, "historyBefore")
+    payloads = page_payloads(payloads, lambda: _shell_schema(path, expected))
+    mark(rec, "page")
+    try:
+        size = dp.splice_payloads(path, payloads, expected_shell=verify, fsync=job["durability"] != "none")
+    except dp.ShellMismatch as e:
+        mismatch["error"] = str(e)
+        return mismatch
+    # Read, splice, write, (fsync) and os.replace in one go
+    mark(rec, "splice")
+    if rec is not None:
+        rec["bytesOut"] = size
+    if job["durability"] == "full":
+        fsync_dir(os.path.dirname(path) or ".")
+        mark(rec, "fsyncDir")
+    known = record["payloads"] if record else {}
+    _written[path] = { "stat": _file_stat(path), "shell": expected, "content": None, "payloads": { **known, **hashes } }
+    keep_history(path)
+    mark(rec, "history")
+    return { "ok": True, "path": path, "bytes": size, "shellHash": expected }
+
+def save_payload_job(msg):
+    dp = _docpayload()
+    path = check_save_path(file_url_to_path(msg.get("fileUrl","")))
+    expected, payloads = msg.get("shellHash"), msg.get("payloads")
+    if not isinstance(expected, str) or not isinstance(payloads, dict) or not payloads:
+        raise Exception("save_payload needs shellHash and payloads")
+    for name, text in payloads.items():
+        if name not in dp.SLOTS or not isinstance(text, str):
+            raise Exception(f"Unknown payload: {name}")
+    return { "kind": "payload", "path": path, "shellHash": expected, "payloads": payloads }
+
+# ---- Save queue ----
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _start_writer():
+    global _writer, _send_lock
+    if _writer is None:
+        import threading
+        from collections import deque
+        if _send_lock is None:
+            _send_lock = threading.Lock()
+        # "busy": paths a writer thread is writing right now (one job per path at a time)
+        _writer = { "cond": threading.Condition(), "pending": {}, "order": deque(), "busy": set(), "stopping": False }
+        _writer["threads"] = [threading.Thread(target=_writer_loop, args=(_writer,), name=f"save-writer-{i}", daemon=True)
+                              for i in range(_writer_threads)]
+        for thread in _writer["threads"]:
+            thread.start()
+    return _writer
+
+def _coalesce(older, newer):
+    """The job that does the work of both, or None if both must be written."""
+    durability = max(older["durability"], newer["durability"], key=DURABILITY_LEVELS.index)
+    if newer["kind"] == "full":
+        # A full save carries everything the older one would have written
+        return { **newer, "durability": durability }
+    if older["kind"] == "payload" and older["shellHash"] == newer["shellHash"]:
+        return { **newer, "durability": durability, "payloads": { **older["payloads"], **newer["payloads"] } }
+    return None
+
+def enqueue_save(job):
+    writer = _start_writer()
+    superseded = None
+    with writer["cond"]:
+        jobs = writer["pending"].get(job["path"])
+        if not jobs:
+            writer["pending"][job["path"]] = [job]
+            writer["order"].append(job["path"])
+        else:
+            merged = _coalesce(jobs[-1], job)
+            if merged is None:
+                jobs.append(job)
+            else:
+                superseded, jobs[-1] = jobs[-1], merged
+        writer["cond"].notify()
+    if superseded is not None:
+        if "tmp_path" in superseded and superseded["tmp_path"] != job.get("tmp_path"):
+            _remove_quietly(superseded["tmp_path"])
+        _reply(superseded, { "ok": True, "path": superseded["path"], "superseded": True, "supersededBy": job["id"] })
+
+def _next_path(writer):
+    # The longest-waiting path no other writer thread is busy with
+    for path in writer["order"]:
+        if path not in writer["busy"]:
+            return path
+    return None
+
+def _writer_loop(writer):
     while True:
+        with writer["cond"]:
+            path = _next_path(writer)
+            while path is None:
+                if writer["stopping"] and not writer["order"]:
+                    return
+                writer["cond"].wait()
+                path = _next_path(writer)
+            writer["order"].remove(path)
+            jobs = writer["pending"][path]
+            job = jobs.pop(0)
+            # One job per path at a time; the path's next job waits its turn
+            if jobs:
+                writer["order"].append(path)
+            else:
+                del writer["pending"][path]
+            writer["busy"].add(path)
         try:
-            msg = read_message()
-            req_id = uuid.uuid4().hex[:8]
-            log(f"req={req_id} keys={list(msg.keys())} type={msg.get('type')} fileUrl={msg.get('fileUrl')} html_len={len(msg.get('html') or '')}")
-            if msg.get("type") != "save":
-                send_message({ "ok": False, "error": "Unknown message type" })
-                continue
-            path = file_url_to_path(msg.get("fileUrl",""))
-            html = msg.get("html","")
-            log(f"req={req_id} saving to: {path}")
-            if not path.lower().endswith(".html"):
-                raise Exception("Only .html files allowed")
-            atomic_write(path, html)
-            send_message({ "ok": True, "path": path })
-            log(f"req={req_id} save ok")
-        except SystemExit:
-            raise
-        except Exception:
-            err = traceback.format_exc()
-            log("ERROR:\n" + err)
+            _write_job(job)
+        finally:
+            with writer["cond"]:
+                writer["busy"].discard(path)
+                writer["cond"].notify_all()
+
+def _write_job(job):
+    mark(job.get("trace"), "queued")
+    try:
+        reply = write_full(job) if job["kind"] == "full" else write_payloads(job)
+    except Exception:
+        import traceback
+        err = traceback.format_exc()
+        log("ERROR:\n" + err)
+        if "tmp_path" in job:
+            _remove_quietly(job["tmp_path"])
+        if job.get("trace") is not None:
+            job["trace"]["error"] = err
+        reply = { "ok": False, "error": err.splitlines()[-1] }
+    _reply(job, reply)
+
+def _reply(job, reply):
+    if job["id"] is not None:
+        reply["id"] = job["id"]
+    try:
+        send_message(reply, job.get("trace"), job.get("session", STDIO))
+    except Exception:
+        pass
+
+def stop_writer():
+    """Finish the queued saves (the browser closed the port) and stop the writer."""
+    if _writer is None:
+        return
+    with _writer["cond"]:
+        _writer["stopping"] = True
+        _writer["cond"].notify_all()
+    for thread in _writer["threads"]:
+        thread.join()
+
+def _get_transfer(msg, session):
+    transfer = msg.get("transfer")
+    t = session["transfers"].get(transfer) if isinstance(transfer, str) else None
+    if t is None:
+        raise Exception(f"Unknown transfer: {transfer}")
+    return t
+
+def discard_transfer(t):
+    t["transfers"].pop(t["transfer"], None)
+    try:
+        t["file"].close()
+        os.remove(t["tmp_path"])
+    except OSError:
+        pass
+
+def begin_transfer(msg, session=STDIO):
+    import hashlib
+    transfer = msg.get("transfer")
+    if not isinstance(transfer, str) or not _TRANSFER_ID.fullmatch(transfer):
+        raise Exception("transfer must be 1-64 letters, digits, '-' or '_'")
+    if transfer in session["transfers"]:
+        raise Exception(f"Transfer already open: {transfer}")
+    size, sha256 = msg.get("size"), str(msg.get("sha256") or "").lower()
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        raise Exception("size must be the byte length of the page")
+    if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        raise Exception("sha256 must be a hex SHA-256 digest")
+    path = check_save_path(file_url_to_path(msg.get("fileUrl","")))
+    tmp_path = temp_path_for(path, f".{session['tag']}{transfer}")
+    session["transfers"][transfer] = { "transfer": transfer, "transfers": session["transfers"], "path": path, "tmp_path": tmp_path, "file": open(tmp_path, "wb"),
+                             "size": size, "sha256": sha256, "hash": hashlib.sha256(), "received": 0, "next_seq": 0 }
+    return { "ok": True, "transfer": transfer }
+
+def write_chunk(msg, rec=None, session=STDIO):
+    import base64, binascii
+    t = _get_transfer(msg, session)
+    try:
+        seq = msg.get("seq")
+        if seq != t["next_seq"]:
+            raise Exception(f"Expected chunk {t['next_seq']}, got {seq}")
+        try:
+            data = base64.b64decode(msg.get("data") or "", validate=True)
+        except binascii.Error:
+            raise Exception(f"Chunk {seq} is not valid base64")
+        if t["received"] + len(data) > t["size"]:
+            raise Exception(f"Chunk {seq} goes past the announced size ({t['size']} bytes)")
+        mark(rec, "decode64")
+        t["file"].write(data)
+        t["hash"].update(data)
+        t["received"] += len(data)
+        t["next_seq"] += 1
+        mark(rec, "write")
+        if rec is not None:
+            rec["bytesOut"] = len(data)
+    except Exception:
+        discard_transfer(t)
+        raise
+    return { "ok": True, "transfer": t["transfer"], "seq": seq, "received": t["received"] }
+
+def commit_transfer(msg, session=STDIO):
+    t = _get_transfer(msg, session)
+    try:
+        if t["received"] != t["size"]:
+            raise Exception(f"Received {t['received']} of {t['size']} bytes")
+        if t["hash"].hexdigest() != t["sha256"]:
+            raise Exception("SHA-256 mismatch, file left unchanged")
+        durability = durability_for(msg)
+        if durability != "none":
+            t["file"].flush()
+            os.fsync(t["file"].fileno())
+        t["file"].close()
+    except Exception:
+        discard_transfer(t)
+        raise
+    session["transfers"].pop(t["transfer"], None)
+    # The verified temp file replaces the target from the writer thread
+    return { "kind": "full", "path": t["path"], "tmp_path": t["tmp_path"], "sha256": t["sha256"],
+             "bytes": t["received"], "durability": durability }
+
+def abort_transfer(msg, session=STDIO):
+    discard_transfer(_get_transfer(msg, session))
+    return { "ok": True, "transfer": msg.get("transfer") }
+
+def handle_message(msg, rec=None, session=STDIO):
+    kind = msg.get("type")
+    if kind == "ping":
+        return { "ok": True, "type": "ready", "protocol": PROTOCOL_VERSION, "pid": os.getpid(),
+                 "uptimeMs": round((time.perf_counter() - _STARTED) * 1000, 1), "daemon": session["daemon"] }
+    if kind == "save":
+        path = check_save_path(file_url_to_path(msg.get("fileUrl","")))
+        html = msg.get("html","")
+        log(f"req={msg.get('id')} saving to: {path}")
+        job = { "kind": "full", "path": path, "html": html, "durability": durability_for(msg) }
+    elif kind == "save_commit":
+        job = commit_transfer(msg, session)
+    elif kind == "save_payload":
+        job = save_payload_job(msg)
+        job["durability"] = durability_for(msg)
+    elif kind == "restore_snapshot":
+        path = check_save_path(file_url_to_path(msg.get("fileUrl","")))
+        snapshot = msg.get("snapshot")
+        if not isinstance(snapshot, int) or isinstance(snapshot, bool):
+            raise Exception("snapshot must be a snapshot id from list_snapshots")
+        job = { "kind": "full", "path": path, "snapshot": snapshot, "durability": durability_for(msg) }
+    elif kind == "list_snapshots":
+        path = check_save_path(file_url_to_path(msg.get("fileUrl","")))
+        snapshots = _snapshots()
+        index = snapshots.load_index(snapshots.store_dir(path))
+        return { "ok": True, "path": path, "snapshots": snapshots.list_snapshots(path),
+                 "storedBytes": snapshots.stored_bytes(index) }
+    elif kind == "stats":
+        return stats(msg)
+    elif kind == "trace":
+        configure_tracing({ **(host_config().get("trace") or {}), "enabled": bool(msg.get("enabled")) })
+        return { "ok": True, "tracing": _trace is not None, "traceFile": _trace and _trace["path"] }
+    elif kind == "save_begin":
+        return begin_transfer(msg, session)
+    elif kind == "save_chunk":
+        return write_chunk(msg, rec, session)
+    elif kind == "save_abort":
+        return abort_transfer(msg, session)
+    else:
+        return { "ok": False, "error": "Unknown message type" }
+    # Written (and answered) by the writer thread
+    job["id"] = msg.get("id")
+    job["trace"] = rec
+    job["session"] = session
+    mark(rec, "handle")
+    enqueue_save(job)
+    return None
+
+def serve_message(data, rec, session=STDIO):
+    """Decode, handle and answer one message; False once replies can't be sent."""
+    req_id = None
+    try:
+        msg = json.loads(data.decode("utf-8"))
+        mark(rec, "decode")
+        if not isinstance(msg, dict):
+            raise Exception("Message must be a JSON object")
+        req_id = msg.get("id")
+        rec["id"], rec["type"] = req_id, msg.get("type")
+        log(f"req={req_id} keys={list(msg.keys())} type={msg.get('type')} fileUrl={msg.get('fileUrl')} html_len={len(msg.get('html') or '')}")
+        reply = handle_message(msg, rec, session)
+        if reply is None:
+            return True
+        mark(rec, "handle")
+    except Exception:
+        import traceback
+        err = traceback.format_exc()
+        log("ERROR:\n" + err)
+        mark(rec, "handle")
+        # The client only gets the last line; the trace keeps all of it
+        rec["error"] = err
+        reply = { "ok": False, "error": err.splitlines()[-1] }
+    if req_id is not None:
+        reply["id"] = req_id
+    try:
+        send_message(reply, rec, session)
+    except Exception:
+        return False
+    return True
+
+# ---- Shared daemon ----
+#
+# Every browser (and every profile) starts its own host process, so two
+# browsers saving the same file would race each other's os.replace, and each
+# host re-learns shell hashes the others already know. With "daemon":
+# {"enabled": true} in save_host.config.json, hosts instead relay their
+# messages to one long-lived `save_host.py --daemon` per user, over a Unix
+# socket (a named pipe on Windows) that only holders of a per-user key file
+# (in %LOCALAPPDATA%\CertMaker or $XDG_RUNTIME_DIR) can use. The daemon keeps one save queue for all of them, so saves
+# of a path stay in order and coalesce across browsers, while up to "writers"
+# (default 4) threads write different paths in parallel. _written and the
+# config are shared, so a payload save from one browser can skip re-hashing a
+# shell another browser just wrote.
+#   {"enabled", "autostart" (default true: start the daemon if none answers),
+#    "writers", "idleMinutes" (default 30: exit when no host has been connected that long)}
+# Without a daemon (disabled, or it can't be reached or started), the host
+# saves in-process as before; after a daemon failed to start, hosts don't try
+# again for DAEMON_RETRY_SECONDS. If the daemon goes away mid-session the host
+# carries on in-process; requests it had already forwarded get no reply.
+DAEMON_KEY_FILE = "save_host.daemon.key"
+DAEMON_CONNECT_TIMEOUT = 3.0
+# After a daemon failed to start, hosts save in-process for this long before trying again
+DAEMON_RETRY_SECONDS = 600
+DAEMON_FAILED_FILE = "save_host.daemon.failed"
+_daemon = None
+
+def daemon_config():
+    config = host_config().get("daemon")
+    return config if isinstance(config, dict) and config.get("enabled") else None
+
+def daemon_address():
+    if os.name == "nt":
+        user = re.sub(r"[^A-Za-z0-9_.-]", "_", os.environ.get("USERNAME") or "user")
+        return rf"\\.\pipe\certmaker-save-host-{user}"
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(runtime, f"certmaker-save-host-{os.getuid()}.sock")
+
+def daemon_dir():
+    """Per-user folder for the daemon's key: %LOCALAPPDATA% or $XDG_RUNTIME_DIR, not the (shared) install folder."""
+    if os.name == "nt":
+        root = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+        d = os.path.join(root, "CertMaker")
+    else:
+        d = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".certmaker")
+    os.makedirs(d, mode=0o700, exist_ok=True)
+    return d
+
+def _windows_acl():
+    """
+    (make_private, is_private) for files on Windows, where a file's mode bits
+    mean nothing: make_private replaces a file's DACL with one that grants the
+    current user's SID alone (no inherited entries); is_private checks a file
+    has exactly that DACL.
+    """
+    import ctypes
+    from ctypes import wintypes
+    advapi32 = ctypes.WinDLL("advapi32", use_last_error=True)
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    kernel32.LocalFree.argtypes = [ctypes.c_void_p]
+    advapi32.OpenProcessToken.argtypes = [wintypes.HANDLE, wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE)]
+    advapi32.GetTokenInformation.argtypes = [wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p, wintypes.DWORD, ctypes.POINTER(wintypes.DWORD)]
+    advapi32.ConvertSidToStringSidW.argtypes = [ctypes.c_void_p, ctypes.POINTER(wintypes.LPWSTR)]
+    advapi32.ConvertStringSecurityDescriptorToSecurityDescriptorW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p]
+    advapi32.ConvertSecurityDescriptorToStringSecurityDescriptorW.argtypes = [ctypes.c_void_p, wintypes.DWORD, wintypes.DWORD, ctypes.POINTER(wintypes.LPWSTR), ctypes.c_void_p]
+    advapi32.SetFileSecurityW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, ctypes.c_void_p]
+    advapi32.GetFileSecurityW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, ctypes.c_void_p, wintypes.DWORD, ctypes.POINTER(wintypes.DWORD)]
+    TOKEN_QUERY, TOKEN_USER, SDDL_REVISION_1 = 0x0008, 1, 1
+    DACL_SECURITY_INFORMATION, PROTECTED_DACL_SECURITY_INFORMATION = 0x4, 0x80000000
+
+    def check(ok):
+        if not ok:
+            raise ctypes.WinError(ctypes.get_last_error())
+
+    def to_sddl(sd):
+        text = wintypes.LPWSTR()
+        check(advapi32.ConvertSecurityDescriptorToStringSecurityDescriptorW(sd, SDDL_REVISION_1, DACL_SECURITY_INFORMATION, ctypes.byref(text), None))
+        try:
+            return text.value
+        finally:
+            kernel32.LocalFree(text)
+
+    token = wintypes.HANDLE()
+    check(advapi32.OpenProcessToken(kernel32.GetCurrentProcess(), TOKEN_QUERY, ctypes.byref(token)))
+    try:
+        size = wintypes.DWORD()
+        advapi32.GetTokenInformation(token, TOKEN_USER, None, 0, ctypes.byref(size))
+        info = ctypes.create_string_buffer(size.value)
+        check(advapi32.GetTokenInformation(token, TOKEN_USER, info, size, ctypes.byref(size)))
+    finally:
+        kernel32.CloseHandle(token)
+    # TOKEN_USER starts with the SID pointer
+    sid_text = wintypes.LPWSTR()
+    check(advapi32.ConvertSidToStringSidW(ctypes.c_void_p.from_buffer(info).value, ctypes.byref(sid_text)))
+    try:
+        sddl = f"D:P(A;;FA;;;{sid_text.value})"
+    finally:
+        kernel32.LocalFree(sid_text)
+    sd = ctypes.c_void_p()
+    check(advapi32.ConvertStringSecurityDescriptorToSecurityDescriptorW(sddl, SDDL_REVISION_1, ctypes.byref(sd), None))
+    # Compared after the same round trip, so Windows' own spelling of the SDDL doesn't matter
+    expected = to_sddl(sd)
+
+    def make_private(path):
+        check(advapi32.SetFileSecurityW(path, DACL_SECURITY_INFORMATION | PROTECTED_DACL_SECURITY_INFORMATION, sd))
+
+    def is_private(path):
+        size = wintypes.DWORD()
+        advapi32.GetFileSecurityW(path, DACL_SECURITY_INFORMATION, None, 0, ctypes.byref(size))
+        buf = ctypes.create_string_buffer(size.value)
+        check(advapi32.GetFileSecurityW(path, DACL_SECURITY_INFORMATION, buf, size, ctypes.byref(size)))
+        return to_sddl(buf) == expected
+
+    return make_private, is_private
+
+def _key_is_private(path, f):
+    if os.name == "nt":
+        try:
+            return _windows_acl()[1](path)
+        except OSError:
+            # No ACLs to check (e.g. a FAT drive): not private
+            return False
+    st = os.fstat(f.fileno())
+    return st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+def daemon_key(create=False):
+    """
+    The shared secret hosts authenticate with; the first daemon creates it in
+    daemon_dir(), readable by this user only. A key file anyone else can read
+    is refused (None), so no daemon runs until it is deleted.
+    """
+    path = os.path.join(daemon_dir(), DAEMON_KEY_FILE)
+    try:
+        with open(path, "rb") as f:
+            if not _key_is_private(path, f):
+                log(f"daemon key {path} is readable by other users; delete it to use the daemon again")
+                return None
+            key = f.read()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    if not create:
+        return None
+    key = os.urandom(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o600)
+    except FileExistsError:
+        # Another daemon got there first
+        return daemon_key()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if os.name == "nt":
+                # Before the key is in it: the file inherited the folder's ACL
+                _windows_acl()[0](path)
+            f.write(key)
+    except BaseException:
+        _remove_quietly(path)
+        raise
+    # Earlier versions kept the key in the install folder
+    _remove_quietly(os.path.join(base_dir(), DAEMON_KEY_FILE))
+    return key
+
+def connect_daemon():
+    """A connection to the running daemon, or None."""
+    key = daemon_key()
+    if key is None:
+        return None
+    from multiprocessing.connection import Client
+    try:
+        return Client(daemon_address(), authkey=key)
+    except Exception:
+        # Not running, a stale socket, or a key from an older daemon
+        return None
+
+def spawn_daemon():
+    """
+    Start a detached daemon and wait for it to answer; None if it exited or
+    didn't answer in time. A failed start is remembered for
+    DAEMON_RETRY_SECONDS so later sessions don't wait for it again.
+    """
+    import subprocess
+    failed = os.path.join(daemon_dir(), DAEMON_FAILED_FILE)
+    try:
+        if time.time() - os.stat(failed).st_mtime < DAEMON_RETRY_SECONDS:
+            return None
+    except OSError:
+        pass
+    if getattr(sys, 'frozen', False):
+        cmd = [sys.executable, "--daemon"]
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__), "--daemon"]
+    # The daemon must not hold on to the browser's stdin/stdout pipes
+    kwargs = { "stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "close_fds": True }
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+    else:
+        kwargs["start_new_session"] = True
+    try:
+        proc = subprocess.Popen(cmd, cwd=base_dir(), **kwargs)
+    except OSError:
+        proc = None
+    deadline = time.monotonic() + DAEMON_CONNECT_TIMEOUT
+    while proc is not None and time.monotonic() < deadline:
+        conn = connect_daemon()
+        if conn is not None:
+            _remove_quietly(failed)
+            return conn
+        if proc.poll() is not None:
+            # Exited: couldn't start, or another daemon was already running
+            conn = connect_daemon()
+            if conn is not None:
+                return conn
+            break
+        time.sleep(0.05)
+    try:
+        with open(failed, "w") as f:
+            f.write(str(time.time()))
+    except OSError:
+        pass
+    return None
+
+def relay(conn):
+    """
+    Forward this browser's messages to the daemon and its replies back as
+    they come. None when the browser closed the port; if the daemon went away
+    first, the message it didn't take (the caller answers that one and the
+    rest itself, so no request is left without a reply).
+    """
+    import threading
+
+    def replies():
+        try:
+            while True:
+                _write_frame(conn.recv_bytes())
+        except (EOFError, OSError):
+            pass
+
+    reader = threading.Thread(target=replies, name="daemon-replies", daemon=True)
+    reader.start()
+    try:
+        while True:
+            raw_len = sys.stdin.buffer.read(4)
+            if not raw_len:
+                return None
+            data = sys.stdin.buffer.read(struct.unpack("<I", raw_len)[0])
             try:
-                send_message({ "ok": False, "error": err.splitlines()[-1] })
-            except Exception:
+                conn.send_bytes(data)
+            except OSError:
+                return data
+    finally:
+        conn.close()
+        reader.join(1.0)
+
+def _serve_connection(conn, tag):
+    session = { "tag": tag, "transfers": {}, "write": conn.send_bytes, "daemon": True }
+    try:
+        while True:
+            try:
+                data = conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            rec = new_record()
+            rec["bytesIn"] = len(data)
+            mark(rec, "read")
+            if not serve_message(data, rec, session):
                 break
+    finally:
+        # Queued saves from this connection are still written; their replies are dropped
+        for t in list(session["transfers"].values()):
+            discard_transfer(t)
+        conn.close()
+        with _daemon["lock"]:
+            _daemon["connections"] -= 1
+            _daemon["idleSince"] = time.monotonic()
+
+def _idle_watch(listener_address, key, idle_seconds):
+    from multiprocessing.connection import Client
+    while True:
+        time.sleep(min(10.0, idle_seconds))
+        with _daemon["lock"]:
+            idle = _daemon["connections"] == 0 and time.monotonic() - _daemon["idleSince"] >= idle_seconds
+            if idle:
+                _daemon["stopping"] = True
+        if idle:
+            # Wake the accept() in serve_daemon
+            try:
+                Client(listener_address, authkey=key).close()
+            except Exception:
+                pass
+            return
+
+def serve_daemon():
+    global _daemon, _writer_threads
+    import threading
+    from multiprocessing.connection import Listener
+    config = host_config().get("daemon") or {}
+    existing = connect_daemon()
+    if existing is not None:
+        existing.close()
+        print("A save daemon is already running", file=sys.stderr)
+        return 0
+    address = daemon_address()
+    if os.name != "nt" and os.path.exists(address):
+        # Left behind by a daemon that didn't exit cleanly
+        os.remove(address)
+    try:
+        key = daemon_key(create=True)
+        if key is None:
+            raise OSError("the daemon key file is readable by other users")
+        listener = Listener(address, authkey=key)
+    except OSError as e:
+        # Exits non-zero, so spawn_daemon stops waiting
+        print(f"Can't start the save daemon: {e}", file=sys.stderr)
+        return 1
+    if os.name != "nt":
+        os.chmod(address, 0o600)
+    _writer_threads = max(1, int(config.get("writers", 4)))
+    configure_tracing(host_config().get("trace"))
+    _daemon = { "lock": threading.Lock(), "connections": 0, "accepted": 0, "idleSince": time.monotonic(), "stopping": False }
+    # Connection threads reply and enqueue concurrently from the start
+    _start_writer()
+    threading.Thread(target=_idle_watch, args=(address, key, float(config.get("idleMinutes", 30)) * 60),
+                     name="daemon-idle", daemon=True).start()
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                # A client that failed the handshake
+                if _daemon["stopping"]:
+                    break
+                continue
+            with _daemon["lock"]:
+                if _daemon["stopping"]:
+                    conn.close()
+                    break
+                _daemon["connections"] += 1
+                _daemon["accepted"] += 1
+                tag = f"c{_daemon['accepted']}-"
+            threading.Thread(target=_serve_connection, args=(conn, tag), name=f"daemon-{tag[:-1]}", daemon=True).start()
+    finally:
+        listener.close()
+        stop_writer()
+    return 0
+
+def main():
+    # logging removed per user request (no-op)
+    configure_tracing(host_config().get("trace"))
+    config = daemon_config()
+    if config is not None:
+        conn = connect_daemon()
+        if conn is None and config.get("autostart", True):
+            conn = spawn_daemon()
+        if conn is not None:
+            unsent = relay(conn)
+            if unsent is None:
+                return
+            rec = new_record()
+            rec["bytesIn"] = len(unsent)
+            mark(rec, "read")
+            if not serve_message(unsent, rec):
+                return
+    while True:
+        data, rec = read_message()
+        if not serve_message(data, rec):
+            break
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["--daemon"]:
+        sys.exit(serve_daemon())
     try:
         main()
     except Exception:
         # logging removed per user request (no-op)
         pass
+    finally:
+        stop_writer()
+        # Browser closed the port mid-transfer: don't leave temp files behind
+        for t in list(STDIO["transfers"].values()):
+            discard_transfer(t)
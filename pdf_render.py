@@ -0,0 +1,797 @@
+#!/usr/bin/env python3
+"""
+Vector PDF renderer for the document model (no browser, no html2canvas).
+
+Reads the serialized DocumentModel (from a saved HTML file's
+<pre id="__doc__"> payload or a .json file) and writes a PDF directly:
+shapes and table borders as vector paths, text as real text in the standard
+PDF fonts, and every distinct image embedded once and reused.
+
+Layout follows app.view.render.js / editor.tables.js: A4 pages, CSS pixels
+(96 per inch) for positions and sizes, pt for font sizes, line-height 1.4,
+element padding 6px 8px, cell padding from styles.padding (default 8px).
+Fonts map onto Helvetica, Times or Courier by family; text outside
+Windows-1252 falls back to '?'. Images may be JPEG or PNG data: URLs (PNG
+alpha becomes a soft mask; interlaced PNGs and other formats are skipped).
+
+Usage:
+  python pdf_render.py certificate.html                 # writes certificate.pdf
+  python pdf_render.py archive/*.html -o pdf/ -j 8      # many files in parallel
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import re
+import struct
+import sys
+import time
+import unicodedata
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from docformat import document_of, parse_payload
+from docpayload import read_payload
+
+# A4 in CSS pixels (style.css: --page-w: 210mm; --page-h: 297mm)
+PAGE_WIDTH_PX = 210 / 25.4 * 96
+PAGE_HEIGHT_PX = 297 / 25.4 * 96
+PX_TO_PT = 0.75
+LINE_HEIGHT = 1.4
+DEFAULT_TEXT_COLOR = '#111827'
+
+# Advance widths (1/1000 em) of the standard fonts for characters 32..126
+_WIDTHS_HELVETICA = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_WIDTHS_HELVETICA_BOLD = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+_WIDTHS_TIMES = (
+    250, 333, 408, 500, 500, 833, 778, 180, 333, 333, 500, 564, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 564, 564, 564, 444,
+    921, 722, 667, 667, 722, 611, 556, 722, 722, 333, 389, 722, 611, 889, 722, 722,
+    556, 722, 667, 556, 611, 722, 722, 944, 722, 722, 611, 333, 278, 333, 469, 500,
+    333, 444, 500, 444, 500, 444, 333, 500, 500, 278, 278, 500, 278, 778, 500, 500,
+    500, 500, 333, 389, 278, 500, 500, 722, 500, 500, 444, 480, 200, 480, 541,
+)
+_WIDTHS_TIMES_BOLD = (
+    250, 333, 555, 500, 500, 1000, 833, 278, 333, 333, 500, 570, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 333, 333, 570, 570, 570, 500,
+    930, 722, 667, 722, 722, 667, 611, 778, 778, 389, 500, 778, 667, 944, 722, 778,
+    611, 778, 722, 556, 667, 722, 722, 1000, 722, 722, 667, 333, 278, 333, 581, 500,
+    333, 500, 556, 444, 556, 444, 333, 500, 556, 278, 333, 556, 278, 833, 556, 500,
+    556, 556, 444, 389, 333, 556, 500, 722, 500, 500, 444, 394, 220, 394, 520,
+)
+_WIDTHS_COURIER = (600,) * 95
+
+# (family, bold, italic) -> (PDF base font, widths); italics reuse the upright widths
+_FONTS = {
+    ('sans', False, False): ('Helvetica', _WIDTHS_HELVETICA),
+    ('sans', True, False): ('Helvetica-Bold', _WIDTHS_HELVETICA_BOLD),
+    ('sans', False, True): ('Helvetica-Oblique', _WIDTHS_HELVETICA),
+    ('sans', True, True): ('Helvetica-BoldOblique', _WIDTHS_HELVETICA_BOLD),
+    ('serif', False, False): ('Times-Roman', _WIDTHS_TIMES),
+    ('serif', True, False): ('Times-Bold', _WIDTHS_TIMES_BOLD),
+    ('serif', False, True): ('Times-Italic', _WIDTHS_TIMES),
+    ('serif', True, True): ('Times-BoldItalic', _WIDTHS_TIMES_BOLD),
+    ('mono', False, False): ('Courier', _WIDTHS_COURIER),
+    ('mono', True, False): ('Courier-Bold', _WIDTHS_COURIER),
+    ('mono', False, True): ('Courier-Oblique', _WIDTHS_COURIER),
+    ('mono', True, True): ('Courier-BoldOblique', _WIDTHS_COURIER),
+}
+# Ascent/descent (em) of the browser fonts each family stands in for, to place baselines like CSS does
+_FONT_METRICS = {'sans': (0.905, 0.212), 'serif': (0.891, 0.216), 'mono': (0.833, 0.300)}
+
+_NAMED_COLORS = {
+    'black': (0, 0, 0), 'white': (255, 255, 255), 'red': (255, 0, 0), 'green': (0, 128, 0),
+    'blue': (0, 0, 255), 'gray': (128, 128, 128), 'grey': (128, 128, 128), 'yellow': (255, 255, 0),
+    'orange': (255, 165, 0), 'purple': (128, 0, 128), 'silver': (192, 192, 192), 'navy': (0, 0, 128),
+}
+_RGB_FUNC = re.compile(r"rgba?\(\s*([\d.]+)[\s,]+([\d.]+)[\s,]+([\d.]+)(?:\s*[,/]\s*([\d.]+%?))?\s*\)", re.IGNORECASE)
+_DATA_URL = re.compile(r"^data:([^;,]*)(;base64)?,", re.IGNORECASE)
+
+
+def _font_family(css_family):
+    family = (css_family or '').lower()
+    if 'mono' in family or 'courier' in family or 'consolas' in family:
+        return 'mono'
+    if re.search(r"times|georgia|garamond|cambria|(?<!sans-)serif", family):
+        return 'serif'
+    return 'sans'
+
+
+def _char_width(ch, widths):
+    code = ord(ch)
+    if 32 <= code <= 126:
+        return widths[code - 32]
+    # Accented Latin letters measure like their base letter
+    base = unicodedata.normalize('NFKD', ch)[:1]
+    if base and 32 <= ord(base) <= 126:
+        return widths[ord(base) - 32]
+    return widths[ord('n') - 32]
+
+
+def text_width(text, font_key, size):
+    """Width of `text` in the units of `size` for a _FONTS key."""
+    widths = _FONTS[font_key][1]
+    return sum(_char_width(ch, widths) for ch in text) * size / 1000
+
+
+def wrap_text(text, font_key, size, max_width):
+    """Break text into lines like CSS white-space: pre-wrap; word-break: break-word."""
+    lines = []
+    for para in str(text).replace('\r\n', '\n').replace('\t', '    ').split('\n'):
+        line = ''
+        for word in re.findall(r"\S+\s*|\s+", para) or ['']:
+            candidate = line + word
+            if not line or text_width(candidate.rstrip(), font_key, size) <= max_width:
+                line = candidate
+            else:
+                lines.append(line.rstrip())
+                line = word
+            # A single word wider than the box breaks between characters
+            while text_width(line.rstrip(), font_key, size) > max_width and len(line.rstrip()) > 1:
+                cut = len(line)
+                while cut > 1 and text_width(line[:cut], font_key, size) > max_width:
+                    cut -= 1
+                lines.append(line[:cut])
+                line = line[cut:]
+        lines.append(line.rstrip())
+    return lines
+
+
+def parse_color(value):
+    """CSS color -> (r, g, b, alpha) with components in 0..1, or None for transparent/unknown."""
+    if value is None:
+        return None
+    v = str(value).strip().lower()
+    if not v or v in ('transparent', 'none'):
+        return None
+    if v.startswith('#'):
+        hexpart = v[1:]
+        if len(hexpart) in (3, 4):
+            hexpart = ''.join(c * 2 for c in hexpart)
+        if len(hexpart) not in (6, 8) or not re.fullmatch(r"[0-9a-f]+", hexpart):
+            return None
+        r, g, b = (int(hexpart[i:i + 2], 16) / 255 for i in (0, 2, 4))
+        a = int(hexpart[6:8], 16) / 255 if len(hexpart) == 8 else 1.0
+    elif v in _NAMED_COLORS:
+        r, g, b = (c / 255 for c in _NAMED_COLORS[v])
+        a = 1.0
+    else:
+        m = _RGB_FUNC.match(v)
+        if not m:
+            return None
+        r, g, b = (min(255.0, float(m.group(i))) / 255 for i in (1, 2, 3))
+        alpha = m.group(4)
+        if alpha is None:
+            a = 1.0
+        elif alpha.endswith('%'):
+            a = float(alpha[:-1]) / 100
+        else:
+            a = float(alpha)
+    a = max(0.0, min(1.0, a))
+    return (r, g, b, a) if a > 0 else None
+
+
+def _num(value):
+    return f"{value:.3f}".rstrip('0').rstrip('.') if value != int(value) else str(int(value))
+
+
+def _pdf_string(data: bytes) -> bytes:
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').replace(b'\r', b'\\r') + b')'
+
+
+# ----------------------- Images -----------------------
+
+def _jpeg_image(data):
+    """Image XObject spec for a baseline/progressive JPEG (embedded as-is)."""
+    i = 2
+    adobe = False
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker == 0xEE and data[i + 4:i + 9] == b'Adobe':
+            adobe = True
+        if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            components = data[i + 9]
+            colorspace = {1: '/DeviceGray', 3: '/DeviceRGB', 4: '/DeviceCMYK'}.get(components)
+            if not colorspace:
+                return None
+            extra = ' /Decode [1 0 1 0 1 0 1 0]' if components == 4 and adobe else ''
+            return {'width': width, 'height': height, 'colorspace': colorspace, 'bpc': 8,
+                    'filter': '/DCTDecode', 'extra': extra, 'data': data, 'smask': None}
+        i += 2 + length
+    return None
+
+
+def _png_unfilter(data, height, row_bytes, bpp):
+    out = bytearray(height * row_bytes)
+    prev = bytearray(row_bytes)
+    pos = 0
+    for y in range(height):
+        ftype = data[pos]
+        row = bytearray(data[pos + 1:pos + 1 + row_bytes])
+        pos += 1 + row_bytes
+        if ftype == 1:
+            for i in range(bpp, row_bytes):
+                row[i] = (row[i] + row[i - bpp]) & 0xFF
+        elif ftype == 2:
+            for i in range(row_bytes):
+                row[i] = (row[i] + prev[i]) & 0xFF
+        elif ftype == 3:
+            for i in range(row_bytes):
+                left = row[i - bpp] if i >= bpp else 0
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif ftype == 4:
+            for i in range(row_bytes):
+                a = row[i - bpp] if i >= bpp else 0
+                b = prev[i]
+                c = prev[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                row[i] = (row[i] + (a if pa <= pb and pa <= pc else (b if pb <= pc else c))) & 0xFF
+        out[y * row_bytes:(y + 1) * row_bytes] = row
+        prev = row
+    return out
+
+
+def _png_image(data):
+    """
+    Image XObject spec for a non-interlaced PNG. Opaque images keep their
+    compressed stream (PDF understands PNG predictors); images with alpha are
+    unfiltered once to split the alpha channel into a soft mask.
+    """
+    pos = 8
+    ihdr = None
+    palette = b''
+    trns = None
+    idat = []
+    while pos + 8 <= len(data):
+        length, ctype = struct.unpack('>I4s', data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if ctype == b'IHDR':
+            ihdr = struct.unpack('>IIBBBBB', chunk)
+        elif ctype == b'PLTE':
+            palette = chunk
+        elif ctype == b'tRNS':
+            trns = chunk
+        elif ctype == b'IDAT':
+            idat.append(chunk)
+        elif ctype == b'IEND':
+            break
+    if not ihdr:
+        return None
+    width, height, depth, color_type, _, _, interlace = ihdr
+    if interlace:
+        return None
+    compressed = b''.join(idat)
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(color_type)
+    if channels is None:
+        return None
+    if color_type == 3:
+        colorspace = f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]"
+    else:
+        colorspace = '/DeviceGray' if color_type in (0, 4) else '/DeviceRGB'
+    has_alpha = color_type in (4, 6) or (color_type == 3 and trns)
+    if not has_alpha:
+        parms = f" /DecodeParms << /Predictor 15 /Colors {channels} /BitsPerComponent {depth} /Columns {width} >>"
+        return {'width': width, 'height': height, 'colorspace': colorspace, 'bpc': depth,
+                'filter': '/FlateDecode', 'extra': parms, 'data': compressed, 'smask': None}
+
+    bits_per_pixel = channels * depth
+    row_bytes = (width * bits_per_pixel + 7) // 8
+    raw = _png_unfilter(zlib.decompress(compressed), height, row_bytes, max(1, bits_per_pixel // 8))
+    if color_type == 3:
+        # Palette transparency: alpha per index (8-bit indices only)
+        if depth != 8:
+            return _png_image_without_alpha(width, height, colorspace, depth, compressed, channels)
+        table = bytes(trns) + b'\xff' * (256 - len(trns))
+        alpha = raw.translate(table)
+        color, color_channels = raw, 1
+    else:
+        step = depth // 8
+        if step == 2:
+            raw = raw[0::2]  # keep the high byte of each 16-bit sample
+        color_channels = channels - 1
+        alpha = raw[color_channels::channels]
+        if color_channels == 1:
+            color = raw[0::channels]
+        else:
+            color = bytearray(len(alpha) * 3)
+            color[0::3] = raw[0::channels]
+            color[1::3] = raw[1::channels]
+            color[2::3] = raw[2::channels]
+        depth = 8
+    smask = {'width': width, 'height': height, 'colorspace': '/DeviceGray', 'bpc': 8,
+             'filter': '/FlateDecode', 'extra': '', 'data': zlib.compress(bytes(alpha)), 'smask': None}
+    return {'width': width, 'height': height, 'colorspace': colorspace, 'bpc': depth,
+            'filter': '/FlateDecode', 'extra': '', 'data': zlib.compress(bytes(color)), 'smask': smask}
+
+
+def _png_image_without_alpha(width, height, colorspace, depth, compressed, channels):
+    parms = f" /DecodeParms << /Predictor 15 /Colors {channels} /BitsPerComponent {depth} /Columns {width} >>"
+    return {'width': width, 'height': height, 'colorspace': colorspace, 'bpc': depth,
+            'filter': '/FlateDecode', 'extra': parms, 'data': compressed, 'smask': None}
+
+
+def load_image(src):
+    """Decode an image data: URL into an XObject spec, or None if it can't be embedded."""
+    m = _DATA_URL.match(src or '')
+    if not m:
+        return None
+    payload = src[m.end():]
+    try:
+        data = base64.b64decode(payload) if m.group(2) else payload.encode('latin-1')
+    except (ValueError, UnicodeEncodeError):
+        return None
+    try:
+        if data.startswith(b'\xff\xd8'):
+            return _jpeg_image(data)
+        if data.startswith(b'\x89PNG\r\n\x1a\n'):
+            return _png_image(data)
+    except (struct.error, zlib.error, IndexError):
+        return None
+    return None
+
+
+# ----------------------- PDF assembly -----------------------
+
+def _new_pdf():
+    # Objects 1 and 2 are the catalog and the page tree, written last
+    return {'objects': [None, None], 'fonts': {}, 'images': {}, 'gstates': {}, 'pages': []}
+
+
+def _add_object(pdf, body: bytes):
+    pdf['objects'].append(body)
+    return len(pdf['objects'])
+
+
+def _font_resource(pdf, font_key):
+    name = pdf['fonts'].get(font_key)
+    if name is None:
+        base = _FONTS[font_key][0]
+        ref = _add_object(pdf, f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>".encode())
+        name = pdf['fonts'][font_key] = (f"F{len(pdf['fonts']) + 1}", ref)
+    return name[0]
+
+
+def _gstate_resource(pdf, alpha):
+    key = round(alpha, 3)
+    entry = pdf['gstates'].get(key)
+    if entry is None:
+        ref = _add_object(pdf, f"<< /Type /ExtGState /ca {_num(key)} /CA {_num(key)} >>".encode())
+        entry = pdf['gstates'][key] = (f"GS{len(pdf['gstates']) + 1}", ref)
+    return entry[0]
+
+
+def _stream_object(pdf, spec):
+    smask = ''
+    if spec['smask']:
+        smask = f" /SMask {_stream_object(pdf, spec['smask'])} 0 R"
+    header = (f"<< /Type /XObject /Subtype /Image /Width {spec['width']} /Height {spec['height']} "
+              f"/ColorSpace {spec['colorspace']} /BitsPerComponent {spec['bpc']} /Filter {spec['filter']}"
+              f"{spec['extra']}{smask} /Length {len(spec['data'])} >>")
+    return _add_object(pdf, header.encode() + b"\nstream\n" + spec['data'] + b"\nendstream")
+
+
+def _image_resource(pdf, src):
+    """XObject name for an image src; each distinct image is embedded once per file."""
+    key = hashlib.sha1(src.encode('utf-8', 'replace')).hexdigest()
+    if key not in pdf['images']:
+        spec = load_image(src)
+        if spec is None:
+            pdf['images'][key] = None
+        else:
+            ref = _stream_object(pdf, spec)
+            pdf['images'][key] = (f"Im{len(pdf['images']) + 1}", ref, spec['width'], spec['height'])
+    return pdf['images'][key]
+
+
+def _finish_pdf(pdf):
+    objects = pdf['objects']
+    resources = ["/ProcSet [/PDF /Text /ImageB /ImageC /ImageI]"]
+    if pdf['fonts']:
+        resources.append("/Font << " + ' '.join(f"/{n} {r} 0 R" for n, r in pdf['fonts'].values()) + " >>")
+    images = [v for v in pdf['images'].values() if v]
+    if images:
+        resources.append("/XObject << " + ' '.join(f"/{v[0]} {v[1]} 0 R" for v in images) + " >>")
+    if pdf['gstates']:
+        resources.append("/ExtGState << " + ' '.join(f"/{n} {r} 0 R" for n, r in pdf['gstates'].values()) + " >>")
+    resources_ref = _add_object(pdf, ("<< " + ' '.join(resources) + " >>").encode())
+
+    media_box = f"[0 0 {_num(PAGE_WIDTH_PX * PX_TO_PT)} {_num(PAGE_HEIGHT_PX * PX_TO_PT)}]"
+    page_refs = []
+    for content in pdf['pages']:
+        data = zlib.compress(content)
+        content_ref = _add_object(pdf, f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode() + data + b"\nendstream")
+        page_refs.append(_add_object(pdf, f"<< /Type /Page /Parent 2 0 R /MediaBox {media_box} /Resources {resources_ref} 0 R /Contents {content_ref} 0 R >>".encode()))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{r} 0 R' for r in page_refs)}] /Count {len(page_refs)} >>".encode()
+
+    out = bytearray(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b''.join(f"{off:010d} 00000 n \n".encode() for off in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+# ----------------------- Drawing -----------------------
+
+def _set_fill(ops, pdf, color):
+    r, g, b, a = color
+    if a < 1:
+        ops.append(f"/{_gstate_resource(pdf, a)} gs")
+    ops.append(f"{_num(r)} {_num(g)} {_num(b)} rg")
+
+
+def _set_stroke(ops, pdf, color):
+    r, g, b, a = color
+    if a < 1:
+        ops.append(f"/{_gstate_resource(pdf, a)} gs")
+    ops.append(f"{_num(r)} {_num(g)} {_num(b)} RG")
+
+
+def _rect_path(ops, x, y, w, h, radius=0):
+    radius = max(0.0, min(radius, w / 2, h / 2))
+    if radius <= 0:
+        ops.append(f"{_num(x)} {_num(y)} {_num(w)} {_num(h)} re")
+        return
+    k = radius * 0.5523  # Bezier control offset for a quarter circle
+    x1, y1 = x + w, y + h
+    ops.append(f"{_num(x + radius)} {_num(y)} m {_num(x1 - radius)} {_num(y)} l")
+    ops.append(f"{_num(x1 - radius + k)} {_num(y)} {_num(x1)} {_num(y + radius - k)} {_num(x1)} {_num(y + radius)} c")
+    ops.append(f"{_num(x1)} {_num(y1 - radius)} l")
+    ops.append(f"{_num(x1)} {_num(y1 - radius + k)} {_num(x1 - radius + k)} {_num(y1)} {_num(x1 - radius)} {_num(y1)} c")
+    ops.append(f"{_num(x + radius)} {_num(y1)} l")
+    ops.append(f"{_num(x + radius - k)} {_num(y1)} {_num(x)} {_num(y1 - radius + k)} {_num(x)} {_num(y1 - radius)} c")
+    ops.append(f"{_num(x)} {_num(y + radius)} l")
+    ops.append(f"{_num(x)} {_num(y + radius - k)} {_num(x + radius - k)} {_num(y)} {_num(x + radius)} {_num(y)} c h")
+
+
+def _draw_box(ops, pdf, x, y, w, h, fill=None, stroke=None, stroke_width=0, radius=0):
+    """Background and border of a CSS border-box (the border is drawn inside the box)."""
+    if fill:
+        ops.append("q")
+        _set_fill(ops, pdf, fill)
+        _rect_path(ops, x, y, w, h, radius)
+        ops.append("f Q")
+    if stroke and stroke_width > 0:
+        half = stroke_width / 2
+        ops.append("q")
+        _set_stroke(ops, pdf, stroke)
+        ops.append(f"{_num(stroke_width)} w")
+        _rect_path(ops, x + half, y + half, w - stroke_width, h - stroke_width, max(0, radius - half))
+        ops.append("S Q")
+
+
+def layout_text(text, box, styles, align_v='top'):
+    """
+    Wrap `text` for box = (x, y, w, h): returns (lines, font key, size in px,
+    baseline of the first line, line height).
+    """
+    x, y, w, h = box
+    family = _font_family(styles.get('fontFamily'))
+    font_key = (family, bool(styles.get('bold')), bool(styles.get('italic')))
+    size = float(styles.get('fontSize') or 14) * 96 / 72
+    line_height = size * LINE_HEIGHT
+    lines = wrap_text(text, font_key, size, max(1.0, w))
+    total = line_height * len(lines)
+    top = y if align_v == 'top' else (y + (h - total) / 2 if align_v == 'middle' else y + h - total)
+    ascent, descent = _FONT_METRICS[family]
+    baseline = top + (line_height - (ascent + descent) * size) / 2 + ascent * size
+    return lines, font_key, size, baseline, line_height
+
+
+def _draw_text(ops, pdf, text, box, styles, align_h='left', align_v='top', clip=None):
+    """Lay out and draw text inside box = (x, y, w, h), clipped to `clip` (default: the box)."""
+    if text is None or text == '':
+        return
+    x, y, w, h = box
+    color = parse_color(styles.get('textColor') or DEFAULT_TEXT_COLOR)
+    if not color:
+        return
+    lines, font_key, size, baseline, line_height = layout_text(text, box, styles, align_v)
+    font = _font_resource(pdf, font_key)
+
+    ops.append("q")
+    ops.append("{} {} {} {} re W n".format(*(_num(v) for v in (clip or box))))
+    _set_fill(ops, pdf, color)
+    ops.append(f"BT /{font} {_num(size)} Tf")
+    underline = []
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+        line_w = text_width(line, font_key, size)
+        lx = x if align_h == 'left' else (x + (w - line_w) / 2 if align_h == 'center' else x + w - line_w)
+        ly = baseline + i * line_height
+        # The page is drawn y-down, so flip glyphs back upright
+        ops.append(f"1 0 0 -1 {_num(lx)} {_num(ly)} Tm")
+        ops.append(_pdf_string(line.encode('cp1252', 'replace')).decode('latin-1') + " Tj")
+        if styles.get('underline'):
+            underline.append((lx, ly + size * 0.1, line_w))
+    ops.append("ET")
+    for ux, uy, uw in underline:
+        ops.append(f"{_num(ux)} {_num(uy)} {_num(uw)} {_num(max(1.0, size / 15))} re f")
+    ops.append("Q")
+
+
+def _draw_image(ops, pdf, src, x, y, w, h):
+    image = _image_resource(pdf, src)
+    if not image or w <= 0 or h <= 0:
+        return
+    name, _, iw, ih = image
+    # object-fit: contain; object-position: center
+    scale = min(w / iw, h / ih)
+    dw, dh = iw * scale, ih * scale
+    dx, dy = x + (w - dw) / 2, y + (h - dh) / 2
+    ops.append(f"q {_num(dw)} 0 0 {_num(-dh)} {_num(dx)} {_num(dy + dh)} cm /{name} Do Q")
+
+
+def _draw_table(ops, pdf, el, x, y):
+    styles = el.get('styles') or {}
+    col_widths = [float(v or 0) for v in el.get('colWidths') or []]
+    row_heights = [float(v or 0) for v in el.get('rowHeights') or []]
+    col_x = [0.0]
+    for v in col_widths:
+        col_x.append(col_x[-1] + v)
+    row_y = [0.0]
+    for v in row_heights:
+        row_y.append(row_y[-1] + v)
+    cells = el.get('cells') or {}
+    grid = el.get('grid') or []
+    for r, row in enumerate(grid):
+        for c, cell_id in enumerate(row or []):
+            cell = cells.get(cell_id)
+            # Anchor positions only; merged positions map to the anchor id
+            if not cell or cell.get('hidden') or cell.get('row') != r or cell.get('col') != c:
+                continue
+            r1 = min(len(row_heights), r + int(cell.get('rowSpan') or 1))
+            c1 = min(len(col_widths), c + int(cell.get('colSpan') or 1))
+            if r >= len(row_heights) or c >= len(col_widths):
+                continue
+            cs = cell.get('styles') or {}
+            cx, cy = x + col_x[c], y + row_y[r]
+            cw, ch = col_x[c1] - col_x[c], row_y[r1] - row_y[r]
+            bg = parse_color(cs.get('bg'))
+            if bg:
+                _draw_box(ops, pdf, cx, cy, cw, ch, fill=bg)
+            bw = float(cs.get('borderWidth', cs.get('strokeWidth', 1)) or 0)
+            bc = parse_color(cs.get('borderColor') or cs.get('strokeColor') or '#000000')
+            sides = cs.get('borders') or {}
+            if bc and bw > 0 and any(sides.get(s) for s in ('top', 'right', 'bottom', 'left')):
+                ops.append("q")
+                _set_fill(ops, pdf, bc)
+                if sides.get('top'):
+                    ops.append(f"{_num(cx)} {_num(cy)} {_num(cw)} {_num(bw)} re f")
+                if sides.get('bottom'):
+                    ops.append(f"{_num(cx)} {_num(cy + ch - bw)} {_num(cw)} {_num(bw)} re f")
+                if sides.get('left'):
+                    ops.append(f"{_num(cx)} {_num(cy)} {_num(bw)} {_num(ch)} re f")
+                if sides.get('right'):
+                    ops.append(f"{_num(cx + cw - bw)} {_num(cy)} {_num(bw)} {_num(ch)} re f")
+                ops.append("Q")
+            content = cell.get('content')
+            if content:
+                pad = float(8 if cs.get('padding') is None else cs['padding'])
+                inset_l = pad + (bw if sides.get('left') else 0)
+                inset_r = pad + (bw if sides.get('right') else 0)
+                inset_t = pad + (bw if sides.get('top') else 0)
+                inset_b = pad + (bw if sides.get('bottom') else 0)
+                # Cells inherit typography from the table element unless they override it
+                text_styles = {
+                    'fontFamily': cs.get('fontFamily') or styles.get('fontFamily'),
+                    'fontSize': cs.get('fontSize') or 14,
+                    'textColor': cs.get('textColor') or styles.get('textColor'),
+                    'bold': cs['bold'] if 'bold' in cs else styles.get('bold'),
+                    'italic': cs['italic'] if 'italic' in cs else styles.get('italic'),
+                    'underline': cs['underline'] if 'underline' in cs else styles.get('underline'),
+                }
+                box = (cx + inset_l, cy + inset_t, cw - inset_l - inset_r, ch - inset_t - inset_b)
+                _draw_text(ops, pdf, content, box, text_styles, cs.get('alignH') or 'left', cs.get('alignV') or 'top',
+                           (cx, cy, cw, ch))
+
+
+def is_element_hidden(el):
+    """Same rule as isElementHidden in the editor: attrs.hidden or display:none in attrs.style."""
+    attrs = el.get('attrs') or {}
+    if attrs.get('hidden') in (True, 'true'):
+        return True
+    return bool(re.search(r"display\s*:\s*none", str(attrs.get('style') or ''), re.IGNORECASE))
+
+
+def _draw_element(ops, pdf, el):
+    styles = el.get('styles') or {}
+    kind = el.get('type')
+    x, y = float(el.get('x') or 0), float(el.get('y') or 0)
+    if kind == 'line':
+        color = parse_color(styles.get('strokeColor') or DEFAULT_TEXT_COLOR)
+        width = float(styles.get('strokeWidth') or 1)
+        x2 = float(el['x2'] if el.get('x2') is not None else x)
+        y2 = float(el['y2'] if el.get('y2') is not None else y)
+        length = math.hypot(x2 - x, y2 - y)
+        if not color or length == 0:
+            return
+        # CSS draws the line as the top border of a rotated box: offset by half the width
+        nx, ny = -(y2 - y) / length * width / 2, (x2 - x) / length * width / 2
+        ops.append("q")
+        _set_stroke(ops, pdf, color)
+        ops.append(f"{_num(width)} w {_num(x + nx)} {_num(y + ny)} m {_num(x2 + nx)} {_num(y2 + ny)} l S Q")
+        return
+
+    w, h = float(el.get('w') or 0), float(el.get('h') or 0)
+    if kind == 'table':
+        w = max(w, sum(float(v or 0) for v in el.get('colWidths') or []))
+        h = max(h, sum(float(v or 0) for v in el.get('rowHeights') or []))
+    rotate = float(styles.get('rotate') or 0)
+    ops.append("q")
+    if rotate:
+        cx, cy = x + w / 2, y + h / 2
+        cos, sin = math.cos(math.radians(rotate)), math.sin(math.radians(rotate))
+        ops.append(f"{_num(cos)} {_num(sin)} {_num(-sin)} {_num(cos)} {_num(cx - cos * cx + sin * cy)} {_num(cy - sin * cx - cos * cy)} cm")
+    stroke_width = float(styles.get('strokeWidth') or 0)
+    fill = parse_color(styles.get('fill')) if kind != 'image' else None
+    _draw_box(ops, pdf, x, y, w, h, fill=fill, stroke=parse_color(styles.get('strokeColor')),
+              stroke_width=stroke_width, radius=float(styles.get('radius') or 0))
+    if kind in ('text', 'field', 'rect'):
+        # .text/.field/.rect padding is 6px 8px inside the border; overflow clips at the padding box
+        box = (x + stroke_width + 8, y + stroke_width + 6, w - 2 * stroke_width - 16, h - 2 * stroke_width - 12)
+        clip = (x + stroke_width, y + stroke_width, w - 2 * stroke_width, h - 2 * stroke_width)
+        _draw_text(ops, pdf, el.get('content'), box, styles, styles.get('textAlignH') or 'left',
+                   styles.get('textAlignV') or 'top', clip)
+    elif kind == 'image' and el.get('src'):
+        ops.append(f"{_num(x)} {_num(y)} {_num(w)} {_num(h)} re W n")
+        _draw_image(ops, pdf, el['src'], x + stroke_width, y + stroke_width, w - 2 * stroke_width, h - 2 * stroke_width)
+    elif kind == 'table':
+        _draw_table(ops, pdf, el, x, y)
+    ops.append("Q")
+
+
+def _paint_order(elements):
+    """Elements with a numeric z paint above the rest (z-index 100+z); ties keep document order."""
+    return sorted(elements, key=lambda e: (1, e['z']) if isinstance(e.get('z'), (int, float)) else (0, 0))
+
+
+def page_elements(page, first_page=None):
+    """
+    The visible elements of `page` in paint order: elements repeated from
+    `first_page` (repeatOnAllPages) first, then each top-level element
+    followed by its children.
+    """
+    elements = [e for e in page.get('elements') or [] if isinstance(e, dict)]
+    if first_page is not None and first_page is not page:
+        shared = [e for e in first_page.get('elements') or [] if e.get('repeatOnAllPages') in (True, 'true')]
+        for el in _paint_order(shared):
+            if not is_element_hidden(el):
+                yield el
+    children = {}
+    for el in elements:
+        if el.get('parentId'):
+            children.setdefault(el['parentId'], []).append(el)
+
+    def walk(el):
+        # A hidden container hides its children too (they are nested in its DOM node)
+        if is_element_hidden(el):
+            return
+        yield el
+        for child in _paint_order(children.get(el.get('id'), [])):
+            yield from walk(child)
+
+    known = {e.get('id') for e in elements}
+    for el in _paint_order([e for e in elements if not e.get('parentId') or e['parentId'] not in known]):
+        yield from walk(el)
+
+
+def _page_ops(pdf, page, first_page):
+    ops = [f"{_num(PX_TO_PT)} 0 0 {_num(-PX_TO_PT)} 0 {_num(PAGE_HEIGHT_PX * PX_TO_PT)} cm"]
+    for el in page_elements(page, first_page):
+        _draw_element(ops, pdf, el)
+    return '\n'.join(ops).encode('latin-1')
+
+
+def render_document(document):
+    """Render a DocumentModel (or a {schema, app, document} payload) to PDF bytes."""
+    if isinstance(document, dict) and isinstance(document.get('document'), dict):
+        document = document_of(document)
+    pages = [p for p in (document or {}).get('pages') or [] if isinstance(p, dict)]
+    pdf = _new_pdf()
+    first = pages[0] if pages else None
+    for page in pages or [{}]:
+        pdf['pages'].append(_page_ops(pdf, page, first))
+    return _finish_pdf(pdf)
+
+
+def load_document(path):
+    """Read the payload from a saved HTML file or a .json file."""
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    data = read_payload(path)
+    if not data:
+        raise ValueError(f"{path} has no embedded document")
+    return parse_payload(data)
+
+
+def render_file(path, output_path):
+    """Render one saved file to `output_path` (written atomically). Returns output size in bytes."""
+    data = render_document(load_document(path))
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, output_path)
+    return len(data)
+
+
+def _render_job(job):
+    path, output_path = job
+    try:
+        return path, render_file(path, output_path), None
+    except Exception as e:
+        return path, 0, str(e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render saved certificates to vector PDF without a browser.")
+    parser.add_argument("inputs", nargs='+', help="Saved HTML files (or .json payloads)")
+    parser.add_argument("-o", "--out-dir", help="Output directory (default: next to each input)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+    jobs = []
+    for path in args.inputs:
+        name = os.path.splitext(os.path.basename(path))[0] + '.pdf'
+        jobs.append((path, os.path.join(args.out_dir or os.path.dirname(path) or '.', name)))
+
+    started = time.perf_counter()
+    workers = max(1, min(args.jobs or os.cpu_count() or 1, len(jobs)))
+    failed = 0
+    if workers == 1:
+        for path, size, error in map(_render_job, jobs):
+            failed += _report(path, size, error)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, size, error in pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // (workers * 8))):
+                failed += _report(path, size, error)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Rendered {len(jobs) - failed} of {len(jobs)} file(s) in {elapsed:.1f} s")
+    return 1 if failed else 0
+
+
+def _report(path, size, error):
+    if error:
+        print(f"❌ {path}: {error}")
+        return 1
+    print(f"📄 {path} → {size:,} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
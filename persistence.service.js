@@ -54,6 +54,8 @@ const Persistence = (function(){
 
 	async function saveDocument(opts){
 		const options = opts || {};
+		// Pages of a paged payload still decoding must not be saved as empty stubs
+		await whenDocumentLoaded();
 		log('saveDocument called', { silent: !!options.silent, isSecureContext: (typeof window!== 'undefined' && window.isSecureContext), supportsFSA: supportsFSA(), hasHandle: !!currentFileHandle, supportsOPFS: supportsOPFS() });
 		// If we already have permission to a file handle, write silently.
 		if (supportsFSA() && currentFileHandle){
@@ -79,6 +81,7 @@ const Persistence = (function(){
 	}
 
 	async function saveDocumentAs(){
+		await whenDocumentLoaded();
 		if (supportsFSA()){
 			try {
 				const defaultName = `certificate-maker-${new Date().toISOString().slice(0,19).replace(/[:.]/g,'-')}.html`;
@@ -104,7 +107,8 @@ const Persistence = (function(){
 		// Only load if the document is embedded in the current HTML file.
 		const saved = document.getElementById('__doc__');
 		if (saved && saved.textContent) {
-			try { deserializeDocument(saved.textContent.replaceAll('&lt;','<')); return { ok:true, via:'embedded' }; } catch {}
+			// Paged payloads resolve once the current page is in; the rest render when decoded
+			try { await loadDocumentPayload(saved.textContent.replaceAll('&lt;','<'), () => renderAll()); return { ok:true, via:'embedded' }; } catch {}
 		}
 		return { ok:false };
 	}
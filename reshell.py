@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Move saved certificates onto a new app build ("re-shell"), keeping their documents.
+
+Every saved file carries a frozen copy of the editor from the day it was
+saved; fixes to the app never reach it. This takes a freshly combined shell
+(a combined.html, or a page to build once with helper.combine_files) and, for
+every saved file, copies its payloads (<pre id="__doc__"> and, when present,
+the <script id="__docs__"> store) byte for byte into the new shell and
+atomically replaces the file. Payloads are never decoded except to check
+their schema.
+
+Per file:
+  - files whose shell already is the new one are left alone ("current")
+  - files without a document, with a payload the new shell has no slot for
+    (e.g. the __docs__ store on a viewer build), or whose payload schema is
+    newer than the SCHEMA_VERSION of the new shell (a downgrade would lose
+    data), are skipped
+  - a file that changes while it is being processed is left alone ("changed")
+
+Files are processed by a process pool. Progress goes to a journal (one JSON
+line per finished file, tagged with the new shell's hash); a run that is
+interrupted and started again with the same shell skips every file the
+journal already covers, as long as the file is as the run left it.
+--dry-run reports what would change and writes nothing.
+
+Usage:
+  python reshell.py archive/ --shell combined.html --dry-run
+  python reshell.py archive/ --build index.html --profile viewer -j 8
+  python reshell.py "archive/2024-*.html" --shell combined.html --snapshot
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from docformat import paged_header
+from docpayload import DOC_SLOT, INLINE_DOCS_SLOT, create_temp, discard_temp, find_payloads, shell_schema, split_payload
+from helper import BUILD_PROFILES, combine_files
+from snapshots import take_snapshot
+
+DEFAULT_JOURNAL = 'reshell.journal.jsonl'
+# Files per task sent to a worker, and tasks in flight per worker
+BATCH_SIZE = 16
+BATCHES_IN_FLIGHT_PER_WORKER = 4
+# Journal statuses that mean "nothing left to do for this file"
+_DONE = ('updated', 'current')
+
+class Shell:
+    """
+    A new shell cut at its payloads: `parts` alternates markup bytes and slot
+    names ([markup, slot, markup, ..., markup]); `defaults` holds the shell's
+    own (escaped) text for each slot, used when a saved file lacks that slot.
+    """
+
+    def __init__(self, path):
+        # split_payload adds an empty <pre id="__doc__"> after <body> to
+        # builds without a document, like buildSaveHtml does
+        parts = split_payload(path)
+        if parts is None:
+            raise ValueError(f"{path} has no <body> tag")
+        data = parts[0] + parts[2]
+        spans = find_payloads(data)
+        self.parts, self.defaults = [], {}
+        pos = 0
+        for span, slot in spans:
+            self.parts += [data[pos:span.start], slot.name]
+            self.defaults[slot.name] = data[span.start:span.end]
+            pos = span.end
+        self.parts.append(data[pos:])
+        digest = hashlib.sha256()
+        for part in self.parts[::2]:
+            digest.update(part)
+        # Same as docpayload.shell_hash of any file re-shelled onto it
+        self.hash = digest.hexdigest()
+        self.schema_version = shell_schema(data, spans)
+
+
+def load_shell(shell_file=None, build_html=None, profile='editor'):
+    """The new shell, read from a combined file or built once from `build_html`."""
+    if build_html:
+        fd, tmp_path = tempfile.mkstemp(suffix='.html')
+        os.close(fd)
+        try:
+            if not combine_files(build_html, tmp_path, base_dir=os.path.dirname(build_html) or '.', use_cache=False, profile=profile):
+                raise ValueError(f"Could not build a shell from {build_html}")
+            return Shell(tmp_path)
+        finally:
+            os.remove(tmp_path)
+    return Shell(shell_file)
+
+
+def payload_schema(document_data):
+    """Schema version of a payload's text (1 for bare documents and old payloads)."""
+    header = paged_header(document_data)
+    if header is not None:
+        return int(header.get('schema') or 1)
+    payload = json.loads(document_data) if document_data.strip() else {}
+    if isinstance(payload, dict) and isinstance(payload.get('document'), dict):
+        return int(payload.get('schema') or 1)
+    return 1
+
+
+def _stat_key(st):
+    return [st.st_mtime_ns, st.st_size]
+
+
+def reshell_file(path, shell, dry_run=False, fsync=False, snapshot=False):
+    """
+    Re-shell one file. Returns (status, detail, stat after) with status one of
+    updated / current / skipped / changed / failed (or "would update" with dry_run).
+    """
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            before = _stat_key(st)
+            if before[1] == 0:
+                return 'skipped', "empty file", before
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                spans = find_payloads(buf)
+                payloads = {slot.name: buf[span.start:span.end] for span, slot in spans}
+                if DOC_SLOT.name not in payloads:
+                    return 'skipped', "no embedded document", before
+                digest = hashlib.sha256()
+                pos = 0
+                for span, _ in spans:
+                    digest.update(buf[pos:span.start])
+                    pos = span.end
+                digest.update(buf[pos:])
+                if digest.hexdigest() == shell.hash:
+                    return 'current', '', before
+                dropped = sorted(set(payloads) - set(shell.parts[1::2]))
+                if dropped:
+                    return 'skipped', f"file has payloads the new shell cannot hold: {', '.join(dropped)}", before
+                try:
+                    schema = payload_schema(DOC_SLOT.unescape(payloads[DOC_SLOT.name].decode('utf-8')))
+                    if INLINE_DOCS_SLOT.name in payloads:
+                        json.loads(INLINE_DOCS_SLOT.unescape(payloads[INLINE_DOCS_SLOT.name].decode('utf-8')) or 'null')
+                except (UnicodeDecodeError, ValueError) as e:
+                    return 'skipped', f"unreadable payload ({e})", before
+                if schema > shell.schema_version:
+                    return 'skipped', f"payload schema {schema} is newer than the shell's {shell.schema_version}", before
+                if dry_run:
+                    return 'would update', f"schema {schema}", before
+
+                out, tmp_path = create_temp(path)
+                try:
+                    with out:
+                        for i, part in enumerate(shell.parts):
+                            out.write(part if i % 2 == 0 else payloads.get(part, shell.defaults[part]))
+                        if fsync:
+                            out.flush()
+                            os.fsync(out.fileno())
+                except BaseException:
+                    discard_temp(tmp_path)
+                    raise
+        # The map is closed before the swap; Windows refuses to replace a mapped file
+        try:
+            if _stat_key(os.stat(path)) != before:
+                return 'changed', "modified while re-shelling; left as is", None
+            if snapshot:
+                take_snapshot(path)
+            os.replace(tmp_path, path)
+        finally:
+            # Gone already once replaced; otherwise nothing is left behind
+            discard_temp(tmp_path)
+        return 'updated', f"schema {schema}", _stat_key(os.stat(path))
+    except (OSError, ValueError) as e:
+        # ValueError: an unreadable snapshot index
+        return 'failed', str(e), None
+
+
+# Per-process state, set once by _init_worker so the shell is not re-sent with every batch
+_WORKER = {}
+
+
+def _init_worker(shell, options):
+    _WORKER.update(shell=shell, options=options)
+
+
+def _reshell_batch(paths):
+    return [(path,) + reshell_file(path, _WORKER['shell'], **_WORKER['options']) for path in paths]
+
+
+def iter_files(inputs):
+    """Saved files named by `inputs`: files, globs, or directories (searched recursively, hidden folders skipped)."""
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for name in sorted(files):
+                    if name.lower().endswith(('.html', '.htm')):
+                        yield os.path.abspath(os.path.join(root, name))
+            continue
+        matches = sorted(glob.glob(item)) if glob.has_magic(item) else [item]
+        if not matches:
+            print(f"⚠️  Nothing matches {item}")
+        for path in matches:
+            yield os.path.abspath(path)
+
+
+class Journal:
+    """
+    Append-only progress log: a header line with the shell hash, then one
+    {"path", "status", "stat"} line per finished file. Lines are flushed as
+    they are written, so an interrupted run loses at most the files in flight.
+    """
+
+    def __init__(self, path, shell_hash, restart=False):
+        self.path = path
+        self.done = {}
+        if not restart and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            header = json.loads(lines[0]) if lines else {}
+            if header.get('shell') == shell_hash:
+                for line in lines[1:]:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn last line of an interrupted run
+                    if entry.get('status') in _DONE:
+                        self.done[entry['path']] = entry.get('stat')
+        self._f = open(path, 'a' if self.done else 'w', encoding='utf-8')
+        if not self.done:
+            self._f.write(json.dumps({'shell': shell_hash, 'started': time.time()}) + '\n')
+            self._f.flush()
+
+    def finished(self, path):
+        """True if an earlier run finished `path` and it has not changed since."""
+        stat = self.done.get(path)
+        if stat is None:
+            return False
+        try:
+            return _stat_key(os.stat(path)) == stat
+        except OSError:
+            return False
+
+    def record(self, path, status, stat):
+        self._f.write(json.dumps({'path': path, 'status': status, 'stat': stat}) + '\n')
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def reshell(inputs, shell, jobs=None, dry_run=False, journal_file=DEFAULT_JOURNAL, restart=False, fsync=False,
+            snapshot=False, verbose=False):
+    """Re-shell every file named by `inputs`. Returns counts per status."""
+    journal = None if dry_run else Journal(journal_file, shell.hash, restart)
+    counts = {}
+    resumed = 0
+
+    def pending_batches():
+        nonlocal resumed
+        batch = []
+        for path in iter_files(inputs):
+            if journal is not None and journal.finished(path):
+                resumed += 1
+                continue
+            batch.append(path)
+            if len(batch) >= BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def collect(results):
+        for path, status, detail, stat in results:
+            counts[status] = counts.get(status, 0) + 1
+            if journal is not None:
+                journal.record(path, status, stat)
+            if status in ('failed', 'changed') or (verbose and status != 'current'):
+                print(f"   {status}: {path}" + (f" ({detail})" if detail else ''))
+
+    options = {'dry_run': dry_run, 'fsync': fsync, 'snapshot': snapshot}
+    jobs = max(1, jobs or os.cpu_count() or 1)
+    try:
+        if jobs == 1:
+            _init_worker(shell, options)
+            for batch in pending_batches():
+                collect(_reshell_batch(batch))
+        else:
+            limit = jobs * BATCHES_IN_FLIGHT_PER_WORKER
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(shell, options)) as pool:
+                pending = set()
+                for batch in pending_batches():
+                    if len(pending) >= limit:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            collect(fut.result())
+                    pending.add(pool.submit(_reshell_batch, batch))
+                for fut in pending:
+                    collect(fut.result())
+    finally:
+        if journal is not None:
+            journal.close()
+    if resumed:
+        counts['resumed'] = resumed
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move saved certificates onto a new app build, keeping their documents.")
+    parser.add_argument("inputs", nargs='+', help="Saved HTML files, globs or directories")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--shell", metavar="HTML", help="A freshly combined file (e.g. combined.html) to use as the new shell")
+    source.add_argument("--build", metavar="HTML", help="Build the new shell once from this page (e.g. index.html)")
+    parser.add_argument("--profile", choices=BUILD_PROFILES, default='editor', help="Build profile for --build")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing anything")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL, help=f"Progress file for resuming (default: {DEFAULT_JOURNAL})")
+    parser.add_argument("--restart", action="store_true", help="Ignore the journal of an earlier run")
+    parser.add_argument("--fsync", action="store_true", help="Flush every file to disk before replacing it")
+    parser.add_argument("--snapshot", action="store_true", help="Snapshot each file (snapshots.py) before replacing it")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List every file that is not already current")
+    args = parser.parse_args(argv)
+
+    try:
+        shell = load_shell(args.shell, args.build, args.profile)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(f"🐚 New shell {shell.hash[:12]} (payload schema {shell.schema_version})")
+
+    started = time.perf_counter()
+    try:
+        counts = reshell(args.inputs, shell, args.jobs, args.dry_run, args.journal, args.restart, args.fsync,
+                         args.snapshot, args.verbose)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+    summary = ', '.join(f"{n:,} {status}" for status, n in counts.items()) or 'no files'
+    print(f"{'🔍 Dry run' if args.dry_run else '✅ Done'} in {elapsed:.1f} s: {summary}")
+    return 1 if counts.get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
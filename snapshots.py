@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Snapshot history for saved documents: every save keeps the previous versions.
+
+Plain copies of a ~0.5 MB file per save would mostly repeat the same inlined
+app. Instead each document gets a content-addressed store next to it
+(`.certificate.html.snapshots/`): a file is cut into chunks, every chunk is
+stored once under its SHA-256 (zlib-compressed), and a snapshot is just the
+list of its chunk hashes. The shell around the payloads (see docpayload.py)
+is one chunk per segment, so it is stored once for all snapshots; payloads are
+cut at content-defined points between JSON objects (or paged segments), so an edit only adds the
+few chunks around it. A typical save costs about the compressed size of what
+changed.
+
+index.json in the store lists the snapshots and the stored size of every
+object. After each snapshot a RetentionPolicy evicts the oldest ones (by
+count, age and total stored size; the newest is always kept) and objects no
+snapshot uses any more are deleted.
+
+The native host takes a snapshot before (if the file changed outside the host)
+and after every save, and answers list_snapshots / restore_snapshot.
+
+Usage:
+  python snapshots.py certificate.html                     # list snapshots
+  python snapshots.py certificate.html --restore 12        # put snapshot 12 back in place
+  python snapshots.py certificate.html --restore 12 -o old.html
+  python snapshots.py certificate.html --prune --keep 20   # apply a stricter retention now
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from typing import NamedTuple
+
+from docpayload import create_temp, discard_temp, find_payloads
+
+INDEX_VERSION = 1
+# Payload chunks: cut after "}," once a chunk has MIN_CHUNK bytes and the bytes
+# before the cut hash to 0 mod CUT_MASK + 1, or at the first line end past
+# MIN_CHUNK (segments of a paged payload, see docformat.py); never let one
+# grow past MAX_CHUNK
+MIN_CHUNK = 8 * 1024
+MAX_CHUNK = 64 * 1024
+CUT_MASK = 15
+CUT_WINDOW = 48
+# Object names: 128 bits of the chunk's SHA-256 keeps index.json small
+HASH_CHARS = 32
+
+_CUT = re.compile(rb'\},|\n')
+
+
+class RetentionPolicy(NamedTuple):
+    """How much history to keep per document; the newest snapshot is never evicted."""
+    keep: int = 100
+    max_age_days: float = 90
+    max_bytes: int = 50 * 1024 * 1024
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the "snapshots" section of save_host.config.json ({"keep", "maxAgeDays", "maxMB"})."""
+        config = config or {}
+        default = cls()
+        max_mb = config.get('maxMB')
+        return cls(
+            keep=int(config.get('keep', default.keep)),
+            max_age_days=float(config.get('maxAgeDays', default.max_age_days)),
+            max_bytes=int(max_mb * 1024 * 1024) if max_mb is not None else default.max_bytes,
+        )
+
+
+def store_dir(path):
+    """The snapshot store of a document: a hidden folder next to it."""
+    d, name = os.path.split(os.path.abspath(path))
+    return os.path.join(d, f".{name}.snapshots")
+
+
+def _object_path(store, digest):
+    return os.path.join(store, 'objects', digest[:2], digest[2:])
+
+
+def _chunk_hash(chunk):
+    return hashlib.sha256(chunk).hexdigest()[:HASH_CHARS]
+
+
+def _split_payload(data, start, end):
+    """Content-defined cut points inside data[start:end]; yields (start, end) pairs."""
+    for m in _CUT.finditer(data, start, end):
+        pos = m.end()
+        while pos - start > MAX_CHUNK:
+            yield start, start + MAX_CHUNK
+            start += MAX_CHUNK
+        if pos - start >= MIN_CHUNK and (data[pos - 1] == 0x0a or zlib.crc32(data[pos - CUT_WINDOW:pos]) & CUT_MASK == 0):
+            yield start, pos
+            start = pos
+    while end - start > MAX_CHUNK:
+        yield start, start + MAX_CHUNK
+        start += MAX_CHUNK
+    if end > start:
+        yield start, end
+
+
+def chunk_file(data):
+    """Cut a saved file into chunks: each shell segment whole, payloads at content-defined points."""
+    chunks, pos = [], 0
+    for span, _ in find_payloads(data):
+        if span.start > pos:
+            chunks.append(data[pos:span.start])
+        chunks.extend(data[a:b] for a, b in _split_payload(data, span.start, span.end))
+        pos = span.end
+    if len(data) > pos:
+        chunks.append(data[pos:])
+    return chunks
+
+
+def load_index(store):
+    try:
+        with open(os.path.join(store, 'index.json'), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        index = None
+    if not index or index.get('version') != INDEX_VERSION:
+        return {'version': INDEX_VERSION, 'next': 1, 'objects': {}, 'snapshots': []}
+    return index
+
+
+def _write_atomic(path, data):
+    f, tmp_path = create_temp(path)
+    try:
+        with f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard_temp(tmp_path)
+        raise
+
+
+def _save_index(store, index):
+    _write_atomic(os.path.join(store, 'index.json'), json.dumps(index, separators=(',', ':')).encode('utf-8'))
+
+
+def _file_stat(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def take_snapshot(path, policy=RetentionPolicy()):
+    """
+    Add the current contents of `path` to its store, unless the newest snapshot
+    already is this file (same mtime and size). Returns the new snapshot
+    record, or None if nothing was added.
+    """
+    store = store_dir(path)
+    index = load_index(store)
+    stat = _file_stat(path)
+    if index['snapshots'] and index['snapshots'][-1]['stat'] == stat:
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if index['snapshots'] and index['snapshots'][-1]['sha256'] == digest:
+        # Rewritten with the same bytes: just remember the new stat
+        index['snapshots'][-1]['stat'] = stat
+        _save_index(store, index)
+        return None
+
+    os.makedirs(store, exist_ok=True)
+    hashes = []
+    for chunk in chunk_file(data):
+        h = _chunk_hash(chunk)
+        hashes.append(h)
+        if h in index['objects']:
+            continue
+        packed = zlib.compress(chunk, 6)
+        obj = _object_path(store, h)
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        _write_atomic(obj, packed)
+        index['objects'][h] = len(packed)
+
+    snapshot = {'id': index['next'], 'time': time.time(), 'size': len(data), 'sha256': digest,
+                'stat': stat, 'chunks': hashes}
+    index['next'] += 1
+    index['snapshots'].append(snapshot)
+    evict(index, policy)
+    # New objects are on disk before the index that refers to them; evicted
+    # ones are deleted after the index that dropped them
+    unused = _forget_unused(index)
+    _save_index(store, index)
+    _delete_objects(store, unused)
+    return snapshot
+
+
+def stored_bytes(index, snapshots=None):
+    """Compressed bytes used by the objects `snapshots` (default: all) refer to."""
+    used = {h for s in (index['snapshots'] if snapshots is None else snapshots) for h in s['chunks']}
+    return sum(index['objects'].get(h, 0) for h in used)
+
+
+def evict(index, policy, now=None):
+    """Drop the oldest snapshots until `policy` holds; returns the evicted ids."""
+    now = time.time() if now is None else now
+    oldest_allowed = now - policy.max_age_days * 86400
+    snapshots = index['snapshots']
+    evicted = []
+    while len(snapshots) > 1 and (len(snapshots) > policy.keep
+                                  or snapshots[0]['time'] < oldest_allowed
+                                  or stored_bytes(index) > policy.max_bytes):
+        evicted.append(snapshots.pop(0)['id'])
+    return evicted
+
+
+def _forget_unused(index):
+    """Remove objects no snapshot refers to from the index; returns their hashes."""
+    used = {h for s in index['snapshots'] for h in s['chunks']}
+    unused = [h for h in index['objects'] if h not in used]
+    for h in unused:
+        del index['objects'][h]
+    return unused
+
+
+def _delete_objects(store, hashes):
+    for h in hashes:
+        try:
+            os.remove(_object_path(store, h))
+        except OSError:
+            pass
+
+
+def list_snapshots(path):
+    """Snapshots of `path`, oldest first: [{"id", "time", "size"}]."""
+    index = load_index(store_dir(path))
+    return [{'id': s['id'], 'time': s['time'], 'size': s['size']} for s in index['snapshots']]
+
+
+def read_snapshot(path, snapshot_id):
+    """Reassemble a snapshot's bytes. Raises KeyError for an unknown id, ValueError if the store is damaged."""
+    store = store_dir(path)
+    for snapshot in load_index(store)['snapshots']:
+        if snapshot['id'] == snapshot_id:
+            break
+    else:
+        raise KeyError(f"{path} has no snapshot {snapshot_id}")
+    parts = []
+    for h in snapshot['chunks']:
+        try:
+            with open(_object_path(store, h), 'rb') as f:
+                parts.append(zlib.decompress(f.read()))
+        except (OSError, zlib.error) as e:
+            raise ValueError(f"Snapshot {snapshot_id} is damaged: {e}")
+    data = b''.join(parts)
+    if hashlib.sha256(data).hexdigest() != snapshot['sha256']:
+        raise ValueError(f"Snapshot {snapshot_id} is damaged: checksum mismatch")
+    return data
+
+
+def prune(path, policy):
+    """Apply `policy` to an existing store now; returns the evicted ids."""
+    store = store_dir(path)
+    index = load_index(store)
+    evicted = evict(index, policy)
+    if evicted:
+        unused = _forget_unused(index)
+        _save_index(store, index)
+        _delete_objects(store, unused)
+    return evicted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List, restore or prune the snapshot history of a saved document.")
+    parser.add_argument("html_file", help="Saved HTML file")
+    parser.add_argument("--restore", type=int, metavar="ID", help="Write snapshot ID back (in place, after snapshotting the current file)")
+    parser.add_argument("-o", "--output", help="With --restore, write to this file instead")
+    parser.add_argument("--prune", action="store_true", help="Evict snapshots now with --keep / --max-age-days / --max-mb")
+    default = RetentionPolicy()
+    parser.add_argument("--keep", type=int, default=default.keep, help=f"Snapshots to keep (default: {default.keep})")
+    parser.add_argument("--max-age-days", type=float, default=default.max_age_days, help=f"default: {default.max_age_days:g}")
+    parser.add_argument("--max-mb", type=float, default=default.max_bytes / 2**20, help=f"Store size limit (default: {default.max_bytes / 2**20:g})")
+    args = parser.parse_args(argv)
+    policy = RetentionPolicy(args.keep, args.max_age_days, int(args.max_mb * 2**20))
+
+    try:
+        if args.restore is not None:
+            data = read_snapshot(args.html_file, args.restore)
+            target = args.output or args.html_file
+            if not args.output and os.path.exists(target):
+                take_snapshot(target, policy)
+            _write_atomic(target, data)
+            print(f"✅ Restored snapshot {args.restore} to {target} ({len(data):,} bytes)")
+            return 0
+        if args.prune:
+            evicted = prune(args.html_file, policy)
+            print(f"🧹 Evicted {len(evicted)} snapshot(s)")
+    except (OSError, KeyError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    index = load_index(store_dir(args.html_file))
+    if not index['snapshots']:
+        print(f"📭 No snapshots of {args.html_file}")
+        return 0
+    for s in reversed(index['snapshots']):
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(s['time']))
+        print(f"  #{s['id']:<5} {stamp}  {s['size']:>10,} bytes")
+    print(f"📦 {len(index['snapshots'])} snapshot(s), {stored_bytes(index):,} bytes stored")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""
+SVG renderer for the document model, and thumbnails plus a static gallery
+for whole directories of saved certificates.
+
+Checking what thousands of issued files look like by opening each in the
+editor is hopeless; this draws every page as a small SVG straight from the
+<pre id="__doc__"> payload. Layout is pdf_render.py's (A4 pages in CSS
+pixels, same text wrapping, paint order, hidden elements and
+repeatOnAllPages), emitted as SVG: text/field/rect boxes with their text,
+lines, images (object-fit: contain) and tables laid out from
+colWidths/rowHeights with merged cells. Text keeps its CSS font family, so
+the browser showing the thumbnail draws it with the real font.
+
+The thumbnail CLI walks a directory on a process pool and writes one SVG per
+page under the output directory, mirroring the tree (issued/2024/ada.html ->
+thumbs/2024/ada.1.svg). Every distinct image is written once to
+thumbs/assets/<asset id> and referenced from the SVGs, so a logo shared by
+10,000 certificates is stored once and the thumbnails stay a few KB each.
+thumbs/thumbs.json remembers each file's stat and payload hash: files whose
+stat is unchanged are not opened, files whose payload hash is unchanged
+(e.g. the shell was re-bundled) are not re-rendered, and files that
+disappeared lose their thumbnails. thumbs/index.html is a static gallery of
+the first pages with a name filter and links to the other pages and the
+original files.
+
+Usage:
+  python svg_render.py issued/ -o thumbs/           # then open thumbs/index.html
+  python svg_render.py issued/ -o thumbs/ --pages 1 --width 320 -j 8
+  python svg_render.py issued/ -o thumbs/ --force   # re-render everything
+"""
+
+import argparse
+import base64
+import hashlib
+import html
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from urllib.parse import quote, unquote_to_bytes
+
+from doc_index import _read_payload_bytes, walk_html
+from docformat import ASSET_PREFIX, asset_id, hoist_assets, parse_payload
+from docpayload import DOC_SLOT
+from pdf_render import (DEFAULT_TEXT_COLOR, PAGE_HEIGHT_PX, PAGE_WIDTH_PX, _num, layout_text, page_elements,
+                        parse_color, text_width)
+
+# Bump when the drawing changes; thumbnails from an older version are re-rendered
+RENDER_VERSION = 1
+MANIFEST = 'thumbs.json'
+GALLERY = 'index.html'
+ASSETS_DIR = 'assets'
+DEFAULT_WIDTH = 240
+NO_PAYLOAD = "no embedded document"
+# Files per task sent to a worker
+BATCH_SIZE = 16
+BATCHES_IN_FLIGHT_PER_WORKER = 4
+_ASSET_EXTENSIONS = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/jpg': '.jpg', 'image/gif': '.gif',
+                     'image/webp': '.webp', 'image/svg+xml': '.svg', 'image/bmp': '.bmp'}
+
+
+def _esc(text):
+    return html.escape(str(text), quote=True)
+
+
+def _paint(name, value):
+    """fill="..." / stroke="..." (plus -opacity) for a CSS color; 'none' when transparent or unknown."""
+    rgba = parse_color(value)
+    if not rgba:
+        return f'{name}="none"'
+    r, g, b, a = rgba
+    out = f'{name}="#{round(r * 255):02x}{round(g * 255):02x}{round(b * 255):02x}"'
+    return out if a >= 1 else f'{out} {name}-opacity="{_num(a)}"'
+
+
+class _Canvas:
+    """SVG markup of one page; clip paths get page-unique ids."""
+
+    def __init__(self, image_href):
+        self.out = []
+        self.clips = 0
+        self.image_href = image_href
+
+    def clip(self, x, y, w, h):
+        self.clips += 1
+        self.out.append(f'<clipPath id="c{self.clips}"><rect x="{_num(x)}" y="{_num(y)}" width="{_num(max(0, w))}" '
+                        f'height="{_num(max(0, h))}"/></clipPath>')
+        return f'clip-path="url(#c{self.clips})"'
+
+    def box(self, x, y, w, h, fill=None, stroke=None, stroke_width=0, radius=0):
+        """Background and border of a CSS border-box (the border drawn inside the box, as in pdf_render)."""
+        has_fill = parse_color(fill) is not None
+        has_stroke = parse_color(stroke) is not None and stroke_width > 0
+        if not has_fill and not has_stroke or w <= 0 or h <= 0:
+            return
+        half = stroke_width / 2 if has_stroke else 0
+        rx = max(0, radius - half)
+        self.out.append(f'<rect x="{_num(x + half)}" y="{_num(y + half)}" width="{_num(max(0, w - 2 * half))}" '
+                        f'height="{_num(max(0, h - 2 * half))}"' + (f' rx="{_num(rx)}"' if rx else '') +
+                        f' {_paint("fill", fill)}' +
+                        (f' {_paint("stroke", stroke)} stroke-width="{_num(stroke_width)}"' if has_stroke else '') + '/>')
+
+    def text(self, text, box, styles, align_h='left', align_v='top', clip=None):
+        if text is None or text == '' or not parse_color(styles.get('textColor') or DEFAULT_TEXT_COLOR):
+            return
+        x, y, w, h = box
+        lines, font_key, size, baseline, line_height = layout_text(text, box, styles, align_v)
+        anchor, tx = {'center': ('middle', x + w / 2), 'right': ('end', x + w)}.get(align_h, ('start', x))
+        attrs = [f'font-family="{_esc(styles.get("fontFamily") or "system-ui")}"', f'font-size="{_num(size)}"',
+                 _paint('fill', styles.get('textColor') or DEFAULT_TEXT_COLOR)]
+        if styles.get('bold'):
+            attrs.append('font-weight="bold"')
+        if styles.get('italic'):
+            attrs.append('font-style="italic"')
+        if styles.get('underline'):
+            attrs.append('text-decoration="underline"')
+        if anchor != 'start':
+            attrs.append(f'text-anchor="{anchor}"')
+        spans = ''.join(f'<tspan x="{_num(tx)}" y="{_num(baseline + i * line_height)}">{_esc(line)}</tspan>'
+                        for i, line in enumerate(lines) if line)
+        if not spans:
+            return
+        # Most text fits its box; only overflowing text needs a clip path
+        cx, cy, cw, ch = clip or box
+        total = line_height * len(lines)
+        top = y if align_v == 'top' else (y + (h - total) / 2 if align_v == 'middle' else y + h - total)
+        if top < cy or top + total > cy + ch or x < cx or x + w > cx + cw or \
+                any(text_width(line, font_key, size) > w for line in lines):
+            attrs.insert(0, self.clip(cx, cy, cw, ch))
+        self.out.append(f'<text {" ".join(attrs)} xml:space="preserve">{spans}</text>')
+
+    def image(self, src, x, y, w, h):
+        href = self.image_href(src)
+        if href and w > 0 and h > 0:
+            # object-fit: contain; object-position: center
+            self.out.append(f'<image x="{_num(x)}" y="{_num(y)}" width="{_num(w)}" height="{_num(h)}" '
+                            f'preserveAspectRatio="xMidYMid meet" xlink:href="{_esc(href)}"/>')
+
+    def table(self, el, x, y):
+        styles = el.get('styles') or {}
+        col_widths = [float(v or 0) for v in el.get('colWidths') or []]
+        row_heights = [float(v or 0) for v in el.get('rowHeights') or []]
+        col_x = [0.0]
+        for v in col_widths:
+            col_x.append(col_x[-1] + v)
+        row_y = [0.0]
+        for v in row_heights:
+            row_y.append(row_y[-1] + v)
+        cells = el.get('cells') or {}
+        for r, row in enumerate(el.get('grid') or []):
+            for c, cell_id in enumerate(row or []):
+                cell = cells.get(cell_id)
+                # Anchor positions only; merged positions map to the anchor id
+                if not cell or cell.get('hidden') or cell.get('row') != r or cell.get('col') != c:
+                    continue
+                if r >= len(row_heights) or c >= len(col_widths):
+                    continue
+                r1 = min(len(row_heights), r + int(cell.get('rowSpan') or 1))
+                c1 = min(len(col_widths), c + int(cell.get('colSpan') or 1))
+                cs = cell.get('styles') or {}
+                cx, cy = x + col_x[c], y + row_y[r]
+                cw, ch = col_x[c1] - col_x[c], row_y[r1] - row_y[r]
+                self.box(cx, cy, cw, ch, fill=cs.get('bg'))
+                bw = float(cs.get('borderWidth', cs.get('strokeWidth', 1)) or 0)
+                bc = cs.get('borderColor') or cs.get('strokeColor') or '#000000'
+                sides = cs.get('borders') or {}
+                if parse_color(bc) and bw > 0:
+                    edges = (('top', cx, cy, cw, bw), ('bottom', cx, cy + ch - bw, cw, bw),
+                             ('left', cx, cy, bw, ch), ('right', cx + cw - bw, cy, bw, ch))
+                    path = ''.join(f'M{_num(ex)} {_num(ey)}h{_num(ew)}v{_num(eh)}h{_num(-ew)}z'
+                                   for side, ex, ey, ew, eh in edges if sides.get(side))
+                    if path:
+                        self.out.append(f'<path d="{path}" {_paint("fill", bc)}/>')
+                content = cell.get('content')
+                if content:
+                    pad = float(8 if cs.get('padding') is None else cs['padding'])
+                    inset_l = pad + (bw if sides.get('left') else 0)
+                    inset_r = pad + (bw if sides.get('right') else 0)
+                    inset_t = pad + (bw if sides.get('top') else 0)
+                    inset_b = pad + (bw if sides.get('bottom') else 0)
+                    # Cells inherit typography from the table element unless they override it
+                    text_styles = {
+                        'fontFamily': cs.get('fontFamily') or styles.get('fontFamily'),
+                        'fontSize': cs.get('fontSize') or 14,
+                        'textColor': cs.get('textColor') or styles.get('textColor'),
+                        'bold': cs['bold'] if 'bold' in cs else styles.get('bold'),
+                        'italic': cs['italic'] if 'italic' in cs else styles.get('italic'),
+                        'underline': cs['underline'] if 'underline' in cs else styles.get('underline'),
+                    }
+                    box = (cx + inset_l, cy + inset_t, cw - inset_l - inset_r, ch - inset_t - inset_b)
+                    self.text(content, box, text_styles, cs.get('alignH') or 'left', cs.get('alignV') or 'top',
+                              (cx, cy, cw, ch))
+
+    def element(self, el):
+        styles = el.get('styles') or {}
+        kind = el.get('type')
+        x, y = float(el.get('x') or 0), float(el.get('y') or 0)
+        if kind == 'line':
+            width = float(styles.get('strokeWidth') or 1)
+            x2 = float(el['x2'] if el.get('x2') is not None else x)
+            y2 = float(el['y2'] if el.get('y2') is not None else y)
+            length = math.hypot(x2 - x, y2 - y)
+            color = styles.get('strokeColor') or DEFAULT_TEXT_COLOR
+            if not parse_color(color) or length == 0:
+                return
+            # CSS draws the line as the top border of a rotated box: offset by half the width
+            nx, ny = -(y2 - y) / length * width / 2, (x2 - x) / length * width / 2
+            self.out.append(f'<line x1="{_num(x + nx)}" y1="{_num(y + ny)}" x2="{_num(x2 + nx)}" y2="{_num(y2 + ny)}" '
+                            f'{_paint("stroke", color)} stroke-width="{_num(width)}"/>')
+            return
+
+        w, h = float(el.get('w') or 0), float(el.get('h') or 0)
+        if kind == 'table':
+            w = max(w, sum(float(v or 0) for v in el.get('colWidths') or []))
+            h = max(h, sum(float(v or 0) for v in el.get('rowHeights') or []))
+        rotate = float(styles.get('rotate') or 0)
+        if rotate:
+            self.out.append(f'<g transform="rotate({_num(rotate)} {_num(x + w / 2)} {_num(y + h / 2)})">')
+        stroke_width = float(styles.get('strokeWidth') or 0)
+        self.box(x, y, w, h, fill=styles.get('fill') if kind != 'image' else None, stroke=styles.get('strokeColor'),
+                 stroke_width=stroke_width, radius=float(styles.get('radius') or 0))
+        if kind in ('text', 'field', 'rect'):
+            # .text/.field/.rect padding is 6px 8px inside the border; overflow clips at the padding box
+            box = (x + stroke_width + 8, y + stroke_width + 6, w - 2 * stroke_width - 16, h - 2 * stroke_width - 12)
+            clip = (x + stroke_width, y + stroke_width, w - 2 * stroke_width, h - 2 * stroke_width)
+            self.text(el.get('content'), box, styles, styles.get('textAlignH') or 'left',
+                      styles.get('textAlignV') or 'top', clip)
+        elif kind == 'image' and el.get('src'):
+            self.image(el['src'], x + stroke_width, y + stroke_width, w - 2 * stroke_width, h - 2 * stroke_width)
+        elif kind == 'table':
+            self.table(el, x, y)
+        if rotate:
+            self.out.append('</g>')
+
+
+def render_page(page, first_page=None, image_href=None, width=None):
+    """
+    One page as an SVG document. `image_href(src)` maps an image src to the
+    href to use (default: the src itself); `width` sets the display width,
+    the height following the page's aspect ratio.
+    """
+    canvas = _Canvas(image_href or (lambda src: src))
+    for el in page_elements(page, first_page):
+        canvas.element(el)
+    size = f' width="{_num(width)}" height="{_num(round(width * PAGE_HEIGHT_PX / PAGE_WIDTH_PX, 1))}"' if width else ''
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'viewBox="0 0 {_num(round(PAGE_WIDTH_PX, 2))} {_num(round(PAGE_HEIGHT_PX, 2))}"{size}>'
+            f'<rect width="100%" height="100%" fill="#fff"/>{"".join(canvas.out)}</svg>\n')
+
+
+def render_document(payload, image_href=None, width=None, max_pages=None):
+    """
+    Render a payload (or bare DocumentModel) to a list of SVG documents, one
+    per page. Images stay inline unless `image_href(asset_id, data_url)`
+    gives an href for them.
+    """
+    hoisted = hoist_assets(payload if isinstance(payload, dict) else {})
+    assets = hoisted['assets']
+
+    def href(src):
+        if not src.startswith(ASSET_PREFIX):
+            return src
+        key = src[len(ASSET_PREFIX):]
+        if key not in assets:
+            return None
+        return image_href(key, assets[key]) if image_href else assets[key]
+
+    pages = [p for p in hoisted['document'].get('pages') or [] if isinstance(p, dict)] or [{}]
+    first = pages[0]
+    return [render_page(page, first, href, width) for page in pages[:max_pages or None]]
+
+
+# ----------------------------- thumbnails -----------------------------
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _asset_writer(out_dir, svg_dir):
+    """image_href for the CLI: write each asset once to out_dir/assets and link it relative to `svg_dir`."""
+    assets_dir = os.path.join(out_dir, ASSETS_DIR)
+    prefix = os.path.relpath(assets_dir, svg_dir).replace(os.sep, '/')
+
+    def href(key, data_url):
+        head, sep, body = data_url.partition(',')
+        if not sep or not head.lower().startswith('data:'):
+            return data_url
+        mime = head[5:].split(';')[0].lower()
+        # Named by content, whatever id the payload's asset table used
+        name = asset_id(data_url) + _ASSET_EXTENSIONS.get(mime, '')
+        path = os.path.join(assets_dir, name)
+        if not os.path.exists(path):
+            try:
+                data = base64.b64decode(body) if head.lower().endswith(';base64') else unquote_to_bytes(body)
+            except ValueError:
+                return None
+            os.makedirs(assets_dir, exist_ok=True)
+            _write_atomic(path, data)
+        return f"{prefix}/{quote(name)}"
+
+    return href
+
+
+def _svg_paths(rel, count):
+    """Output paths (relative to the output directory) of a file's page thumbnails."""
+    stem = os.path.splitext(rel)[0]
+    return [f"{stem}.{n}.svg" for n in range(1, count + 1)]
+
+
+def _page_name(document):
+    pages = document.get('pages') or []
+    return pages[0].get('name') if pages and isinstance(pages[0], dict) else None
+
+
+def _render_job(job):
+    """
+    Worker: render one file's thumbnails if its payload changed. Returns
+    (path, payload hash, result, error) where `result` is None when the hash
+    matches `known_hash`, else (svg paths, page count, first page name).
+    """
+    path, rel, known_hash, out_dir, width, max_pages = job
+    try:
+        raw = _read_payload_bytes(path)
+        if raw is None:
+            return path, None, None, NO_PAYLOAD
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest == known_hash:
+            return path, digest, None, None
+        payload = parse_payload(DOC_SLOT.unescape(raw.decode('utf-8')))
+        svg_dir = os.path.dirname(os.path.join(out_dir, rel))
+        os.makedirs(svg_dir, exist_ok=True)
+        svgs = render_document(payload, _asset_writer(out_dir, svg_dir), width, max_pages)
+        names = _svg_paths(rel, len(svgs))
+        for name, svg in zip(names, svgs):
+            _write_atomic(os.path.join(out_dir, name), svg.encode('utf-8'))
+        document = payload.get('document') if isinstance(payload.get('document'), dict) else payload
+        return path, digest, (names, len(document.get('pages') or []), _page_name(document)), None
+    except Exception as e:
+        return path, None, None, f"{type(e).__name__}: {e}"
+
+
+def _render_batch(jobs):
+    return [_render_job(job) for job in jobs]
+
+
+def _load_manifest(out_dir, settings):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Thumbnails drawn by another renderer version or at other settings are all redone
+    if manifest.get('version') != RENDER_VERSION or manifest.get('settings') != settings:
+        return {}
+    return manifest.get('files') or {}
+
+
+def _remove(out_dir, names):
+    for name in names:
+        try:
+            os.remove(os.path.join(out_dir, name))
+        except OSError:
+            pass
+
+
+def make_thumbnails(root, out_dir, jobs=None, width=DEFAULT_WIDTH, max_pages=None, force=False, on_result=None):
+    """
+    Bring the thumbnails and gallery in `out_dir` up to date with the saved
+    files under `root`. Returns counts of rendered, cached, failed and
+    removed files. `on_result(rel, status, error)` is called per file
+    rendered or failed.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    settings = {'width': width, 'pages': max_pages}
+    known = {} if force else _load_manifest(out_dir, settings)
+    files, pending = {}, []
+    out_abs = os.path.abspath(out_dir)
+    for path, st in walk_html(root):
+        if path.startswith(out_abs + os.sep):
+            continue
+        rel = os.path.relpath(path, root).replace(os.sep, '/')
+        entry = known.get(rel) or {}
+        stat = [st.st_mtime_ns, st.st_size]
+        usable = not entry.get('error') and all(os.path.exists(os.path.join(out_dir, name)) for name in entry.get('svgs') or [])
+        if usable and entry.get('stat') == stat:
+            files[rel] = entry
+        else:
+            pending.append((path, rel, stat, entry.get('hash') if usable else None))
+
+    counts = {'rendered': 0, 'cached': len(files), 'skipped': 0, 'failed': 0, 'removed': 0}
+    by_path = {path: (rel, stat, entry_hash) for path, rel, stat, entry_hash in pending}
+
+    def store(path, digest, result, error):
+        rel, stat, _ = by_path[path]
+        old = known.get(rel) or {}
+        if error == NO_PAYLOAD:
+            # Not a saved document (e.g. the app itself): remembered by stat, left out of the gallery
+            files[rel] = {'stat': stat, 'hash': None, 'svgs': [], 'skipped': True}
+            _remove(out_dir, old.get('svgs') or [])
+            counts['skipped'] += 1
+            return
+        if error:
+            files[rel] = {'stat': stat, 'hash': None, 'svgs': [], 'error': error}
+            _remove(out_dir, old.get('svgs') or [])
+            counts['failed'] += 1
+        elif result is None:
+            files[rel] = {**old, 'stat': stat}
+            counts['cached'] += 1
+            return
+        else:
+            names, page_count, title = result
+            files[rel] = {'stat': stat, 'hash': digest, 'svgs': names, 'pages': page_count, 'title': title}
+            _remove(out_dir, [name for name in old.get('svgs') or [] if name not in names])
+            counts['rendered'] += 1
+        if on_result:
+            on_result(rel, 'failed' if error else 'rendered', error)
+
+    batches = [[(path, rel, entry_hash, out_dir, width, max_pages) for path, rel, _, entry_hash in pending[i:i + BATCH_SIZE]]
+               for i in range(0, len(pending), BATCH_SIZE)]
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(batches)))
+    if workers == 1:
+        for batch in batches:
+            for result in _render_batch(batch):
+                store(*result)
+    elif batches:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            queue = iter(batches)
+            running = set()
+            while True:
+                # Keep a bounded number of batches queued so results stream back while the tree is large
+                for batch in queue:
+                    running.add(pool.submit(_render_batch, batch))
+                    if len(running) >= workers * BATCHES_IN_FLIGHT_PER_WORKER:
+                        break
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        store(*result)
+
+    for rel, entry in known.items():
+        if rel not in files:
+            _remove(out_dir, entry.get('svgs') or [])
+            counts['removed'] += 1
+    manifest = {'version': RENDER_VERSION, 'settings': settings, 'root': os.path.abspath(root), 'files': files}
+    _write_atomic(os.path.join(out_dir, MANIFEST), json.dumps(manifest, separators=(',', ':')).encode('utf-8'))
+    _write_atomic(os.path.join(out_dir, GALLERY), gallery_html(files, root, out_dir).encode('utf-8'))
+    return counts
+
+
+_GALLERY_STYLE = """
+body{margin:0;font:14px system-ui,sans-serif;background:#f3f4f6;color:#111827}
+header{position:sticky;top:0;display:flex;gap:16px;align-items:center;padding:12px 20px;background:#fff;border-bottom:1px solid #e5e7eb}
+h1{margin:0;font-size:18px}
+input{flex:1;max-width:360px;padding:6px 10px;border:1px solid #d1d5db;border-radius:6px;font:inherit}
+main{display:grid;grid-template-columns:repeat(auto-fill,minmax(200px,1fr));gap:16px;padding:20px}
+figure{margin:0;background:#fff;border:1px solid #e5e7eb;border-radius:8px;padding:8px;overflow:hidden}
+figure img{display:block;width:100%;height:auto;aspect-ratio:210/297;border:1px solid #e5e7eb;background:#fff}
+figcaption{margin-top:6px;word-break:break-all}
+.pages a{margin-right:4px;color:#6b7280}
+.error{color:#b91c1c}
+"""
+
+_GALLERY_SCRIPT = """
+var input=document.getElementById('filter'),cards=document.querySelectorAll('figure');
+input.addEventListener('input',function(){var q=input.value.trim().toLowerCase();
+for(var i=0;i<cards.length;i++){cards[i].hidden=q&&cards[i].dataset.name.indexOf(q)<0;}});
+"""
+
+
+def gallery_html(files, root, out_dir):
+    """Static index page of the thumbnails (first page of each file, links to the rest)."""
+    source_prefix = os.path.relpath(os.path.abspath(root), os.path.abspath(out_dir)).replace(os.sep, '/')
+    cards = []
+    shown = sorted(rel for rel, entry in files.items() if not entry.get('skipped'))
+    for rel in shown:
+        entry = files[rel]
+        source = quote(f"{source_prefix}/{rel}")
+        name = f'<a href="{_esc(source)}">{_esc(rel)}</a>'
+        if entry.get('error'):
+            cards.append(f'<figure data-name="{_esc(rel.lower())}"><figcaption>{name}<br>'
+                         f'<span class="error">⚠️ {_esc(entry["error"])}</span></figcaption></figure>')
+            continue
+        svgs = entry.get('svgs') or []
+        title = entry.get('title') or ''
+        image = (f'<a href="{_esc(quote(svgs[0]))}"><img src="{_esc(quote(svgs[0]))}" loading="lazy" '
+                 f'alt="{_esc(title or rel)}"></a>') if svgs else ''
+        pages = entry.get('pages') or len(svgs)
+        links = ''.join(f'<a href="{_esc(quote(svg))}">{n}</a>' for n, svg in enumerate(svgs[1:], 2))
+        info = f'{pages} page{"s" if pages != 1 else ""}' + (f' · <span class="pages">1 {links}</span>' if links else '')
+        cards.append(f'<figure data-name="{_esc(rel.lower())}">{image}'
+                     f'<figcaption>{name}<br>{info}</figcaption></figure>')
+    return (f'<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8">'
+            f'<meta name="viewport" content="width=device-width,initial-scale=1">'
+            f'<title>Thumbnails · {len(shown):,} files</title><style>{_GALLERY_STYLE}</style></head>\n'
+            f'<body><header><h1>{len(shown):,} files</h1><input id="filter" type="search" placeholder="Filter by name"></header>\n'
+            f'<main>\n' + '\n'.join(cards) + f'\n</main><script>{_GALLERY_SCRIPT}</script></body></html>\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render SVG thumbnails of saved certificates plus a static gallery page.")
+    parser.add_argument("root", help="Directory of saved HTML files")
+    parser.add_argument("-o", "--out-dir", default="thumbs", help="Output directory (default: thumbs)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH, help=f"Thumbnail width in px (default: {DEFAULT_WIDTH})")
+    parser.add_argument("--pages", type=int, default=None, help="Render only the first N pages of each file")
+    parser.add_argument("--force", action="store_true", help="Ignore the cache and re-render every file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List every rendered file")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.root):
+        print(f"❌ {args.root} is not a directory", file=sys.stderr)
+        return 1
+
+    def report(rel, status, error):
+        if error:
+            print(f"❌ {rel}: {error}")
+        elif args.verbose:
+            print(f"🖼️  {rel}")
+
+    started = time.perf_counter()
+    counts = make_thumbnails(args.root, args.out_dir, args.jobs, args.width, args.pages, args.force, report)
+    print(f"✅ {counts['rendered']:,} rendered, {counts['cached']:,} unchanged, {counts['skipped']:,} without a document, "
+          f"{counts['failed']:,} failed, "
+          f"{counts['removed']:,} removed in {time.perf_counter() - started:.1f} s")
+    print(f"📁 Gallery: {os.path.join(args.out_dir, GALLERY)}")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
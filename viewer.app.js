@@ -0,0 +1,128 @@
+// viewer.app.js
+// Read-only runtime for the viewer build (helper.py --profile viewer).
+// The viewer build leaves out editor.app.js, the selection modules and the
+// persistence/export services, so this file provides the few globals the
+// shared render modules still call, plus a bootstrap that loads the embedded
+// document in View mode. Every global is only defined when missing, so the
+// file is harmless next to the full editor (e.g. when index.html is opened
+// directly).
+
+(function(){
+  function define(name, fn){
+    if (typeof window[name] !== 'function') window[name] = fn;
+  }
+  const noop = function(){};
+
+  /* ----------------------- Selection/toolbar stubs ----------------------- */
+  // Nothing can be selected in the viewer; the render and table modules still
+  // call these after every update.
+  if (typeof selectedIds === 'undefined') window.selectedIds = new Set();
+  ['updateSelectionBox', 'updateSelectionUI', 'clearSelection', 'setSelection', 'alignOverlays',
+   'updateResizeCursor', 'syncFormatToolbar', 'updateFormatToolbarVisibility',
+   'updateToolbarForSelection', 'renderProperties', 'autosaveInline'].forEach((name) => define(name, noop));
+  define('selectionBoxEl', function(){ return null; });
+
+  /* ----------------------- Rendering ----------------------- */
+  define('isElementHidden', function(el){
+    try {
+      const a = el && el.attrs ? el.attrs : {};
+      if (a && (a.hidden === true || a.hidden === 'true')) return true;
+      const st = String(a && a.style ? a.style : '');
+      if (/display\s*:\s*none/i.test(st)) return true;
+    } catch {}
+    return false;
+  });
+
+  define('renderPagesList', function(){
+    const list = pagesList(); if (!list) return;
+    list.innerHTML = '';
+    Model.document.pages.forEach((p) => {
+      const wrap = document.createElement('div');
+      wrap.className = 'page-wrapper';
+      wrap.dataset.pageId = p.id;
+      const stage = document.createElement('div');
+      stage.className = 'page-stage';
+      const page = document.createElement('div');
+      page.className = 'page';
+      page.setAttribute('aria-label', 'A4 canvas');
+      stage.appendChild(page);
+      wrap.appendChild(stage);
+      list.appendChild(wrap);
+      renderPage(p);
+    });
+  });
+
+  define('renderAll', function(){
+    renderPagesList();
+    // Mirror the editor's View-mode visibility pass (attrs.hidden / display:none)
+    (Model.document.pages || []).forEach((p) => {
+      (p.elements || []).forEach((elm) => {
+        const node = document.querySelector(`.page-wrapper[data-page-id="${p.id}"] .page .element[data-id="${elm.id}"]`);
+        if (!node) return;
+        if (isElementHidden(elm)) node.style.display = 'none';
+        else node.style.display = (elm.type === 'text' || elm.type === 'field' || elm.type === 'rect') ? 'flex' : '';
+      });
+    });
+  });
+
+  // Used by userFunctions.js actions (toggleVisibility, coloring, ...). Same
+  // targeting rules as the editor's updateElement, without history or selection.
+  define('updateElement', function(id, patch){
+    if (id == null) return;
+    let doc = Model.document;
+    if (getElementById(id)) {
+      doc = applyPatchToElementsAnyPage(doc, [id], patch);
+    } else if (typeof id === 'string' && id) {
+      const elementIds = new Set();
+      const cells = [];
+      let nodes = [];
+      try { nodes = Array.from(document.querySelectorAll(id)); } catch {}
+      if (!nodes.length) {
+        const token = String(id).replace(/^#/, '');
+        nodes = Array.from(document.querySelectorAll(`.page [data-id="${token}"]`));
+      }
+      nodes.forEach((node) => {
+        if (node.classList && node.classList.contains('element') && node.dataset?.id) { elementIds.add(node.dataset.id); return; }
+        const container = node.closest('.element[data-id]');
+        if (!container) return;
+        if (node.dataset?.id) {
+          const grid = getElementById(container.dataset.id)?.grid || [];
+          grid.forEach((row, r) => (row || []).forEach((cellId, c) => {
+            if (cellId === node.dataset.id) cells.push({ tableId: container.dataset.id, r, c });
+          }));
+          return;
+        }
+        elementIds.add(container.dataset.id);
+      });
+      if (!elementIds.size && !cells.length) return;
+      if (elementIds.size) doc = applyPatchToElementsAnyPage(doc, [...elementIds], patch);
+      cells.forEach(({ tableId, r, c }) => {
+        doc = applyPatchToTableCellsAnyPage(doc, tableId, { r0:r, c0:c, r1:r, c1:c }, (patch && patch.styles) || {});
+      });
+    } else {
+      return;
+    }
+    Model.document = doc;
+    renderAll();
+  });
+
+  /* ----------------------- Bootstrap ----------------------- */
+  document.addEventListener('DOMContentLoaded', async () => {
+    // The full editor bootstraps itself
+    if (typeof bootstrap === 'function') return;
+    const saved = document.getElementById('__doc__');
+    try {
+      // Paged payloads render the current page first and the rest when decoded
+      if (saved && saved.textContent) await loadDocumentPayload(saved.textContent, () => renderAll());
+    } catch (e) { try { console.warn('[Viewer] Embedded document could not be loaded', e); } catch {} }
+    if (!Model.document.pages.length) {
+      Model.document.pages = [createPage('Page 1')];
+      Model.document.currentPageId = Model.document.pages[0].id;
+    }
+    const ev = document.getElementById('editorView');
+    if (ev) ev.hidden = false;
+    document.body.classList.remove('in-hub');
+    setEditMode(false);
+    renderAll();
+  });
+})();